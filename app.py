@@ -1,17 +1,31 @@
 import os
 import json
+import contextlib
 import threading
 import time
 import sys
 from importlib import import_module
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import requests
 from flask import Flask, Response, request, abort
-from tisService import TisService
-from bbService import bbService
+from tisService import TisService, AimdConcurrencyController
+from bbService import BB_CIRCUIT, bbService, window_memory_snapshot
+from asyncService import AsyncBbService, AsyncTisService, async_client_available
+from casService import CasService
+from http_transport import DEFAULT_TIMEOUT, transport_stats
+from token_store import CasTokenStore
+from session_broker import CasSessionBroker
+from refresh_lease import KvLeaseBackend, LeaseLostError, RefreshLeaseManager, SchedulerLeaseBackend
+from refresh_queue import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_CRON,
+    PRIORITY_MANUAL,
+    RefreshQueue,
+)
 from ics import Calendar, Event
 import pytz
 import re
+import hashlib
 
 
 def _load_kv_client():
@@ -97,6 +111,56 @@ def _sanitize_storage_mode(mode: str) -> str:
     return candidate
 
 
+def _sanitize_tis_fetch_mode(mode: str) -> str:
+    candidate = (mode or "daily").strip().lower()
+    if candidate not in {"daily", "weekly"}:
+        return "daily"
+    return candidate
+
+
+def _sanitize_lease_backend(backend: str) -> str:
+    candidate = (backend or "auto").strip().lower()
+    if candidate not in {"auto", "kv", "sqlite", "none"}:
+        return "auto"
+    return candidate
+
+
+def _sanitize_token_store_backend(backend: str) -> str:
+    candidate = (backend or "auto").strip().lower()
+    if candidate not in {"auto", "file", "kv", "none"}:
+        return "auto"
+    return candidate
+
+
+def _parse_bb_refresh_tiers(raw: str | None) -> list:
+    """
+    解析 BB_REFRESH_TIERS，如 "14:1800,*:86400"：今天起 14 天内每 30 分钟刷新，其余每天刷新。
+
+    返回 [(结束天数, 刷新间隔秒)]，"*" 记为 None（到抓取范围末尾）；留空或格式错误时返回空列表（不分段）。
+    """
+    tiers = []
+    previous_end = 0
+    for part in (raw or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        end_raw, _, interval_raw = part.partition(":")
+        try:
+            end_days = None if end_raw.strip() == "*" else int(end_raw)
+            interval = max(60, int(interval_raw))
+        except ValueError:
+            print(f"[warn] invalid BB_REFRESH_TIERS entry '{part}', tiered refresh disabled")
+            return []
+        if end_days is not None and end_days <= previous_end:
+            print("[warn] BB_REFRESH_TIERS must be increasing, tiered refresh disabled")
+            return []
+        tiers.append((end_days, interval))
+        if end_days is None:
+            break
+        previous_end = end_days
+    return tiers
+
+
 def _sanitize_location_prefix(prefix: str | None) -> str:
     if not prefix:
         return ""
@@ -179,7 +243,58 @@ ICS_ASYNC_REFRESH_ENABLED = _env_bool("ICS_ASYNC_REFRESH_ENABLED", True)
 ICS_ASYNC_REFRESH_MIN_INTERVAL = max(
     5, int(os.environ.get("ICS_ASYNC_REFRESH_MIN_INTERVAL", "180"))
 )
+REFRESH_QUEUE_WORKERS = max(1, int(os.environ.get("REFRESH_QUEUE_WORKERS", "2")))
+REFRESH_LEASE_BACKEND = _sanitize_lease_backend(
+    os.environ.get("REFRESH_LEASE_BACKEND", "auto")
+)
+REFRESH_LEASE_TTL_SECONDS = max(
+    10.0, float(os.environ.get("REFRESH_LEASE_TTL_SECONDS", "300"))
+)
+CAS_SESSION_BROKER_ENABLED = _env_bool("CAS_SESSION_BROKER_ENABLED", True)
+CAS_SESSION_POOL_ENABLED = _env_bool("CAS_SESSION_POOL_ENABLED", True)
+CAS_SESSION_POOL_MAX_IDLE_SECONDS = max(
+    60, int(os.environ.get("CAS_SESSION_POOL_MAX_IDLE_SECONDS", "3600"))
+)
+CAS_TOKEN_STORE_BACKEND = _sanitize_token_store_backend(
+    os.environ.get("CAS_TOKEN_STORE", "auto")
+)
+CAS_TOKEN_STORE_KEY = os.environ.get("CAS_TOKEN_STORE_KEY")
+CAS_TOKEN_STORE_PATH = os.environ.get(
+    "CAS_TOKEN_STORE_PATH", os.path.join("data", "cas_token.enc")
+)
+CAS_TOKEN_REVALIDATE_SECONDS = max(
+    30, int(os.environ.get("CAS_TOKEN_REVALIDATE_SECONDS", "600"))
+)
+# cron 中各来源的等待预算（秒）。超时的来源记为 deadline_exceeded：Serverless 平台在响应返回后
+# 即冻结函数，未完成的刷新不保证继续执行。
+CRON_SOURCE_DEADLINES = {
+    "tis": max(1.0, float(os.environ.get("CRON_TIS_DEADLINE_SECONDS", "50"))),
+    "bb": max(1.0, float(os.environ.get("CRON_BB_DEADLINE_SECONDS", "50"))),
+}
+# cron source=all 需要每个来源各占一个 worker 才能并行刷新，worker 数不足时提升到来源数。
+if REFRESH_QUEUE_WORKERS < len(CRON_SOURCE_DEADLINES):
+    print(
+        f"[refresh-queue] REFRESH_QUEUE_WORKERS={REFRESH_QUEUE_WORKERS} < sources={len(CRON_SOURCE_DEADLINES)}, "
+        f"raised to {len(CRON_SOURCE_DEADLINES)} so cron refreshes run in parallel"
+    )
+    REFRESH_QUEUE_WORKERS = len(CRON_SOURCE_DEADLINES)
 TIS_EXCLUDE_HOLIDAY_EVENTS = _env_bool("TIS_EXCLUDE_HOLIDAY_EVENTS", True)
+TIS_FETCH_MODE = _sanitize_tis_fetch_mode(os.environ.get("TIS_FETCH_MODE", "daily"))
+TIS_FETCH_SAMPLE_WEEKS = max(2, int(os.environ.get("TIS_FETCH_SAMPLE_WEEKS", "3")))
+# weekly 模式下从当前周起始终逐日抓取的周数，模板推断无法发现其余日期的单次调课 / 停课。
+TIS_WEEKLY_VERIFY_WEEKS = max(0, int(os.environ.get("TIS_WEEKLY_VERIFY_WEEKS", "2")))
+TIS_ADAPTIVE_CONCURRENCY = _env_bool("TIS_ADAPTIVE_CONCURRENCY", True)
+TIS_CONCURRENCY_INITIAL = max(1, int(os.environ.get("TIS_CONCURRENCY_INITIAL", "4")))
+TIS_CONCURRENCY_MAX = max(1, int(os.environ.get("TIS_CONCURRENCY_MAX", "16")))
+TIS_SLOW_RESPONSE_SECONDS = max(
+    0.5, float(os.environ.get("TIS_SLOW_RESPONSE_SECONDS", "3"))
+)
+TIS_RETRY_ROUNDS = max(0, int(os.environ.get("TIS_RETRY_ROUNDS", "2")))
+TIS_RETRY_BASE_DELAY = max(0.0, float(os.environ.get("TIS_RETRY_BASE_DELAY", "1")))
+UPSTREAM_ASYNC_FETCH = _env_bool("UPSTREAM_ASYNC_FETCH", False)
+UPSTREAM_ASYNC_MAX_CONCURRENCY = max(
+    1, int(os.environ.get("UPSTREAM_ASYNC_MAX_CONCURRENCY", "64"))
+)
 
 # --- 通用配置 ---
 SCHEDULE_FETCH_RANGE_DAYS = 120
@@ -188,6 +303,7 @@ SHANGHAI_TZ = pytz.timezone("Asia/Shanghai")
 
 # --- TIS 特定配置 ---
 TIS_CACHE_KEY = "tis_schedule_ics"  # Vercel KV 中的键名
+TIS_RAW_CACHE_KEY = "tis_schedule_raw"  # 上次抓取的原始课表，用于回填失败日期
 CLASS_TIME_MAP = {
     1: ("08:00", "09:50"),
     3: ("10:20", "12:10"),
@@ -200,6 +316,11 @@ CLASS_TIME_MAP = {
 # --- Blackboard 特定配置 ---
 BB_CACHE_KEY = "bb_schedule_ics"  # Vercel KV 中的键名
 BB_ICAL_FEED_URL = os.environ.get("BB_ICAL_FEED_URL")
+BB_FEED_MARKER_KEY = "bb:feed"  # scheduler 同步标记中记录订阅源 ETag / Last-Modified 的键
+# 分段刷新：近期窗口频繁刷新，远期窗口低频刷新（仅 db / dual 模式生效）。
+BB_REFRESH_TIERS = _parse_bb_refresh_tiers(
+    os.environ.get("BB_REFRESH_TIERS", "14:1800,*:86400")
+)
 APP_FEATURES_VERSION = "2026-04-19-bb-fallback-ics-async"
 APP_BUILD_COMMIT = os.environ.get("VERCEL_GIT_COMMIT_SHA") or os.environ.get(
     "GIT_COMMIT_SHA"
@@ -210,31 +331,102 @@ app = Flask(__name__)
 
 _RUNTIME_CAS_TOKEN_LOCK = threading.Lock()
 _RUNTIME_CAS_TOKEN = None
+_RUNTIME_CAS_TOKEN_VALIDATED_AT = 0.0
+_RUNTIME_CAS_TOKEN_LOADED = False
 _QR_THREAD_STARTED = False
 _REFRESH_SOURCE_LOCKS = {
     "tis": threading.Lock(),
     "bb": threading.Lock(),
 }
-_ASYNC_REFRESH_STATE_LOCK = threading.Lock()
-_LAST_ASYNC_REFRESH_AT = {
-    "tis": 0.0,
-    "bb": 0.0,
-}
+# 进程级共享，让并发上限的学习结果跨多次刷新保留。
+TIS_CONCURRENCY_CONTROLLER = (
+    AimdConcurrencyController(
+        initial_limit=TIS_CONCURRENCY_INITIAL,
+        max_limit=TIS_CONCURRENCY_MAX,
+        slow_response_seconds=TIS_SLOW_RESPONSE_SECONDS,
+    )
+    if TIS_ADAPTIVE_CONCURRENCY
+    else None
+)
+# kv 模式下（无 scheduler）记录兜底订阅源的 ETag / Last-Modified。
+_BB_FEED_VALIDATORS = {}
+# kv 模式下日历正文旁的元数据键后缀：{hash, modified_at}，正文变化时才更新。
+KV_CALENDAR_META_SUFFIX = ":meta"
 
 
 def _set_runtime_cas_token(token: str | None) -> None:
+    """
+    记录刚通过登录验证的 TGC。TGC 变化时写入持久化存储供重启后 / 其他 worker 复用；
+    同一 TGC 重新验证只刷新内存中的验证时间，不重写存储。
+    """
     if not token:
         return
-    global _RUNTIME_CAS_TOKEN
+    global _RUNTIME_CAS_TOKEN, _RUNTIME_CAS_TOKEN_VALIDATED_AT
+    validated_at = time.time()
     with _RUNTIME_CAS_TOKEN_LOCK:
+        changed = _RUNTIME_CAS_TOKEN != token
         _RUNTIME_CAS_TOKEN = token
+        _RUNTIME_CAS_TOKEN_VALIDATED_AT = validated_at
+    if changed and CAS_TOKEN_STORE is not None:
+        CAS_TOKEN_STORE.save(token, validated_at=validated_at)
 
 
 def _get_runtime_cas_token() -> str | None:
+    """内存中没有 TGC 时从持久化存储加载一次（冷启动后的第一次刷新即可跳过 CAS 登录）。"""
+    global _RUNTIME_CAS_TOKEN, _RUNTIME_CAS_TOKEN_VALIDATED_AT, _RUNTIME_CAS_TOKEN_LOADED
     with _RUNTIME_CAS_TOKEN_LOCK:
+        if (
+            _RUNTIME_CAS_TOKEN is None
+            and not _RUNTIME_CAS_TOKEN_LOADED
+            and CAS_TOKEN_STORE is not None
+        ):
+            _RUNTIME_CAS_TOKEN_LOADED = True
+            record = CAS_TOKEN_STORE.load()
+            if record:
+                _RUNTIME_CAS_TOKEN = record["token"]
+                _RUNTIME_CAS_TOKEN_VALIDATED_AT = float(record.get("validated_at") or 0)
+                print(f"[token-store] loaded TGC {_mask_token(_RUNTIME_CAS_TOKEN)}")
         return _RUNTIME_CAS_TOKEN
 
 
+def _invalidate_runtime_cas_token(token: str) -> None:
+    """丢弃已失效的 TGC；存储中仍是同一个 token 时一并清除，下次读取会重新加载。"""
+    global _RUNTIME_CAS_TOKEN, _RUNTIME_CAS_TOKEN_LOADED
+    with _RUNTIME_CAS_TOKEN_LOCK:
+        if _RUNTIME_CAS_TOKEN == token:
+            _RUNTIME_CAS_TOKEN = None
+        _RUNTIME_CAS_TOKEN_LOADED = False
+    if CAS_TOKEN_STORE is not None:
+        record = CAS_TOKEN_STORE.load()
+        if record and record.get("token") == token:
+            CAS_TOKEN_STORE.clear()
+
+
+def _warm_cas_token() -> str | None:
+    """
+    返回确认可用的 TGC（扫码登录循环、会话代理与各来源登录都从这里取 token）。
+
+    距上次验证不超过 CAS_TOKEN_REVALIDATE_SECONDS 时直接返回，否则用 CasService.probe_tgc
+    发一次不跟随跳转的请求探测；探测失败（网络异常）时仍返回原 token，交给后续登录流程处理。
+    """
+    token = _get_runtime_cas_token()
+    if not token:
+        return None
+    with _RUNTIME_CAS_TOKEN_LOCK:
+        validated_at = _RUNTIME_CAS_TOKEN_VALIDATED_AT
+    if time.time() - validated_at < CAS_TOKEN_REVALIDATE_SECONDS:
+        return token
+
+    valid = CasService(tgc_token=token).probe_tgc()
+    if valid is False:
+        print(f"[token-store] TGC {_mask_token(token)} expired")
+        _invalidate_runtime_cas_token(token)
+        return None
+    if valid:
+        _set_runtime_cas_token(token)
+    return token
+
+
 def _init_scheduler():
     if REQUESTED_STORAGE_MODE not in {"db", "dual"}:
         return None, REQUESTED_STORAGE_MODE
@@ -277,6 +469,74 @@ HOLIDAY_PROVIDER = (
 if REQUESTED_STORAGE_MODE != STORAGE_MODE:
     print(f"[storage] requested={REQUESTED_STORAGE_MODE}, effective={STORAGE_MODE}")
 
+
+def _init_refresh_leases():
+    """
+    auto：kv 存储模式下用 KV（跨 Vercel 实例），否则用调度器 SQLite（同机多 worker），
+    两者都不可用时只保留进程内锁。
+    """
+    backend = REFRESH_LEASE_BACKEND
+    kv_usable = kv is not None and all(
+        callable(getattr(kv, name, None)) for name in ("set", "incr", "eval")
+    )
+    if backend == "auto":
+        if kv_usable and STORAGE_MODE in {"kv", "dual"}:
+            backend = "kv"
+        elif SCHEDULER is not None:
+            backend = "sqlite"
+        else:
+            backend = "none"
+
+    if backend == "kv" and kv_usable:
+        return RefreshLeaseManager(
+            KvLeaseBackend(kv, scheduler=SCHEDULER if STORAGE_MODE in {"db", "dual"} else None),
+            ttl_seconds=REFRESH_LEASE_TTL_SECONDS,
+        )
+    if backend == "sqlite" and SCHEDULER is not None and hasattr(
+        SCHEDULER, "acquire_refresh_lease"
+    ):
+        return RefreshLeaseManager(
+            SchedulerLeaseBackend(SCHEDULER), ttl_seconds=REFRESH_LEASE_TTL_SECONDS
+        )
+    if backend != "none":
+        print(f"[lease] backend={backend} unavailable, using in-process locks only")
+    return None
+
+
+REFRESH_LEASES = _init_refresh_leases()
+
+
+def _init_cas_token_store():
+    """auto：kv 存储模式且 KV 可用时存 KV（跨实例共享），否则存本地加密文件。"""
+    backend = CAS_TOKEN_STORE_BACKEND
+    if backend == "auto":
+        backend = "kv" if kv is not None and STORAGE_MODE in {"kv", "dual"} else "file"
+    return CasTokenStore.create(
+        backend=backend,
+        key=CAS_TOKEN_STORE_KEY,
+        path=CAS_TOKEN_STORE_PATH,
+        kv_client=kv,
+    )
+
+
+CAS_TOKEN_STORE = _init_cas_token_store()
+# 一次 CAS 登录并行换取 TIS / BB 票据，刷新之间复用已登录会话；关闭时各来源沿用独立登录流程。
+CAS_SESSION_BROKER = (
+    CasSessionBroker(
+        {"tis": (TisService, "LoginTIS"), "bb": (bbService, "LoginBB")},
+        token_provider=_warm_cas_token,
+        token_consumer=_set_runtime_cas_token,
+        allow_password_fallback=CAS_QR_ALLOW_PASSWORD_FALLBACK,
+        retry_use_qr=_env_bool("CAS_USE_QR_LOGIN", False),
+        pool_enabled=CAS_SESSION_POOL_ENABLED,
+        max_idle=CAS_SESSION_POOL_MAX_IDLE_SECONDS,
+    )
+    if CAS_SESSION_BROKER_ENABLED
+    else None
+)
+# 本进程当前持有的租约，写入前做 fencing 校验。
+_ACTIVE_REFRESH_LEASES = {}
+
 print(
     "[boot] "
     f"app_features_version={APP_FEATURES_VERSION} "
@@ -287,17 +547,33 @@ print(
     f"bb_use_runtime_cas_token={BB_USE_RUNTIME_CAS_TOKEN} "
     f"bb_fallback_configured={bool(BB_ICAL_FEED_URL)} "
     f"holiday_provider_available={HOLIDAY_PROVIDER is not None} "
-    f"tis_exclude_holiday_events={TIS_EXCLUDE_HOLIDAY_EVENTS}"
+    f"tis_exclude_holiday_events={TIS_EXCLUDE_HOLIDAY_EVENTS} "
+    f"tis_fetch_mode={TIS_FETCH_MODE} "
+    f"upstream_async_fetch={UPSTREAM_ASYNC_FETCH and async_client_available()} "
+    f"refresh_lease_backend={REFRESH_LEASES.backend.name if REFRESH_LEASES else 'none'} "
+    f"cas_token_store={CAS_TOKEN_STORE.backend.name if CAS_TOKEN_STORE else 'none'}"
 )
 
 
-def _kv_set(key: str, value: str) -> bool:
+def _kv_set(key: str, value: str, fence_source: str | None = None) -> bool:
+    """
+    写入 KV。fence_source 为正在刷新的来源时按其租约做 fencing：
+    KV 租约后端用脚本按 token 条件写入，其他后端写入前校验一次；租约已丢失时抛出 LeaseLostError。
+    """
     if kv is None:
         print(f"[kv] client unavailable, skip set for {key}")
         return False
+    lease = _ACTIVE_REFRESH_LEASES.get(fence_source) if fence_source else None
     try:
-        kv.set(key, value)
+        if lease is not None and lease.supports_conditional_set:
+            lease.set_if_held(key, value)
+        else:
+            if lease is not None:
+                lease.ensure_valid()
+            kv.set(key, value)
         return True
+    except LeaseLostError:
+        raise
     except Exception as exc:
         print(f"[kv] set failed for {key}: {exc}")
         return False
@@ -314,6 +590,27 @@ def _kv_get(key: str):
         return None
 
 
+def _kv_calendar_meta(key: str) -> dict:
+    raw = _kv_get(f"{key}{KV_CALENDAR_META_SUFFIX}")
+    if isinstance(raw, dict):
+        return raw
+    try:
+        return json.loads(raw) if raw else {}
+    except ValueError:
+        return {}
+
+
+def _kv_set_calendar(key: str, body: str, fence_source: str | None = None) -> bool:
+    """写入日历正文；正文哈希变化时同时记录修改时间，作为跨进程一致的 Last-Modified。"""
+    content_hash = hashlib.sha256(body.encode("utf-8")).hexdigest()
+    if not _kv_set(key, body, fence_source=fence_source):
+        return False
+    if _kv_calendar_meta(key).get("hash") != content_hash:
+        meta = {"hash": content_hash, "modified_at": datetime.now(timezone.utc).isoformat()}
+        _kv_set(f"{key}{KV_CALENDAR_META_SUFFIX}", json.dumps(meta), fence_source=fence_source)
+    return True
+
+
 def _serialize_calendar(cal: Calendar) -> str:
     """Use explicit serialize API to avoid upstream deprecation warnings."""
     serialize = getattr(cal, "serialize", None)
@@ -443,21 +740,79 @@ def convert_bb_json_to_ical(events_json):
     return _serialize_calendar(cal)
 
 
-def _persist_tis_to_db(schedule_data: dict) -> None:
+def _assert_refresh_lease(source: str) -> None:
+    """
+    写入 scheduler 前确认本进程仍持有该来源的租约，租约已被接管时尽早放弃。
+
+    scheduler 写入另在写入事务内、提交前再次校验（见 _refresh_source_with_lock 的 write_fence）：
+    sqlite 租约后端比较 refresh_lease 表，KV 租约后端比较 write_fence 表中的最大 token。
+    """
+    lease = _ACTIVE_REFRESH_LEASES.get(source)
+    if lease is not None:
+        lease.ensure_valid()
+
+
+def _persist_tis_to_db(schedule_data: dict, preserve_dates: list | None = None) -> None:
     if SCHEDULER is None or STORAGE_MODE not in {"db", "dual"}:
         return
-    count = SCHEDULER.replace_tis_raw_schedule(schedule_data, clear_old=True)
-    print(f"TIS db sync completed, events={count}")
+    _assert_refresh_lease("tis")
+    count = SCHEDULER.replace_tis_raw_schedule(
+        schedule_data, clear_old=True, preserve_dates=preserve_dates
+    )
+    report = SCHEDULER.get_last_sync_report()
+    print(
+        f"TIS db sync completed, events={count}, "
+        f"changed_dates={report.get('changed_dates')}, "
+        f"unchanged_dates={report.get('unchanged_dates')}, "
+        f"preserved_dates={len(preserve_dates or [])}"
+    )
 
 
-def _persist_bb_to_db(events_json: list) -> None:
+def _backfill_tis_failed_dates(schedule_data: dict, failed_dates: list) -> dict:
+    """用 KV 中上次成功的原始课表回填仍然失败的日期，避免 ICS 中课程凭空消失。"""
+    if not failed_dates:
+        return schedule_data
+    previous_raw = _kv_get(TIS_RAW_CACHE_KEY)
+    if not previous_raw:
+        return schedule_data
+    try:
+        previous = json.loads(previous_raw) if isinstance(previous_raw, str) else previous_raw
+    except ValueError:
+        return schedule_data
+    if not isinstance(previous, dict):
+        return schedule_data
+
+    merged = dict(schedule_data)
+    restored = 0
+    for day in failed_dates:
+        if day in previous:
+            merged[day] = previous[day]
+            restored += 1
+    print(f"[tis] backfilled failed dates from previous raw cache: {restored}/{len(failed_dates)}")
+    return merged
+
+
+def _persist_bb_to_db(events_json: list, complete: bool = True) -> None:
+    """complete=False（部分分段失败）时只合并返回的事件，不删除未出现的旧事件。"""
     if SCHEDULER is None or STORAGE_MODE not in {"db", "dual"}:
         return
-    count = SCHEDULER.replace_bb_raw_events(events_json, clear_old=True)
-    print(f"BB db sync completed, events={count}")
+    _assert_refresh_lease("bb")
+    if complete:
+        count = SCHEDULER.replace_bb_raw_events(events_json, clear_old=True)
+    else:
+        count = SCHEDULER.merge_bb_raw_events(events_json)
+    print(f"BB db sync completed, events={count} complete={complete}")
+
 
+def _read_calendar_entry(source: str):
+    """
+    读取日历内容及其校验信息：{body, etag, last_modified, encodings}，无数据时返回 None。
 
-def _read_calendar_payload(source: str):
+    db 模式下 etag 直接取物化 ICS 的 content_hash；kv 模式按正文计算。
+    last_modified 为正文最近一次变化的时间（db 模式取 ics_cache.built_at，kv 模式取正文旁的元数据），
+    均为持久化值，各进程一致，内容不变的刷新不会前移。
+    encodings 为预压缩正文（br / gzip），仅 db 模式提供。
+    """
     source = source.lower()
     cache_key = TIS_CACHE_KEY if source == "tis" else BB_CACHE_KEY
 
@@ -467,11 +822,35 @@ def _read_calendar_payload(source: str):
             source_name = (
                 EventSource.TIS.value if source == "tis" else EventSource.BB.value
             )
-        if len(SCHEDULER.query_events(source=source_name, limit=1)) > 0:
-            return SCHEDULER.export_ics(source=source_name)
+        entry = SCHEDULER.get_cached_ics(source_name)
+        if entry and entry["event_count"]:
+            return {
+                "body": entry["body"],
+                "etag": entry["content_hash"],
+                "last_modified": entry["built_at"],
+                "encodings": {
+                    "br": entry.get("body_br"),
+                    "gzip": entry.get("body_gzip"),
+                },
+            }
 
     if STORAGE_MODE in {"kv", "dual"}:
-        return _kv_get(cache_key)
+        body = _kv_get(cache_key)
+        if body:
+            etag = hashlib.sha256(body.encode("utf-8")).hexdigest()
+            meta = _kv_calendar_meta(cache_key)
+            last_modified = None
+            if meta.get("hash") == etag and meta.get("modified_at"):
+                try:
+                    last_modified = datetime.fromisoformat(meta["modified_at"])
+                except ValueError:
+                    last_modified = None
+            return {
+                "body": body,
+                "etag": etag,
+                "last_modified": last_modified,
+                "encodings": {},
+            }
 
     return None
 
@@ -481,10 +860,11 @@ def _read_calendar_payload(source: str):
 # =================================================================
 
 
-def fetch_and_cache_tis_schedule():
-    """抓取 TIS 课表并写入启用的存储后端。"""
-    print("Fetching new schedule from TIS...")
-    service = TisService(tgc_token=_get_runtime_cas_token())
+def _login_tis_service() -> TisService:
+    if CAS_SESSION_BROKER is not None:
+        return CAS_SESSION_BROKER.checkout("tis")
+
+    service = TisService(tgc_token=_warm_cas_token())
     if not service.Login(
         use_qr=False, allow_password_fallback=CAS_QR_ALLOW_PASSWORD_FALLBACK
     ):
@@ -501,24 +881,78 @@ def fetch_and_cache_tis_schedule():
             raise ConnectionError("TIS Login Failed.")
 
     _set_runtime_cas_token(service.TGC)
+    return service
+
+
+def _release_service(source: str, service) -> None:
+    """把刷新用过的已登录会话归还给会话池；service 为 None 表示会话不可再用。"""
+    if CAS_SESSION_BROKER is not None:
+        CAS_SESSION_BROKER.checkin(source, service)
+
+
+def fetch_and_cache_tis_schedule():
+    """抓取 TIS 课表并写入启用的存储后端。"""
+    print("Fetching new schedule from TIS...")
+    service = _login_tis_service()
+
+    service.concurrency_controller = TIS_CONCURRENCY_CONTROLLER
+    if UPSTREAM_ASYNC_FETCH:
+        if async_client_available():
+            AsyncTisService(
+                service, max_concurrency=UPSTREAM_ASYNC_MAX_CONCURRENCY
+            ).attach()
+        else:
+            print("[tis] UPSTREAM_ASYNC_FETCH enabled but httpx unavailable, using threads")
 
     today = datetime.now(SHANGHAI_TZ).replace(hour=0, minute=0, second=0, microsecond=0)
     start_date = today - timedelta(days=SCHEDULE_PAST_DAYS)
     end_date = today + timedelta(days=SCHEDULE_FETCH_RANGE_DAYS)
-    schedule_data = service.queryScheduleInterval(
-        start_date.strftime("%Y-%m-%d"),
-        end_date.strftime("%Y-%m-%d"),
-        holiday_provider=HOLIDAY_PROVIDER,
-        skip_holidays=TIS_EXCLUDE_HOLIDAY_EVENTS,
+    try:
+        schedule_data = service.queryScheduleInterval(
+            start_date.strftime("%Y-%m-%d"),
+            end_date.strftime("%Y-%m-%d"),
+            holiday_provider=HOLIDAY_PROVIDER,
+            skip_holidays=TIS_EXCLUDE_HOLIDAY_EVENTS,
+            fetch_mode=TIS_FETCH_MODE,
+            sample_weeks=TIS_FETCH_SAMPLE_WEEKS,
+            verify_weeks=TIS_WEEKLY_VERIFY_WEEKS,
+            retry_rounds=TIS_RETRY_ROUNDS,
+            retry_base_delay=TIS_RETRY_BASE_DELAY,
+        )
+    except Exception:
+        _release_service("tis", None)
+        raise
+    query_meta = getattr(service, "last_query_metadata", {})
+    failed_dates = query_meta.get("failed_dates", [])
+    # 所有请求的日期都失败时会话很可能已失效（被踢回登录页），不归还给会话池。
+    all_days_failed = bool(failed_dates) and len(failed_dates) >= query_meta.get("requested_dates", 0)
+    _release_service("tis", None if all_days_failed else service)
+    print(
+        "[tis] fetch completed "
+        f"mode={query_meta.get('fetch_mode')} "
+        f"requested_dates={query_meta.get('requested_dates')} "
+        f"templated_dates={len(query_meta.get('templated_dates', []))} "
+        f"fallback_reason={query_meta.get('fallback_reason')} "
+        f"concurrency={query_meta.get('concurrency', {}).get('limit')} "
+        f"failed_dates={len(failed_dates)}"
     )
 
+    kv_schedule_data = schedule_data
+    if STORAGE_MODE in {"kv", "dual"}:
+        kv_schedule_data = _backfill_tis_failed_dates(schedule_data, failed_dates)
+
     ical_data = convert_tis_json_to_ical(
-        schedule_data,
+        kv_schedule_data,
         holiday_provider=HOLIDAY_PROVIDER,
     )
 
     if STORAGE_MODE in {"kv", "dual"}:
-        kv_updated = _kv_set(TIS_CACHE_KEY, ical_data)
+        _kv_set(
+            TIS_RAW_CACHE_KEY,
+            json.dumps(kv_schedule_data, ensure_ascii=False),
+            fence_source="tis",
+        )
+        kv_updated = _kv_set_calendar(TIS_CACHE_KEY, ical_data, fence_source="tis")
         if kv_updated:
             print("TIS cache updated successfully in Vercel KV.")
         else:
@@ -527,15 +961,16 @@ def fetch_and_cache_tis_schedule():
                 raise ConnectionError("TIS cache update failed in kv mode.")
 
     if STORAGE_MODE in {"db", "dual"}:
-        _persist_tis_to_db(schedule_data)
+        _persist_tis_to_db(schedule_data, preserve_dates=failed_dates)
 
     return ical_data
 
 
-def fetch_and_cache_bb_schedule():
-    """抓取 Blackboard 日历事件并写入启用的存储后端。"""
-    print("Fetching new schedule from Blackboard...")
-    runtime_token = _get_runtime_cas_token() if BB_USE_RUNTIME_CAS_TOKEN else None
+def _login_bb_service() -> bbService:
+    if CAS_SESSION_BROKER is not None:
+        return CAS_SESSION_BROKER.checkout("bb")
+
+    runtime_token = _warm_cas_token() if BB_USE_RUNTIME_CAS_TOKEN else None
     service = bbService(tgc_token=runtime_token)
     if not service.Login(
         use_qr=False, allow_password_fallback=CAS_QR_ALLOW_PASSWORD_FALLBACK
@@ -552,7 +987,184 @@ def fetch_and_cache_bb_schedule():
             raise ConnectionError("BB Login Failed.")
 
     _set_runtime_cas_token(service.TGC)
+    return service
+
+
+def _bb_tiers_active() -> bool:
+    return bool(BB_REFRESH_TIERS) and SCHEDULER is not None and STORAGE_MODE in {"db", "dual"}
+
 
+def _bb_source_name() -> str:
+    return EventSource.BB.value if EventSource is not None else "bb"
+
+
+def _bb_stored_ics() -> str:
+    """scheduler 中已存储的 BB 日历：优先物化缓存，尚无缓存行（或没有事件）时现场导出。"""
+    source_name = _bb_source_name()
+    return SCHEDULER.export_cached_ics(source_name) or SCHEDULER.export_ics(source=source_name)
+
+
+def _bb_refresh_windows(now: datetime) -> list:
+    """
+    按 BB_REFRESH_TIERS 划分刷新窗口（上海时区日界线），过去的部分并入最后一档的刷新间隔。
+
+    每个窗口包含查询范围 query_start/query_end 与写库范围 db_start/db_end；
+    最早与最晚窗口的写库范围不设边界，落在抓取范围之外的旧事件随之清理。
+    """
+    today = now.astimezone(SHANGHAI_TZ).replace(hour=0, minute=0, second=0, microsecond=0)
+    windows = []
+    cursor = 0
+    for end_days, interval in BB_REFRESH_TIERS:
+        end = SCHEDULE_FETCH_RANGE_DAYS if end_days is None else min(end_days, SCHEDULE_FETCH_RANGE_DAYS)
+        if end <= cursor:
+            break
+        windows.append(
+            {
+                "key": f"bb:{cursor}-{end}d",
+                "interval": interval,
+                "query_start": today + timedelta(days=cursor),
+                "query_end": today + timedelta(days=end),
+                "db_start": today + timedelta(days=cursor),
+                "db_end": today + timedelta(days=end),
+            }
+        )
+        cursor = end
+    if not windows:
+        return []
+    windows[-1]["db_end"] = None
+    if SCHEDULE_PAST_DAYS > 0:
+        windows.append(
+            {
+                "key": "bb:past",
+                "interval": windows[-1]["interval"],
+                "query_start": today - timedelta(days=SCHEDULE_PAST_DAYS),
+                "query_end": today,
+                "db_start": None,
+                "db_end": today,
+            }
+        )
+    else:
+        windows[0]["db_start"] = None
+    return windows
+
+
+def _due_bb_windows(now: datetime) -> list:
+    """返回距上次同步已超过各自刷新间隔（或从未同步）的窗口。"""
+    markers = SCHEDULER.get_sync_markers(_bb_source_name())
+    due = []
+    for window in _bb_refresh_windows(now):
+        marker = markers.get(window["key"])
+        if marker is None or (now - marker["synced_at"]).total_seconds() >= window["interval"]:
+            due.append(window)
+    return due
+
+
+def _fetch_bb_tiers(service, windows: list) -> tuple[list, list]:
+    """
+    逐个窗口查询并按窗口写入 scheduler，返回 (全部事件, 失败的窗口 key)。
+
+    窗口内有分段查询失败时，返回的事件只合并不删除，同步标记不更新，该窗口计入失败、下次刷新重试。
+    """
+    events = []
+    failed = []
+    for window in windows:
+        try:
+            result = service.queryCalendar(
+                window["query_start"], window["query_end"], report_failures=True
+            )
+        except Exception as exc:
+            print(f"[bb-tiers] window={window['key']} query exception: {exc}")
+            result = None
+        if result is None:
+            failed.append(window["key"])
+            continue
+        data, failed_chunks = result
+        _assert_refresh_lease("bb")
+        if failed_chunks:
+            count = SCHEDULER.merge_bb_raw_events(data)
+            print(
+                f"[bb-tiers] window={window['key']} partial failed_chunks={len(failed_chunks)} "
+                f"merged={count}"
+            )
+            failed.append(window["key"])
+            events.extend(data)
+            continue
+        count = SCHEDULER.replace_bb_window_events(
+            data,
+            key=window["key"],
+            window_start=window["db_start"],
+            window_end=window["db_end"],
+        )
+        print(f"[bb-tiers] window={window['key']} events={count}")
+        events.extend(data)
+    return events, failed
+
+
+def _fetch_bb_fallback_feed() -> tuple[str, bool, bool]:
+    """
+    以条件请求（If-None-Match / If-Modified-Since）获取 BB_ICAL_FEED_URL。
+
+    db / dual 模式下逐行流式解析为 VEvent 并 upsert 进 scheduler；304 时直接复用已存储的日历。
+
+    Returns:
+        (ical_data, db_synced, unchanged)
+    """
+    use_db = SCHEDULER is not None and STORAGE_MODE in {"db", "dual"}
+    if use_db:
+        marker = SCHEDULER.get_sync_markers(_bb_source_name()).get(BB_FEED_MARKER_KEY) or {}
+        validators = {"etag": marker.get("etag"), "last_modified": marker.get("http_last_modified")}
+    else:
+        validators = dict(_BB_FEED_VALIDATORS)
+
+    conditional_headers = {}
+    if validators.get("etag"):
+        conditional_headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        conditional_headers["If-Modified-Since"] = validators["last_modified"]
+
+    # 先发条件请求；304 但本地已没有可复用的日历时，再无条件请求一次。
+    attempts = [conditional_headers, {}] if conditional_headers else [{}]
+    for headers in attempts:
+        with requests.get(
+            BB_ICAL_FEED_URL, headers=headers, timeout=DEFAULT_TIMEOUT, stream=True
+        ) as response:
+            if response.status_code == 304:
+                cached = (
+                    SCHEDULER.export_cached_ics(_bb_source_name()) if use_db else _kv_get(BB_CACHE_KEY)
+                )
+                if cached:
+                    print("[info] BB fallback feed not modified (304), reuse stored calendar")
+                    return cached, use_db, True
+                continue
+            response.raise_for_status()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if response.encoding is None:
+                response.encoding = "utf-8"
+            lines = response.iter_lines(decode_unicode=True)
+
+            if use_db:
+                _assert_refresh_lease("bb")
+                count = SCHEDULER.replace_bb_feed_events(
+                    lines, key=BB_FEED_MARKER_KEY, etag=etag, last_modified=last_modified
+                )
+                if count == 0:
+                    raise ValueError("no events parsed from feed")
+                print(f"[info] BB fallback feed ingested, events={count}")
+                return _bb_stored_ics(), True, False
+
+            fallback_ical = "\r\n".join(lines).strip()
+            if not fallback_ical:
+                raise ValueError("empty response body")
+            _BB_FEED_VALIDATORS.update({"etag": etag, "last_modified": last_modified})
+            print(f"[info] BB fallback feed fetch succeeded, bytes={len(fallback_ical)}")
+            return fallback_ical, False, False
+    raise ValueError("feed returned 304 but no stored calendar to reuse")
+
+
+def fetch_and_cache_bb_schedule():
+    """抓取 Blackboard 日历事件并写入启用的存储后端。"""
+    print("Fetching new schedule from Blackboard...")
     today = datetime.now()
     start_date = today - timedelta(days=SCHEDULE_PAST_DAYS)
     end_date = today + timedelta(days=SCHEDULE_FETCH_RANGE_DAYS)
@@ -560,24 +1172,56 @@ def fetch_and_cache_bb_schedule():
     ical_data = None
     primary_failure = None
     db_synced = False
+    feed_unchanged = False
+    schedule_complete = True
+
+    tiered_windows = None
+    if _bb_tiers_active():
+        tiered_windows = _due_bb_windows(datetime.now(timezone.utc))
+        if not tiered_windows:
+            print("[bb-tiers] no refresh window due, skip upstream fetch")
+            return _bb_stored_ics()
+        print("[bb-tiers] due windows: " + ", ".join(w["key"] for w in tiered_windows))
+
+    if BB_ICAL_FEED_URL and BB_CIRCUIT.is_open():
+        # BB 后端熔断中：跳过 CAS 登录与日历查询，直接使用兜底订阅。
+        primary_failure = "BB circuit open"
+    else:
+        service = _login_bb_service()
+        if UPSTREAM_ASYNC_FETCH and async_client_available():
+            # 与 TIS 共用同一个上游事件循环，cron 并行刷新时两个来源的请求在一个循环内交错进行。
+            AsyncBbService(service).attach()
+        try:
+            if tiered_windows is None:
+                result = service.queryCalendar(start_date, end_date, report_failures=True)
+                if result is not None:
+                    schedule_data, failed_chunks = result
+                    schedule_complete = not failed_chunks
+                    if failed_chunks:
+                        print(f"[warn] BB partial fetch, failed_chunks={len(failed_chunks)}")
+            else:
+                schedule_data, failed_windows = _fetch_bb_tiers(service, tiered_windows)
+                # 部分窗口失败时保留其旧数据，标记未更新，下次刷新继续重试；
+                # 分段失败的窗口已合并了返回的事件，同样算作已写入，不能再整源替换。
+                db_synced = len(failed_windows) < len(tiered_windows) or bool(schedule_data)
+                schedule_complete = not failed_windows
+                if failed_windows:
+                    primary_failure = "tiered windows failed: " + ", ".join(failed_windows)
+                    print(f"[warn] BB {primary_failure}")
+        except Exception as exc:
+            primary_failure = f"queryCalendar exception: {exc}"
+        _release_service("bb", service if schedule_data or db_synced else None)
 
-    try:
-        schedule_data = service.queryCalendar(start_date, end_date)
-    except Exception as exc:
-        primary_failure = f"queryCalendar exception: {exc}"
-
-    if schedule_data:
+    if schedule_data or db_synced:
         print(f"[info] BB primary fetch succeeded, events={len(schedule_data)}")
-        if STORAGE_MODE in {"db", "dual"}:
-            _persist_bb_to_db(schedule_data)
+        if STORAGE_MODE in {"db", "dual"} and not db_synced:
+            _persist_bb_to_db(schedule_data, complete=schedule_complete)
             db_synced = True
 
         if SCHEDULER is not None and STORAGE_MODE in {"db", "dual"}:
-            source_name = "bb"
-            if EventSource is not None:
-                source_name = EventSource.BB.value
             try:
-                ical_data = SCHEDULER.export_ics(source=source_name)
+                # 分段刷新时 schedule_data 只含到期窗口，必须从 scheduler 导出完整日历。
+                ical_data = _bb_stored_ics()
             except Exception as exc:
                 print(
                     "[warn] BB db export failed, fallback to direct JSON->ICS conversion: "
@@ -595,15 +1239,7 @@ def fetch_and_cache_bb_schedule():
                 f"[info] BB primary fetch failed ({primary_failure}), fallback to BB_ICAL_FEED_URL"
             )
             try:
-                feed_response = requests.get(BB_ICAL_FEED_URL, timeout=20)
-                feed_response.raise_for_status()
-                fallback_ical = (feed_response.text or "").strip()
-                if not fallback_ical:
-                    raise ValueError("empty response body")
-                ical_data = fallback_ical
-                print(
-                    f"[info] BB fallback feed fetch succeeded, bytes={len(fallback_ical)}"
-                )
+                ical_data, db_synced, feed_unchanged = _fetch_bb_fallback_feed()
             except Exception as exc:
                 raise ConnectionError(f"BB fallback feed fetch failed: {exc}") from exc
         else:
@@ -612,8 +1248,8 @@ def fetch_and_cache_bb_schedule():
                 f"{primary_failure}"
             )
 
-    if STORAGE_MODE in {"kv", "dual"}:
-        kv_updated = _kv_set(BB_CACHE_KEY, ical_data)
+    if STORAGE_MODE in {"kv", "dual"} and not feed_unchanged:
+        kv_updated = _kv_set_calendar(BB_CACHE_KEY, ical_data, fence_source="bb")
         if kv_updated:
             print("Blackboard cache updated successfully in Vercel KV.")
         else:
@@ -621,8 +1257,9 @@ def fetch_and_cache_bb_schedule():
             if STORAGE_MODE == "kv":
                 raise ConnectionError("BB cache update failed in kv mode.")
 
-    if STORAGE_MODE in {"db", "dual"} and not db_synced:
-        _persist_bb_to_db(schedule_data or [])
+    # 兜底订阅源已直接写入 scheduler；这里只处理主路径未入库的情况，绝不用空列表覆盖 BB 数据。
+    if STORAGE_MODE in {"db", "dual"} and not db_synced and schedule_data:
+        _persist_bb_to_db(schedule_data)
 
     return ical_data
 
@@ -653,6 +1290,24 @@ def _refresh_source_with_lock(
             "duration_ms": int((time.time() - started) * 1000),
         }
 
+    lease = None
+    if REFRESH_LEASES is not None:
+        lease, holder = REFRESH_LEASES.acquire(source)
+        if holder is not None:
+            lock.release()
+            return {
+                "ok": False,
+                "source": source,
+                "status": "skipped",
+                "message": f"refresh lease held by {holder}",
+                "trigger": trigger,
+                "duration_ms": int((time.time() - started) * 1000),
+            }
+        if lease is None:
+            print(f"[lease] unavailable for source={source}, continue without lease")
+        else:
+            _ACTIVE_REFRESH_LEASES[source] = lease
+
     result = {
         "ok": True,
         "source": source,
@@ -660,12 +1315,15 @@ def _refresh_source_with_lock(
         "message": "",
         "trigger": trigger,
     }
+    if lease is not None:
+        result["lease"] = lease.describe()
     try:
-        payload = (
-            fetch_and_cache_tis_schedule()
-            if source == "tis"
-            else fetch_and_cache_bb_schedule()
-        )
+        with lease.write_fence() if lease is not None else contextlib.nullcontext():
+            payload = (
+                fetch_and_cache_tis_schedule()
+                if source == "tis"
+                else fetch_and_cache_bb_schedule()
+            )
         if isinstance(payload, str):
             result["payload_size"] = len(payload)
         elif isinstance(payload, (list, dict)):
@@ -678,11 +1336,34 @@ def _refresh_source_with_lock(
         result["message"] = str(exc)
     finally:
         result["duration_ms"] = int((time.time() - started) * 1000)
+        if lease is not None:
+            _ACTIVE_REFRESH_LEASES.pop(source, None)
+            lease.release()
         lock.release()
 
     return result
 
 
+def _run_queued_refresh(source: str, trigger: str) -> dict:
+    print(f"[refresh-queue] start source={source} trigger={trigger}")
+    result = _refresh_source_with_lock(source, trigger=trigger, blocking=True)
+    print(
+        "[refresh-queue] done "
+        f"source={source} status={result.get('status')} "
+        f"duration_ms={result.get('duration_ms')} "
+        f"message={result.get('message', '')}"
+    )
+    return result
+
+
+# 进程内唯一的刷新队列；cron / ICS 命中都只提交请求，同一来源的触发会合并。
+REFRESH_QUEUE = RefreshQueue(
+    _run_queued_refresh,
+    workers=REFRESH_QUEUE_WORKERS,
+    background_min_interval=ICS_ASYNC_REFRESH_MIN_INTERVAL,
+)
+
+
 def _trigger_async_refresh(source: str, reason: str) -> dict:
     if not ICS_ASYNC_REFRESH_ENABLED:
         return {"scheduled": False, "reason": "disabled"}
@@ -690,40 +1371,21 @@ def _trigger_async_refresh(source: str, reason: str) -> dict:
     if source not in _REFRESH_SOURCE_LOCKS:
         return {"scheduled": False, "reason": "unknown-source"}
 
-    now = time.time()
-    with _ASYNC_REFRESH_STATE_LOCK:
-        elapsed = now - _LAST_ASYNC_REFRESH_AT[source]
-        if elapsed < ICS_ASYNC_REFRESH_MIN_INTERVAL:
-            return {
-                "scheduled": False,
-                "reason": "cooldown",
-                "retry_after_seconds": int(ICS_ASYNC_REFRESH_MIN_INTERVAL - elapsed),
-            }
-
-        if _REFRESH_SOURCE_LOCKS[source].locked():
-            return {"scheduled": False, "reason": "running"}
-
-        _LAST_ASYNC_REFRESH_AT[source] = now
-
-    def _worker() -> None:
-        print(f"[ics-refresh] start source={source} reason={reason}")
-        refresh_result = _refresh_source_with_lock(
-            source, trigger=f"ics:{reason}", blocking=False
-        )
-        print(
-            "[ics-refresh] done "
-            f"source={source} status={refresh_result.get('status')} "
-            f"duration_ms={refresh_result.get('duration_ms')} "
-            f"message={refresh_result.get('message', '')}"
-        )
-
-    thread = threading.Thread(
-        target=_worker,
-        name=f"ics-refresh-{source}",
-        daemon=True,
+    # 节流由队列按优先级处理：后台触发在 ICS_ASYNC_REFRESH_MIN_INTERVAL 内被丢弃，手动 / cron 不受影响。
+    ticket = REFRESH_QUEUE.submit(
+        source, trigger=f"ics:{reason}", priority=PRIORITY_BACKGROUND
     )
-    thread.start()
-    return {"scheduled": True, "reason": "started"}
+    if ticket.state == "throttled":
+        return {
+            "scheduled": False,
+            "reason": "cooldown",
+            "retry_after_seconds": ticket.result["retry_after_seconds"],
+        }
+    return {
+        "scheduled": True,
+        "reason": "coalesced" if ticket.coalesced else "queued",
+        "state": ticket.state,
+    }
 
 
 def _run_qr_bootstrap_loop() -> None:
@@ -737,6 +1399,11 @@ def _run_qr_bootstrap_loop() -> None:
 
     while True:
         try:
+            if _warm_cas_token():
+                # 已有可用的 TGC（含重启后从存储加载的），无需再次扫码。
+                time.sleep(CAS_TOKEN_REVALIDATE_SECONDS)
+                continue
+
             payload = manager.create_session()
             session_id = str(payload.get("session_id") or "")
             signature = str(payload.get("signature") or "")
@@ -839,7 +1506,11 @@ def _is_cron_request_authorized() -> bool:
 
 @app.route("/api/cron/fetch")
 def cron_fetch_handler():
-    """由 Vercel Cron Job 调用的受保护的 API 端点"""
+    """
+    由 Vercel Cron Job 调用的受保护的 API 端点。
+
+    管理员手动刷新时附加 manual=1，以最高优先级插到排队中的 ICS 命中 / cron 任务之前。
+    """
     request_started_at = time.time()
     request_id = (
         request.headers.get("x-vercel-id")
@@ -847,10 +1518,13 @@ def cron_fetch_handler():
         or "n/a"
     )
     source = request.args.get("source", "all").strip().lower()
+    manual = request.args.get("manual", "").strip().lower() in {"1", "true", "yes", "on"}
+    trigger_kind = "manual" if manual else "cron"
     user_agent = request.headers.get("user-agent", "unknown")
 
     print(
-        f"[cron] incoming request_id={request_id} source={source} user_agent={user_agent}"
+        f"[cron] incoming request_id={request_id} source={source} "
+        f"trigger={trigger_kind} user_agent={user_agent}"
     )
 
     # 安全检查
@@ -872,15 +1546,35 @@ def cron_fetch_handler():
         auth_mode = "bearer"
     print(f"[cron] authorized request_id={request_id} auth_mode={auth_mode}")
 
-    steps = {}
+    # source=all 时两个来源同时入队，由不同 worker 并行刷新，总耗时取两者中较长的一个。
     ordered_sources = ["tis", "bb"] if source == "all" else [source]
+    tickets = {}
     for source_name in ordered_sources:
         print(f"[cron] refresh start request_id={request_id} source={source_name}")
-        result = _refresh_source_with_lock(
+        tickets[source_name] = REFRESH_QUEUE.submit(
             source_name,
-            trigger=f"cron:{request_id}",
-            blocking=False,
+            trigger=f"{trigger_kind}:{request_id}",
+            priority=PRIORITY_MANUAL if manual else PRIORITY_CRON,
         )
+
+    steps = {}
+    for source_name, ticket in tickets.items():
+        deadline = request_started_at + CRON_SOURCE_DEADLINES[source_name]
+        result = ticket.wait(timeout=max(0.0, deadline - time.time()))
+        if result is None:
+            result = {
+                "ok": False,
+                "source": source_name,
+                "status": "deadline_exceeded",
+                "message": (
+                    f"deadline {CRON_SOURCE_DEADLINES[source_name]:.0f}s exceeded before the refresh "
+                    "finished; the function may be frozen after this response, so the refresh is not "
+                    "guaranteed to complete"
+                ),
+                "trigger": f"{trigger_kind}:{request_id}",
+                "duration_ms": int((time.time() - request_started_at) * 1000),
+                "queue": ticket.describe(),
+            }
         steps[source_name] = result
         print(
             "[cron] refresh done "
@@ -894,6 +1588,7 @@ def cron_fetch_handler():
         "ok": ok,
         "request_id": request_id,
         "source": source,
+        "trigger": trigger_kind,
         "auth_mode": auth_mode,
         "duration_ms": int((time.time() - request_started_at) * 1000),
         "steps": steps,
@@ -915,7 +1610,39 @@ def health():
         "bb_fallback_configured": bool(BB_ICAL_FEED_URL),
         "holiday_provider_available": HOLIDAY_PROVIDER is not None,
         "tis_exclude_holiday_events": TIS_EXCLUDE_HOLIDAY_EVENTS,
+        "tis_fetch_mode": TIS_FETCH_MODE,
+        "tis_concurrency_limit": (
+            TIS_CONCURRENCY_CONTROLLER.limit
+            if TIS_CONCURRENCY_CONTROLLER is not None
+            else None
+        ),
         "ics_async_refresh_enabled": ICS_ASYNC_REFRESH_ENABLED,
+        "refresh_queue": REFRESH_QUEUE.stats(),
+        "cas_token_store": (
+            CAS_TOKEN_STORE.backend.name if CAS_TOKEN_STORE is not None else "none"
+        ),
+        "cas_token_validated_age_seconds": (
+            int(time.time() - _RUNTIME_CAS_TOKEN_VALIDATED_AT)
+            if _RUNTIME_CAS_TOKEN is not None
+            else None
+        ),
+        "cas_session_broker": (
+            CAS_SESSION_BROKER.stats if CAS_SESSION_BROKER is not None else None
+        ),
+        "refresh_lease_backend": (
+            REFRESH_LEASES.backend.name if REFRESH_LEASES is not None else "none"
+        ),
+        "http_pools": transport_stats(),
+        "bb_window_days": window_memory_snapshot()["days"],
+        "bb_circuit": BB_CIRCUIT.stats,
+        "bb_refresh_tiers": (
+            [
+                {"end_days": end_days, "interval_seconds": interval}
+                for end_days, interval in BB_REFRESH_TIERS
+            ]
+            if _bb_tiers_active()
+            else None
+        ),
         "qr_bootstrap_enabled": CAS_QR_BOOTSTRAP_ENABLED,
     }
 
@@ -933,52 +1660,58 @@ def app_features_version():
     }
 
 
-@app.route("/tis/schedule.ics")
-def get_tis_schedule():
-    """提供 TIS 课表日历 (按存储模式读取)"""
+def _serve_calendar(source: str, filename: str):
+    """按 token 校验后返回日历；If-None-Match / If-Modified-Since 命中时返回无正文的 304。"""
     provided_token = request.args.get("token")
     if not ICAL_TOKEN or provided_token != ICAL_TOKEN:
         abort(401, "Unauthorized: Invalid or missing token.")
 
-    ical_data = _read_calendar_payload("tis")
-    refresh_meta = _trigger_async_refresh("tis", reason="tis-ics-hit")
-    print(f"[ics] source=tis cache_hit={bool(ical_data)} refresh={refresh_meta}")
+    entry = _read_calendar_entry(source)
+    refresh_meta = _trigger_async_refresh(source, reason=f"{source}-ics-hit")
 
-    if not ical_data:
+    if not entry:
+        print(f"[ics] source={source} cache_hit=False refresh={refresh_meta}")
         return (
             "Calendar data is not yet available. Please wait for the next scheduled update (up to 12 hours) or trigger it manually if you are the admin.",
             404,
         )
 
-    return Response(
-        ical_data,
+    available = [name for name, data in entry["encodings"].items() if data]
+    encoding = request.accept_encodings.best_match(available) if available else None
+    response = Response(
+        entry["encodings"][encoding] if encoding else entry["body"],
         mimetype="text/calendar",
-        headers={"Content-Disposition": "attachment; filename=tis_schedule.ics"},
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
+    response.vary.add("Accept-Encoding")
+    if encoding:
+        response.content_encoding = encoding
+        # 不同编码的字节不同，强 ETag 必须区分。
+        response.set_etag(f"{entry['etag']}-{encoding}")
+    else:
+        response.set_etag(entry["etag"])
+    if entry["last_modified"] is not None:
+        response.last_modified = entry["last_modified"]
+    # 允许客户端缓存，但每次都带校验头回源确认。
+    response.cache_control.no_cache = True
+    response.make_conditional(request)
+    print(
+        f"[ics] source={source} cache_hit=True status={response.status_code} "
+        f"encoding={encoding or 'identity'} refresh={refresh_meta}"
+    )
+    return response
+
+
+@app.route("/tis/schedule.ics")
+def get_tis_schedule():
+    """提供 TIS 课表日历 (按存储模式读取)"""
+    return _serve_calendar("tis", "tis_schedule.ics")
 
 
 @app.route("/blackboard/schedule.ics")
 def get_bb_schedule():
     """提供 Blackboard DDL 日历 (按存储模式读取)"""
-    provided_token = request.args.get("token")
-    if not ICAL_TOKEN or provided_token != ICAL_TOKEN:
-        abort(401, "Unauthorized: Invalid or missing token.")
-
-    ical_data = _read_calendar_payload("bb")
-    refresh_meta = _trigger_async_refresh("bb", reason="bb-ics-hit")
-    print(f"[ics] source=bb cache_hit={bool(ical_data)} refresh={refresh_meta}")
-
-    if not ical_data:
-        return (
-            "Calendar data is not yet available. Please wait for the next scheduled update (up to 12 hours) or trigger it manually if you are the admin.",
-            404,
-        )
-
-    return Response(
-        ical_data,
-        mimetype="text/calendar",
-        headers={"Content-Disposition": "attachment; filename=bb_schedule.ics"},
-    )
+    return _serve_calendar("bb", "bb_schedule.ics")
 
 
 @app.route("/bb/schedule.ics")
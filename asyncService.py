@@ -0,0 +1,248 @@
+"""
+asyncio 版本的 TIS 逐日课表 / Blackboard 日历窗口抓取客户端。
+
+进程内只有一个常驻的上游事件循环（shared_loop），TIS 与 BB 的异步请求都提交到这一个循环上，
+cron 并行刷新两个来源时，两边的全部在途请求由同一个循环承载，不再各自占用线程。
+复用同步服务登录后得到的 CAS / 业务 cookie；登录、自适应拆分与入库仍由同步的 TisService / bbService 完成。
+失败语义与同步路径一致：TIS 非 200 抛出 HTTPError，计入失败日期并走重试 / 保留旧数据逻辑，
+并发上限由同一个 AIMD 控制器决定；BB 窗口失败返回 None、被熔断器拒绝返回 _REJECTED，交给自适应拆分处理。
+"""
+
+import asyncio
+import collections
+import threading
+import time
+from typing import Optional
+
+import requests
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+import bbService as bb_module
+from casService import CasService
+from tisService import _classify_failure
+
+TIS_SCHEDULE_URL = "https://tis.sustech.edu.cn/component/queryrcxxlist"
+BB_CALENDAR_URL = "https://bb.sustech.edu.cn/webapps/calendar/calendarData/selectedCalendarEvents"
+
+_LOOP_LOCK = threading.Lock()
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+
+def async_client_available() -> bool:
+    return httpx is not None
+
+
+def shared_loop() -> asyncio.AbstractEventLoop:
+    """进程内共享的上游事件循环，首次使用时在守护线程中启动并常驻。"""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None or _LOOP.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="upstream-loop", daemon=True).start()
+            _LOOP = loop
+        return _LOOP
+
+
+def run_on_shared_loop(coro):
+    """在共享事件循环上执行协程并阻塞等待结果，供同步调用方使用。"""
+    return asyncio.run_coroutine_threadsafe(coro, shared_loop()).result()
+
+
+def _cookies_from_service(service: CasService) -> "httpx.Cookies":
+    """把 requests 会话中的 cookie（含 TGC 与业务会话）复制给 httpx。"""
+    cookies = httpx.Cookies()
+    for cookie in service.session.cookies:
+        cookies.set(cookie.name, cookie.value, domain=cookie.domain or "", path=cookie.path or "/")
+    if service.TGC and not service.session.cookies.get("TGC"):
+        cookies.set("TGC", service.TGC, domain="cas.sustech.edu.cn", path="/")
+    return cookies
+
+
+def _classify_async_failure(exc: Exception) -> Optional[str]:
+    """httpx 的超时 / 连接异常映射为与同步路径相同的降并发原因。"""
+    if httpx is not None:
+        if isinstance(exc, httpx.TimeoutException):
+            return "timeout"
+        if isinstance(exc, httpx.TransportError):
+            return "connection"
+    return _classify_failure(exc)
+
+
+class _AsyncServiceBase:
+    def __init__(self, service: CasService, *, max_concurrency: int = 64, timeout: float = 20.0):
+        if httpx is None:
+            raise RuntimeError("httpx is required for async fetch clients")
+        self.service = service
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.timeout = timeout
+
+    def _client(self) -> "httpx.AsyncClient":
+        limits = httpx.Limits(
+            max_connections=self.max_concurrency,
+            max_keepalive_connections=self.max_concurrency,
+        )
+        return httpx.AsyncClient(
+            cookies=_cookies_from_service(self.service),
+            headers=self.service.headers.copy(),
+            timeout=self.timeout,
+            limits=limits,
+            follow_redirects=True,
+        )
+
+
+class AsyncTisService(_AsyncServiceBase):
+    """基于已登录 TisService 的异步课表抓取。"""
+
+    async def querySchedule(self, client: "httpx.AsyncClient", date: str):
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+            "Accept": "*/*",
+            "X-Requested-With": "XMLHttpRequest",
+            "Origin": "https://tis.sustech.edu.cn",
+            "Referer": "https://tis.sustech.edu.cn/authentication/main",
+        }
+        response = await client.post(TIS_SCHEDULE_URL, headers=headers, data={"rcrq": date})
+        if response.status_code != 200:
+            raise requests.HTTPError(
+                f"querySchedule {date} failed with status {response.status_code}",
+                response=response,
+            )
+        return response.json()
+
+    async def _timed_query(self, client: "httpx.AsyncClient", date_str: str):
+        started = time.monotonic()
+        data = await self.querySchedule(client, date_str)
+        return data, time.monotonic() - started
+
+    async def fetch_dates(self, dates: list) -> tuple[dict, list]:
+        """
+        在一个事件循环内抓取全部日期，返回 (结果, 失败日期)，语义同 TisService._fetch_dates。
+
+        TisService 设置了 concurrency_controller 时，同时在途的请求数跟随 AIMD 上限变化
+        （不超过 max_concurrency），并回报每个请求的耗时与失败类型。
+        """
+        result = {}
+        failed_dates = []
+        if not dates:
+            return result, failed_dates
+
+        controller = getattr(self.service, "concurrency_controller", None)
+        pending = collections.deque(dates)
+        in_flight = {}
+        async with self._client() as client:
+            while pending or in_flight:
+                limit = self.max_concurrency
+                if controller is not None:
+                    limit = min(limit, controller.limit)
+                while pending and len(in_flight) < limit:
+                    date_str = pending.popleft()
+                    task = asyncio.ensure_future(self._timed_query(client, date_str))
+                    in_flight[task] = (date_str, controller.epoch if controller is not None else 0)
+
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    date_str, epoch = in_flight.pop(task)
+                    try:
+                        data, latency = task.result()
+                    except Exception as exc:
+                        print(f"Fetching for {date_str} generated an exception: {exc}")
+                        failed_dates.append(date_str)
+                        result[date_str] = []
+                        reason = _classify_async_failure(exc)
+                        if controller is not None and reason is not None:
+                            controller.on_failure(reason, epoch)
+                        continue
+                    if controller is not None:
+                        controller.on_success(latency, epoch)
+                    result[date_str] = data or []
+        return result, failed_dates
+
+    def fetch_dates_blocking(self, dates: list) -> tuple[dict, list]:
+        """供同步调用方（包括 weekly 模式的分批抓取）使用，请求在共享事件循环上执行。"""
+        return run_on_shared_loop(self.fetch_dates(dates))
+
+    def attach(self) -> None:
+        """让同步 TisService 的逐日抓取走异步客户端。"""
+        self.service.day_fetcher = self.fetch_dates_blocking
+
+
+class AsyncBbService(_AsyncServiceBase):
+    """基于已登录 bbService 的异步日历窗口请求，替换 _request_windows 中每轮的线程池。"""
+
+    def __init__(self, service: CasService, *, max_concurrency: Optional[int] = None, timeout: float = 20.0):
+        if max_concurrency is None:
+            max_concurrency = bb_module.BB_CHUNK_PARALLELISM
+        super().__init__(service, max_concurrency=max_concurrency, timeout=timeout)
+
+    async def _request_window(
+        self,
+        client: "httpx.AsyncClient",
+        semaphore: asyncio.Semaphore,
+        headers: dict,
+        window_start,
+        window_end,
+    ):
+        """语义同 bbService._request_calendar_window：成功返回 list，失败返回 None，被熔断器拒绝返回 _REJECTED。"""
+        label = f"{window_start.strftime('%Y-%m-%d')} -> {window_end.strftime('%Y-%m-%d')}"
+        # 只有无法再拆分的最小窗口失败才说明后端异常，计入熔断器。
+        count_failure = max(1, (window_end - window_start).days) <= bb_module.BB_MIN_WINDOW_DAYS
+        params = {
+            "start": int(window_start.timestamp() * 1000),
+            "end": int(window_end.timestamp() * 1000),
+            "course_id": "",
+            "mode": "personal",
+        }
+        async with semaphore:
+            breaker = bb_module.BB_CIRCUIT
+            if not breaker.allow_request():
+                return bb_module._REJECTED
+            try:
+                response = await client.get(BB_CALENDAR_URL, headers=headers, params=params)
+            except httpx.HTTPError as exc:
+                breaker.record_failure(count=count_failure)
+                print(f"[bb-async] calendar request exception chunk={label}: {exc}")
+                return None
+
+        node = bb_module._backend_node(response)
+        if response.status_code != 200:
+            breaker.record_failure(node, response.status_code, count=count_failure)
+            if bb_module._AOP_CONTEXT_ERROR in (response.text or ""):
+                self.service._context_error = True
+            print(f"[bb-async] calendar request failed chunk={label} status={response.status_code}")
+            return None
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        if not isinstance(payload, list):
+            breaker.record_failure(node, response.status_code, count=count_failure)
+            print(f"[bb-async] calendar request got non-list payload chunk={label}")
+            return None
+        breaker.record_success(node, response.status_code)
+        return payload
+
+    async def request_windows(self, headers: dict, pending: list, phase: str) -> list:
+        """并发请求一轮窗口，结果与 pending 顺序一致。"""
+        # 会话重建后 cookie jar 会被替换，每轮都从当前会话复制 cookie。
+        self.service._ensure_calendar_timezone_cookie()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._client() as client:
+            return list(
+                await asyncio.gather(
+                    *(
+                        self._request_window(client, semaphore, headers, window_start, window_end)
+                        for window_start, window_end, _attempt in pending
+                    )
+                )
+            )
+
+    def request_windows_blocking(self, headers: dict, pending: list, phase: str) -> list:
+        return run_on_shared_loop(self.request_windows(headers, pending, phase))
+
+    def attach(self) -> None:
+        """让同步 bbService 的窗口请求走共享事件循环。"""
+        self.service.window_requester = self.request_windows_blocking
@@ -1,15 +1,94 @@
+import concurrent.futures
 import requests
 from casService import CasService
 import json
 import datetime
 import dotenv
+import os
+import threading
 import time
 from typing import Optional
 
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from http_transport import DEFAULT_POOL_MAXSIZE, create_session
+
 dotenv.load_dotenv(".env")  # 加载 .env 文件中的环境变量
 
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# 自适应分片：失败的窗口对半拆分，直到不小于该天数。
+BB_MIN_WINDOW_DAYS = max(1, _env_int("BB_MIN_WINDOW_DAYS", 7))
+# 记住的成功窗口在该时长（秒）后失效，重新从完整区间开始尝试。
+BB_WINDOW_MEMORY_SECONDS = max(0, _env_int("BB_WINDOW_MEMORY_SECONDS", 6 * 3600))
+# 同一轮内并发请求的窗口数上限。
+BB_CHUNK_PARALLELISM = max(1, _env_int("BB_CHUNK_PARALLELISM", 3))
+# 日历上下文预热后在该时长（秒）内不再重复预热，除非遇到上下文类错误。
+BB_WARMUP_TTL_SECONDS = max(0, _env_int("BB_WARMUP_TTL_SECONDS", 600))
+
+_AOP_CONTEXT_ERROR = "Could not initialize class org.springframework.aop.config.AopConfigUtils"
+
+# 所有 bbService 实例共享的熔断器：BB 后端整体异常时直接转入 BB_ICAL_FEED_URL 兜底。
+BB_CIRCUIT = CircuitBreaker(
+    "bb",
+    failure_rate=min(1.0, max(0.05, _env_float("BB_CIRCUIT_FAILURE_RATE", 0.5))),
+    min_calls=max(1, _env_int("BB_CIRCUIT_MIN_CALLS", 4)),
+    window_seconds=max(10, _env_int("BB_CIRCUIT_WINDOW_SECONDS", 300)),
+    open_seconds=max(5, _env_int("BB_CIRCUIT_OPEN_SECONDS", 120)),
+)
+# 半开期间被拒绝的窗口，等待探测结果后下一轮重新请求。
+_REJECTED = object()
+# 被拒绝的窗口重新排队前的退避（秒，按轮次翻倍）与最多等待轮数，避免半开期间空转。
+_REJECTED_BACKOFF_SECONDS = 0.5
+_REJECTED_MAX_ROUNDS = 4
+
+
+def _backend_node(response: requests.Response) -> Optional[str]:
+    """从 Via / Server 响应头识别处理请求的后端节点。"""
+    return response.headers.get("Via") or response.headers.get("Server")
+
+
+_WINDOW_MEMORY_LOCK = threading.Lock()
+# 最近一次成功的最大窗口（天）及记录时间；None 表示直接请求完整区间。
+_WINDOW_MEMORY = {"days": None, "updated_at": 0.0}
+
+
+def _preferred_window_days() -> Optional[int]:
+    with _WINDOW_MEMORY_LOCK:
+        days = _WINDOW_MEMORY["days"]
+        if days is not None and time.time() - _WINDOW_MEMORY["updated_at"] > BB_WINDOW_MEMORY_SECONDS:
+            _WINDOW_MEMORY["days"] = None
+            return None
+        return days
+
+
+def _remember_window_days(days: Optional[int]) -> None:
+    with _WINDOW_MEMORY_LOCK:
+        _WINDOW_MEMORY["days"] = days
+        _WINDOW_MEMORY["updated_at"] = time.time()
+
+
+def window_memory_snapshot() -> dict:
+    with _WINDOW_MEMORY_LOCK:
+        return dict(_WINDOW_MEMORY)
+
+
 class bbService(CasService):
+    # 同一轮窗口请求与三个预热页面都可能并发，连接池在创建会话时按此确定。
+    POOL_MAXSIZE = max(DEFAULT_POOL_MAXSIZE, BB_CHUNK_PARALLELISM, 3)
+
     def __init__(
         self,
         username: Optional[str] = None,
@@ -23,20 +102,11 @@ class bbService(CasService):
             tgc_token=tgc_token,
             session=session,
         )
-
-    def _is_probable_cas_login_page(self, response: requests.Response) -> bool:
-        final_url = (response.url or "").lower()
-        if "cas.sustech.edu.cn/cas/login" in final_url:
-            return True
-
-        page_text = (response.text or "")[:8000].lower()
-        markers = (
-            "cas.sustech.edu.cn/cas/login",
-            'name="execution"',
-            'name="_eventid"',
-            'name="username"',
-        )
-        return any(marker in page_text for marker in markers)
+        # 最近一次成功预热日历上下文的时间；_context_error 表示之后出现过上下文类错误。
+        self._calendar_primed_at = 0.0
+        self._context_error = False
+        # 可替换的一轮窗口请求实现，签名同 _request_windows（见 asyncService.AsyncBbService.attach）。
+        self.window_requester = None
 
     def _calendar_request_headers(self) -> dict:
         headers = self.headers.copy()
@@ -62,18 +132,35 @@ class bbService(CasService):
         )
 
     def _warmup_calendar_context(self, headers: dict) -> None:
-        """预热日历上下文，降低 selectedCalendarEvents 直接 500 的概率。"""
+        """
+        预热日历上下文，降低 selectedCalendarEvents 直接 500 的概率。
+
+        预热后 BB_WARMUP_TTL_SECONDS 内跳过，除非期间出现了 AopConfigUtils 等上下文类错误；
+        需要预热时三个页面并发请求。
+        """
         self._ensure_calendar_timezone_cookie()
+        primed_age = time.time() - self._calendar_primed_at
+        if not self._context_error and primed_age < BB_WARMUP_TTL_SECONDS:
+            return
         warmup_urls = [
             "https://bb.sustech.edu.cn/webapps/calendar/viewMyBb?globalNavigation=false",
             "https://bb.sustech.edu.cn/webapps/calendar/viewPersonal",
             "https://bb.sustech.edu.cn/webapps/calendar/calendarData/calendars",
         ]
-        for url in warmup_urls:
+
+        def _prime(url: str) -> bool:
             try:
-                self.session.get(url, headers=headers, timeout=20, allow_redirects=True)
+                response = self.session.get(url, headers=headers, timeout=20, allow_redirects=True)
             except requests.RequestException as exc:
                 print(f"BB calendar warmup request failed for {url}: {exc}")
+                return False
+            return response.status_code == 200
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(warmup_urls)) as executor:
+            primed = list(executor.map(_prime, warmup_urls))
+        if any(primed):
+            self._calendar_primed_at = time.time()
+            self._context_error = False
 
     def _safe_response_headers(self, response: requests.Response) -> dict:
         """只记录少量对排障有帮助的响应头，避免噪音过大。"""
@@ -161,8 +248,13 @@ class bbService(CasService):
         attempt: int,
         max_attempts: int,
         chunk_label: Optional[str] = None,
+        count_failure: bool = True,
     ):
-        """请求一个时间窗口内的 Blackboard 日历事件。成功返回 list，失败返回 None。"""
+        """
+        请求一个时间窗口内的 Blackboard 日历事件。成功返回 list，失败返回 None。
+
+        count_failure=False 时失败不计入熔断器失败率（窗口还会被拆分重试，大窗口 500 属于正常现象）。
+        """
         url = "https://bb.sustech.edu.cn/webapps/calendar/calendarData/selectedCalendarEvents"
         params = {
             "start": start_ts,
@@ -171,10 +263,13 @@ class bbService(CasService):
             "mode": "personal",
         }
 
+        if not BB_CIRCUIT.allow_request():
+            raise CircuitOpenError("BB circuit open")
         try:
             self._ensure_calendar_timezone_cookie()
             response = self.session.get(url, headers=headers, params=params, timeout=20)
         except requests.RequestException as exc:
+            BB_CIRCUIT.record_failure(count=count_failure)
             error_payload = {
                 "phase": phase,
                 "attempt": attempt,
@@ -186,7 +281,9 @@ class bbService(CasService):
             print("[bb-debug] calendar request exception=" + json.dumps(error_payload, ensure_ascii=True))
             return None
 
+        node = _backend_node(response)
         if response.status_code != 200:
+            BB_CIRCUIT.record_failure(node, response.status_code, count=count_failure)
             print(f"Query BB calendar failed! Status code: {response.status_code}")
             self._log_calendar_failure_context(
                 response,
@@ -197,7 +294,8 @@ class bbService(CasService):
                 end_ts=end_ts,
                 chunk_label=chunk_label,
             )
-            if "Could not initialize class org.springframework.aop.config.AopConfigUtils" in (response.text or ""):
+            if _AOP_CONTEXT_ERROR in (response.text or ""):
+                self._context_error = True
                 print(
                     "BB server-side Spring initialization error detected; retry later or re-login to hit another backend node."
                 )
@@ -212,6 +310,7 @@ class bbService(CasService):
         try:
             payload = response.json()
         except ValueError:
+            BB_CIRCUIT.record_failure(node, response.status_code, count=count_failure)
             preview = (response.text or "")[:300].replace("\n", " ")
             print(
                 "Query BB calendar got non-JSON 200 response. "
@@ -220,11 +319,105 @@ class bbService(CasService):
             return None
 
         if not isinstance(payload, list):
+            BB_CIRCUIT.record_failure(node, response.status_code, count=count_failure)
             print(f"Query BB calendar got unexpected JSON shape: {type(payload).__name__}")
             return None
 
+        BB_CIRCUIT.record_success(node, response.status_code)
         return payload
 
+    def _request_windows(self, headers: dict, pending: list, phase: str) -> list:
+        """并发请求一轮窗口，结果与 pending 顺序一致（失败为 None，被熔断器拒绝为 _REJECTED）。"""
+        if self.window_requester is not None:
+            return self.window_requester(headers, pending, phase)
+
+        def _fetch(item):
+            window_start, window_end, attempt = item
+            try:
+                return self._request_calendar_window(
+                    headers,
+                    int(window_start.timestamp() * 1000),
+                    int(window_end.timestamp() * 1000),
+                    phase=phase,
+                    attempt=attempt,
+                    max_attempts=2,
+                    chunk_label=f"{window_start.strftime('%Y-%m-%d')} -> {window_end.strftime('%Y-%m-%d')}",
+                    # 只有无法再拆分的最小窗口失败才说明后端异常，计入熔断器。
+                    count_failure=max(1, (window_end - window_start).days) <= BB_MIN_WINDOW_DAYS,
+                )
+            except CircuitOpenError:
+                return _REJECTED
+
+        workers = min(BB_CHUNK_PARALLELISM, len(pending))
+        if workers <= 1:
+            return [_fetch(item) for item in pending]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_fetch, pending))
+
+    def _fetch_windows_adaptive(self, headers: dict, windows: list) -> tuple[list, list, int]:
+        """
+        按轮次并发请求窗口：失败的窗口对半拆分进入下一轮，直到不大于 BB_MIN_WINDOW_DAYS；
+        最小窗口无法再拆分时在下一轮多给一次机会。
+
+        被熔断器拒绝的窗口：熔断器已打开时记为失败，已取得的窗口照常返回；
+        半开探测进行中时退避后下一轮重试，超过 _REJECTED_MAX_ROUNDS 轮仍被拒绝则记为失败。
+
+        Returns:
+            (payloads, failed_labels, best_days)：按窗口起点排序的成功结果、
+            最终失败的窗口标签，以及成功过的最大窗口天数（无成功为 0）。
+        """
+        results = {}
+        failed = {}
+        best_days = 0
+        pending = [(window_start, window_end, 1) for window_start, window_end in windows]
+        phase = "primary"
+        rejected_rounds = 0
+
+        while pending:
+            outcomes = self._request_windows(headers, pending, phase)
+            next_pending = []
+            rejected = []
+            for (window_start, window_end, attempt), data in zip(pending, outcomes):
+                label = f"{window_start.strftime('%Y-%m-%d')} -> {window_end.strftime('%Y-%m-%d')}"
+                if data is _REJECTED:
+                    rejected.append((window_start, window_end, attempt))
+                    continue
+                span_days = max(1, (window_end - window_start).days)
+                if data is not None:
+                    results[window_start] = data
+                    best_days = max(best_days, span_days)
+                    continue
+                if span_days > BB_MIN_WINDOW_DAYS:
+                    mid_local = window_start + datetime.timedelta(days=span_days // 2)
+                    print(f"[bb-debug] splitting failed window {label} at {mid_local.strftime('%Y-%m-%d')}")
+                    next_pending.append((window_start, mid_local, 1))
+                    next_pending.append((mid_local, window_end, 1))
+                elif attempt < 2:
+                    next_pending.append((window_start, window_end, attempt + 1))
+                else:
+                    print(f"Chunk query failed: {label}")
+                    failed[window_start] = label
+            if rejected:
+                rejected_rounds += 1
+                if BB_CIRCUIT.is_open() or rejected_rounds > _REJECTED_MAX_ROUNDS:
+                    for window_start, window_end, _attempt in rejected:
+                        label = f"{window_start.strftime('%Y-%m-%d')} -> {window_end.strftime('%Y-%m-%d')}"
+                        print(f"Chunk query rejected by circuit breaker: {label}")
+                        failed[window_start] = label
+                else:
+                    # 半开探测尚未结束，等待一段时间再让被拒绝的窗口重试。
+                    time.sleep(_REJECTED_BACKOFF_SECONDS * 2 ** (rejected_rounds - 1))
+                    next_pending.extend(rejected)
+            if next_pending:
+                # 每轮失败后最多预热一次上下文；仅上下文类错误或预热过期时才真正发请求。
+                self._warmup_calendar_context(headers)
+            pending = next_pending
+            phase = "split"
+
+        payloads = [results[key] for key in sorted(results)]
+        failed_labels = [failed[key] for key in sorted(failed)]
+        return payloads, failed_labels, best_days
+
     def _verify_bb_session(self) -> bool:
         """多端点验证登录状态，避免单个 BB 页面故障导致误判。"""
         checkpoints = [
@@ -243,6 +436,9 @@ class bbService(CasService):
         ]
 
         for name, url in checkpoints:
+            if not BB_CIRCUIT.allow_request():
+                print(f"BB circuit open, skip verification checkpoint {name}.")
+                return False
             try:
                 response = self.session.get(
                     url,
@@ -251,11 +447,18 @@ class bbService(CasService):
                     allow_redirects=True,
                 )
             except requests.RequestException as exc:
+                BB_CIRCUIT.record_failure()
                 print(f"BB verification checkpoint {name} request failed: {exc}")
                 continue
 
+            # 只有服务端错误计入熔断；跳回 CAS 属于会话问题，后端本身可用。
+            if response.status_code >= 500:
+                BB_CIRCUIT.record_failure(_backend_node(response), response.status_code)
+            else:
+                BB_CIRCUIT.record_success(_backend_node(response), response.status_code)
+
             if response.status_code >= 500:
-                if "Could not initialize class org.springframework.aop.config.AopConfigUtils" in (response.text or ""):
+                if _AOP_CONTEXT_ERROR in (response.text or ""):
                     print(
                         f"BB verification checkpoint {name} hit server-side Spring init error; trying next checkpoint."
                     )
@@ -283,6 +486,23 @@ class bbService(CasService):
 
         return False
 
+    def validate_session(self) -> bool:
+        """用一次日历页请求确认已登录的 BB 会话仍然有效（会话池复用前调用）。"""
+        try:
+            response = self.session.get(
+                "https://bb.sustech.edu.cn/webapps/calendar/viewPersonal",
+                headers=self.headers,
+                timeout=10,
+                allow_redirects=True,
+            )
+        except requests.RequestException as exc:
+            print(f"BB session check failed: {exc}")
+            return False
+        if response.status_code >= 500:
+            # BB 偶发的服务端错误与会话无关，保留会话交给后续查询处理。
+            return True
+        return response.status_code == 200 and not self._is_probable_cas_login_page(response)
+
     def LoginBB(self):
         if self.TGC is None:
             print("TGC cookie not found. Please login CAS first.")
@@ -336,12 +556,14 @@ class bbService(CasService):
         print("BB login verification failed: all checkpoints unavailable or redirected to CAS.")
         return False
 
-    def queryCalendar(self, start_date: datetime, end_date: datetime):
+    def queryCalendar(self, start_date: datetime, end_date: datetime, *, report_failures: bool = False):
         """
         查询 Blackboard 日历事件。
 
         :param start_date: 查询范围的开始时间 (datetime object)
         :param end_date: 查询范围的结束时间 (datetime object)
+        :param report_failures: 为 True 时返回 (事件列表, 失败分段标签列表)，
+            调用方据此区分完整结果与部分分段失败的结果（后者不能用来删除区间内的旧事件）
         :return: 包含日历事件的列表 (list of dicts)，如果失败则返回 None
         """
         cst = datetime.timezone(datetime.timedelta(hours=8))
@@ -357,144 +579,99 @@ class bbService(CasService):
         if end_local <= start_local:
             end_local = start_local + datetime.timedelta(days=1)
 
-        # 将 datetime 对象转换为毫秒级 Unix 时间戳（归一化到上海时区日界线）
-        start_ts = int(start_local.timestamp() * 1000)
-        end_ts = int(end_local.timestamp() * 1000)
+        # 窗口边界归一化到上海时区日界线，请求时再转换为毫秒级 Unix 时间戳。
         print(
             "[bb-debug] normalized query window "
             f"start_cst={start_local.isoformat()} end_cst={end_local.isoformat()}"
         )
-        def _query_once() -> Optional[list]:
+        if BB_CIRCUIT.is_open():
+            raise CircuitOpenError("BB circuit open, skip calendar query")
+
+        def _query_once() -> Optional[tuple[list, list]]:
             headers = self._calendar_request_headers()
             self._warmup_calendar_context(headers)
 
-            # 第一阶段：整段重试，优先拿到完整区间。
-            max_attempts = 3
-            for attempt in range(1, max_attempts + 1):
-                data = self._request_calendar_window(
-                    headers,
-                    start_ts,
-                    end_ts,
-                    phase="primary",
-                    attempt=attempt,
-                    max_attempts=max_attempts,
-                )
-                if data is not None:
-                    print(
-                        f"Query BB calendar successfully! attempt={attempt}, events={len(data)}"
-                    )
-                    return data
-
-                if attempt < max_attempts:
-                    backoff = float(attempt)
-                    print(
-                        "Retrying BB calendar query in "
-                        f"{backoff:.1f}s (attempt {attempt + 1}/{max_attempts})..."
-                    )
-                    time.sleep(backoff)
-                    self._warmup_calendar_context(headers)
-
-            # 第二阶段：分片查询，降低单次请求压力并尽量规避节点抖动。
-            # 经验上 42 天窗口与浏览器手工请求更接近，稳定性更高。
-            chunk_days = 42
-            merged_events = []
-            seen_ids = set()
-            failed_chunks = 0
-            chunk_count = 0
-            failed_chunk_labels = []
-
+            # 从最近成功过的最大窗口开始切分，失败的窗口再自适应对半拆分。
+            total_days = max(1, (end_local - start_local).days)
+            preferred_days = _preferred_window_days()
+            window_days = min(preferred_days or total_days, total_days)
+            windows = []
             cursor = start_local
             while cursor < end_local:
-                chunk_count += 1
-                next_cursor = min(cursor + datetime.timedelta(days=chunk_days), end_local)
-                chunk_start_ts = int(cursor.timestamp() * 1000)
-                chunk_end_ts = int(next_cursor.timestamp() * 1000)
-                chunk_label = (
-                    f"{cursor.strftime('%Y-%m-%d')} -> {next_cursor.strftime('%Y-%m-%d')}"
-                )
+                next_cursor = min(cursor + datetime.timedelta(days=window_days), end_local)
+                windows.append((cursor, next_cursor))
+                cursor = next_cursor
 
-                chunk_data = None
-                for chunk_attempt in range(1, 3):
-                    chunk_data = self._request_calendar_window(
-                        headers,
-                        chunk_start_ts,
-                        chunk_end_ts,
-                        phase="chunked",
-                        attempt=chunk_attempt,
-                        max_attempts=2,
-                        chunk_label=chunk_label,
-                    )
-                    if chunk_data is not None:
-                        break
-                    if chunk_attempt < 2:
-                        time.sleep(0.8)
-                        self._warmup_calendar_context(headers)
-
-                if chunk_data is None:
-                    failed_chunks += 1
-                    failed_chunk_labels.append(chunk_label)
-                    print(
-                        "Chunk query failed: "
-                        f"{chunk_label}"
-                    )
-                else:
-                    for item in chunk_data:
-                        event_key = item.get("id") or item.get("itemSourceId")
-                        if not event_key:
-                            event_key = json.dumps(item, sort_keys=True, ensure_ascii=True)
-                        if event_key in seen_ids:
-                            continue
-                        seen_ids.add(event_key)
-                        merged_events.append(item)
+            payloads, failed_chunk_labels, best_days = self._fetch_windows_adaptive(headers, windows)
 
-                cursor = next_cursor
+            # 按窗口起点顺序合并去重，结果与并发完成顺序无关。
+            merged_events = []
+            seen_ids = set()
+            for chunk_data in payloads:
+                for item in chunk_data:
+                    event_key = item.get("id") or item.get("itemSourceId")
+                    if not event_key:
+                        event_key = json.dumps(item, sort_keys=True, ensure_ascii=True)
+                    if event_key in seen_ids:
+                        continue
+                    seen_ids.add(event_key)
+                    merged_events.append(item)
+
+            # 起始窗口需要拆分时记住成功过的最大窗口；记忆过期后重新尝试完整区间。
+            if 0 < best_days < window_days:
+                _remember_window_days(best_days)
+            print(
+                "[bb-debug] adaptive window "
+                f"start_days={window_days} best_days={best_days} "
+                f"next_days={_preferred_window_days() or 'full'}"
+            )
 
-            if failed_chunks == 0:
+            if not failed_chunk_labels:
                 print(
-                    "Query BB calendar succeeded via chunked fallback. "
-                    f"chunks={chunk_count}, events={len(merged_events)}"
+                    "Query BB calendar successfully! "
+                    f"windows={len(windows)}, events={len(merged_events)}"
                 )
-                return merged_events
+                return merged_events, []
 
+            print("[bb-debug] failed chunk list: " + "; ".join(failed_chunk_labels))
             if merged_events:
                 print(
-                    "Query BB calendar partially succeeded via chunked fallback. "
-                    f"failed_chunks={failed_chunks}/{chunk_count}, events={len(merged_events)}"
-                )
-                if failed_chunk_labels:
-                    print(
-                        "[bb-debug] failed chunk list: "
-                        + "; ".join(failed_chunk_labels)
-                    )
-                return merged_events
-
-            if failed_chunk_labels:
-                print(
-                    "[bb-debug] failed chunk list: "
-                    + "; ".join(failed_chunk_labels)
+                    "Query BB calendar partially succeeded via adaptive split. "
+                    f"failed_chunks={len(failed_chunk_labels)}, events={len(merged_events)}"
                 )
+                return merged_events, failed_chunk_labels
             return None
 
-        data = _query_once()
-        if data is not None:
-            return data
+        def _result(outcome: tuple[list, list]):
+            return outcome if report_failures else outcome[0]
+
+        outcome = _query_once()
+        if outcome is not None:
+            return _result(outcome)
 
-        # 第三阶段：重建会话并重新交换 BB ticket，再完整重试一轮。
+        # 熔断器已打开说明 BB 后端整体异常，重建会话也无济于事。
+        if BB_CIRCUIT.is_open():
+            raise CircuitOpenError("BB circuit opened during calendar query")
+
+        # 仍失败时重建会话并重新交换 BB ticket，再完整重试一轮。
         # 目的：绕过偶发异常节点或失效上下文，避免稳定命中 500。
-        print("[bb-debug] restarting BB session after failed primary/chunked query...")
+        print("[bb-debug] restarting BB session after failed adaptive query...")
         try:
-            self.session = requests.Session()
+            self.session = create_session(pool_maxsize=self.POOL_MAXSIZE)
+            self._calendar_primed_at = 0.0
             if not self.LoginBB():
                 print("[bb-debug] BB session restart failed during LoginBB.")
             else:
-                data = _query_once()
-                if data is not None:
+                outcome = _query_once()
+                if outcome is not None:
                     print("[bb-debug] BB query recovered after session restart.")
-                    return data
+                    return _result(outcome)
+        except CircuitOpenError:
+            raise
         except Exception as exc:
             print(f"[bb-debug] session restart retry exception: {exc}")
 
-        print("Query BB calendar failed after retries, chunked fallback, and session restart.")
+        print("Query BB calendar failed after adaptive split and session restart.")
         return None
 
 
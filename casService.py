@@ -6,6 +6,8 @@ import time
 import sys
 from typing import Optional, Any
 import dotenv
+
+from http_transport import create_session
 dotenv.load_dotenv(".env")
 
 def _env_bool(name: str, default: bool) -> bool:
@@ -42,6 +44,9 @@ def get_execution_and_eventId(response):
 
 
 class CasService:
+    # 新建会话的每主机连接池大小，子类按自身的抓取并发覆盖；None 使用 HTTP_POOL_MAXSIZE。
+    POOL_MAXSIZE: Optional[int] = None
+
     def __init__(
         self,
         username: Optional[str] = None,
@@ -53,7 +58,7 @@ class CasService:
         self.password = password or os.getenv("SUSTECH_PASSWORD")
         self.TGC = tgc_token or os.getenv("SUSTECH_CAS_TOKEN")
         self.url = 'cas.sustech.edu.cn/cas/login'
-        self.session = session or requests.Session()
+        self.session = session or create_session(pool_maxsize=self.POOL_MAXSIZE)
         self.headers = {
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,"
                       "*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
@@ -269,6 +274,47 @@ class CasService:
         print("QR login timeout")
         return False
 
+    def _is_probable_cas_login_page(self, response: requests.Response) -> bool:
+        final_url = (response.url or "").lower()
+        if "cas.sustech.edu.cn/cas/login" in final_url:
+            return True
+
+        page_text = (response.text or "")[:8000].lower()
+        markers = (
+            "cas.sustech.edu.cn/cas/login",
+            'name="execution"',
+            'name="_eventid"',
+            'name="username"',
+        )
+        return any(marker in page_text for marker in markers)
+
+    def probe_tgc(self, service_url: str = "https://tis.sustech.edu.cn/cas", timeout: float = 10) -> Optional[bool]:
+        """
+        用一次不跟随跳转的 CAS 请求判断 TGC 是否仍有效。
+
+        有效的 TGC 会直接 302 到 service 并带上 ticket；失效时 CAS 返回 200 登录页。
+        网络异常等无法判断的情况返回 None。
+        """
+        if not self.TGC:
+            return False
+        try:
+            response = self.session.get(
+                f"https://{self.url}",
+                headers=self.headers,
+                cookies={"TGC": self.TGC},
+                params={"service": service_url},
+                allow_redirects=False,
+                timeout=timeout,
+            )
+        except requests.RequestException as exc:
+            print(f"TGC probe failed: {exc}")
+            return None
+        if response.status_code in (301, 302, 303):
+            return "ticket=" in (response.headers.get("Location") or "")
+        if response.status_code == 200:
+            return False
+        return None
+
     def Login(
         self,
         username: Optional[str] = None,
@@ -0,0 +1,159 @@
+"""
+上游熔断器：按最近一段时间的失败率决定是否继续请求不稳定的上游。
+
+状态：
+- closed：正常放行，记录每次结果；窗口内请求数达到 min_calls 且失败率超过阈值时打开
+- open：直接拒绝（调用方快速转入兜底），open_seconds 后进入 half_open
+- half_open：只放行一个探测请求，成功则关闭，失败则重新打开
+
+同时按后端节点（响应头 Via / Server）统计成功与失败次数，便于判断是否个别节点异常。
+"""
+
+import collections
+import threading
+import time
+from typing import Optional
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ConnectionError):
+    """熔断器打开时拒绝请求。"""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_rate: float = 0.5,
+        min_calls: int = 4,
+        window_seconds: float = 300.0,
+        open_seconds: float = 120.0,
+    ):
+        """
+        Args:
+            name: 日志与统计中的名称
+            failure_rate: 窗口内失败率达到该值时打开
+            min_calls: 窗口内请求数不足时不打开，避免偶发失败误判
+            window_seconds: 统计失败率的滑动窗口（秒）
+            open_seconds: 打开后多久（秒）放行一次半开探测
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        # (时间, 是否成功)
+        self._outcomes = collections.deque()
+        self._nodes = {}
+        self._counters = {"rejected": 0, "opened": 0, "probes": 0}
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    def _open(self, now: float, reason: str) -> None:
+        self._state = STATE_OPEN
+        self._opened_at = now
+        self._probe_in_flight = False
+        self._counters["opened"] += 1
+        print(f"[circuit] {self.name} opened: {reason}")
+
+    def is_open(self) -> bool:
+        """熔断中且尚未到半开探测时间时返回 True（不改变状态）。"""
+        with self._lock:
+            if self._state == STATE_OPEN:
+                return time.time() - self._opened_at < self.open_seconds
+            return self._state == STATE_HALF_OPEN and self._probe_in_flight
+
+    def allow_request(self) -> bool:
+        """是否放行本次请求；半开状态下只放行一个探测请求。"""
+        with self._lock:
+            now = time.time()
+            if self._state == STATE_OPEN and now - self._opened_at >= self.open_seconds:
+                self._state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == STATE_HALF_OPEN:
+                if self._probe_in_flight:
+                    self._counters["rejected"] += 1
+                    return False
+                self._probe_in_flight = True
+                self._counters["probes"] += 1
+                print(f"[circuit] {self.name} half-open probe")
+                return True
+            if self._state == STATE_OPEN:
+                self._counters["rejected"] += 1
+                return False
+            return True
+
+    def _record_node(self, node: Optional[str], ok: bool, status: Optional[int]) -> None:
+        entry = self._nodes.setdefault(
+            node or "unknown", {"ok": 0, "failed": 0, "last_status": None, "last_seen": None}
+        )
+        entry["ok" if ok else "failed"] += 1
+        entry["last_status"] = status
+        entry["last_seen"] = int(time.time())
+
+    def record_success(self, node: Optional[str] = None, status: Optional[int] = None) -> None:
+        with self._lock:
+            now = time.time()
+            self._record_node(node, True, status)
+            if self._state == STATE_HALF_OPEN:
+                self._state = STATE_CLOSED
+                self._probe_in_flight = False
+                self._outcomes.clear()
+                print(f"[circuit] {self.name} closed after successful probe")
+            self._outcomes.append((now, True))
+            self._trim(now)
+
+    def record_failure(
+        self, node: Optional[str] = None, status: Optional[int] = None, *, count: bool = True
+    ) -> None:
+        """
+        记录一次失败。count=False 时只更新节点统计、不计入失败率（如调用方会拆分重试的失败）；
+        半开探测以这种失败结束时释放探测名额，由下一个请求重新探测。
+        """
+        with self._lock:
+            now = time.time()
+            self._record_node(node, False, status)
+            if not count:
+                if self._state == STATE_HALF_OPEN:
+                    self._probe_in_flight = False
+                return
+            if self._state == STATE_HALF_OPEN:
+                self._open(now, f"probe failed node={node} status={status}")
+                return
+            if self._state == STATE_OPEN:
+                return
+            self._outcomes.append((now, False))
+            self._trim(now)
+            total = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if total >= self.min_calls and failures / total >= self.failure_rate:
+                self._open(now, f"failures={failures}/{total} last_node={node} status={status}")
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            self._trim(time.time())
+            total = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            stats = dict(self._counters)
+            stats.update(
+                {
+                    "state": self._state,
+                    "opened_at": int(self._opened_at) if self._opened_at else None,
+                    "window_calls": total,
+                    "window_failure_rate": round(failures / total, 3) if total else None,
+                    "nodes": {node: dict(entry) for node, entry in self._nodes.items()},
+                }
+            )
+            return stats
@@ -0,0 +1,115 @@
+"""
+上游 HTTP 传输层：统一创建带连接池与默认超时的 requests.Session。
+
+requests 默认的 HTTPAdapter 每个主机只保留 10 个连接，TIS 并发抓取超过该值时多出的连接
+用完即被丢弃，下一次请求又要重新握手 TLS。这里在创建会话时按服务的抓取并发确定每个主机的
+连接池大小（之后不再改动，避免重建连接池丢掉已有的 keep-alive 连接），
+为没有显式 timeout 的请求补上默认的连接 / 读取超时，并统计新建连接与复用情况，便于调参。
+"""
+
+import os
+import threading
+import weakref
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# (连接超时, 读取超时)，单位秒。
+DEFAULT_TIMEOUT = (
+    max(0.5, _env_float("HTTP_CONNECT_TIMEOUT", 5.0)),
+    max(1.0, _env_float("HTTP_READ_TIMEOUT", 20.0)),
+)
+DEFAULT_POOL_MAXSIZE = max(1, _env_int("HTTP_POOL_MAXSIZE", 16))
+
+_ADAPTERS = weakref.WeakSet()
+_ADAPTERS_LOCK = threading.Lock()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """连接池按主机放大、带默认超时的 HTTPAdapter。"""
+
+    def __init__(self, pool_maxsize: int = DEFAULT_POOL_MAXSIZE, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        super().__init__(pool_connections=8, pool_maxsize=pool_maxsize, max_retries=0)
+        with _ADAPTERS_LOCK:
+            _ADAPTERS.add(self)
+
+    @property
+    def pool_maxsize(self) -> int:
+        return self._pool_maxsize
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        return super().send(request, timeout=timeout, **kwargs)
+
+    def pool_stats(self) -> dict:
+        """按主机汇总：num_connections 为新建连接数，num_requests - num_connections 即复用次数。"""
+        stats = {}
+        pools = self.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.scheme}://{pool.host}"
+            entry = stats.setdefault(
+                host, {"connections": 0, "requests": 0, "idle": 0, "maxsize": self._pool_maxsize}
+            )
+            entry["connections"] += pool.num_connections
+            entry["requests"] += pool.num_requests
+            entry["idle"] += pool.pool.qsize() if pool.pool is not None else 0
+        return stats
+
+
+def create_session(pool_maxsize: Optional[int] = None) -> requests.Session:
+    """创建挂载了 PooledHTTPAdapter 的 Session；每个服务仍使用独立的 cookie jar。"""
+    session = requests.Session()
+    adapter = PooledHTTPAdapter(pool_maxsize=pool_maxsize or DEFAULT_POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def session_pool_maxsize(session: requests.Session) -> Optional[int]:
+    """会话的每主机连接池大小；未挂载 PooledHTTPAdapter 时返回 None。"""
+    adapter = session.get_adapter("https://")
+    return adapter.pool_maxsize if isinstance(adapter, PooledHTTPAdapter) else None
+
+
+def transport_stats() -> dict:
+    """汇总当前所有存活 Session 的连接池统计。"""
+    with _ADAPTERS_LOCK:
+        adapters = list(_ADAPTERS)
+    totals = {}
+    for adapter in adapters:
+        for host, entry in adapter.pool_stats().items():
+            total = totals.setdefault(
+                host, {"connections": 0, "requests": 0, "idle": 0, "maxsize": 0}
+            )
+            total["connections"] += entry["connections"]
+            total["requests"] += entry["requests"]
+            total["idle"] += entry["idle"]
+            total["maxsize"] = max(total["maxsize"], entry["maxsize"])
+    for total in totals.values():
+        total["reused"] = max(0, total["requests"] - total["connections"])
+    return {
+        "sessions": len(adapters),
+        "default_timeout": list(DEFAULT_TIMEOUT),
+        "hosts": totals,
+    }
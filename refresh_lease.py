@@ -0,0 +1,258 @@
+"""
+跨进程刷新租约：保证整个集群内同一来源同一时间只有一个刷新在跑。
+
+租约包含持有者（owner）、过期时间和单调递增的 fencing token。持有者崩溃后租约自然过期；
+写入时用 fencing token 校验租约仍属于自己，避免过期的旧持有者覆盖新数据。
+
+后端：
+- KvLeaseBackend：Upstash Redis（Lua 脚本原子地判断空闲 + INCR 生成 fencing token；
+  KV 写入用脚本按 token 条件写入；同时写 scheduler 时，token 在 SQLite 写入事务内与
+  write_fence 表中已提交的最大 token 比较）
+- scheduler：Scheduler 的 refresh_lease 表（同一个 SQLite 文件的多进程部署；
+  token 在写入事务内、提交前校验）
+"""
+
+import contextlib
+import os
+import socket
+import threading
+import uuid
+from typing import Optional
+
+
+class LeaseLostError(RuntimeError):
+    """租约已过期并被他人接管，本次写入被拒绝。"""
+
+
+# 仅在租约空闲时才递增 fence 计数并写入持有者，获取失败不消耗 token。
+_KV_ACQUIRE_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return false
+end
+local token = redis.call('incr', KEYS[2])
+redis.call('set', KEYS[1], ARGV[1] .. '|' .. token, 'PX', ARGV[2])
+return token
+"""
+
+_KV_FENCED_SET_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    redis.call('set', KEYS[2], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+_KV_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_KV_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class KvLeaseBackend:
+    """基于 Upstash Redis 客户端的租约，键值为 "<owner>|<token>"。"""
+
+    name = "kv"
+
+    def __init__(self, client, prefix: str = "refresh_lease", scheduler=None):
+        self.client = client
+        self.prefix = prefix
+        # dual 模式下同时写入的 Scheduler，用于事务内的 token 栅栏。
+        self.scheduler = scheduler
+
+    def _key(self, source: str) -> str:
+        return f"{self.prefix}:{source}"
+
+    def acquire(self, source: str, owner: str, ttl_seconds: float) -> Optional[int]:
+        token = self.client.eval(
+            _KV_ACQUIRE_SCRIPT,
+            keys=[self._key(source), f"{self._key(source)}:fence"],
+            args=[owner, str(int(ttl_seconds * 1000))],
+        )
+        return int(token) if token is not None else None
+
+    def renew(self, source: str, owner: str, token: int, ttl_seconds: float) -> bool:
+        renewed = self.client.eval(
+            _KV_RENEW_SCRIPT,
+            keys=[self._key(source)],
+            args=[f"{owner}|{token}", str(int(ttl_seconds * 1000))],
+        )
+        return bool(renewed)
+
+    def release(self, source: str, owner: str, token: int) -> bool:
+        released = self.client.eval(
+            _KV_RELEASE_SCRIPT,
+            keys=[self._key(source)],
+            args=[f"{owner}|{token}"],
+        )
+        return bool(released)
+
+    def is_held(self, source: str, owner: str, token: int) -> bool:
+        return self.client.get(self._key(source)) == f"{owner}|{token}"
+
+    def set_if_held(self, source: str, owner: str, token: int, key: str, value: str) -> bool:
+        """仅当租约仍由 owner 以该 token 持有时写入 key（单个脚本内原子完成）。"""
+        written = self.client.eval(
+            _KV_FENCED_SET_SCRIPT,
+            keys=[self._key(source), key],
+            args=[f"{owner}|{token}", value],
+        )
+        return bool(written)
+
+    def write_fence(self, source: str, owner: str, token: int):
+        """KV 的 token 无法与 SQLite 事务原子比较，改为在 scheduler 的写入事务内按 token 单调栅栏校验。"""
+        if self.scheduler is None:
+            return contextlib.nullcontext()
+        return self.scheduler.write_fence(source, None, token)
+
+    def holder(self, source: str) -> Optional[str]:
+        value = self.client.get(self._key(source))
+        return str(value).split("|", 1)[0] if value else None
+
+
+class SchedulerLeaseBackend:
+    """基于 Scheduler.refresh_lease 表的租约，适合共享同一个 SQLite 文件的多进程部署。"""
+
+    name = "sqlite"
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    def acquire(self, source: str, owner: str, ttl_seconds: float) -> Optional[int]:
+        return self.scheduler.acquire_refresh_lease(source, owner, ttl_seconds)
+
+    def renew(self, source: str, owner: str, token: int, ttl_seconds: float) -> bool:
+        return self.scheduler.renew_refresh_lease(source, owner, token, ttl_seconds)
+
+    def release(self, source: str, owner: str, token: int) -> bool:
+        return self.scheduler.release_refresh_lease(source, owner, token)
+
+    def is_held(self, source: str, owner: str, token: int) -> bool:
+        return self.scheduler.check_refresh_lease(source, owner, token)
+
+    def write_fence(self, source: str, owner: str, token: int):
+        return self.scheduler.write_fence(source, owner, token)
+
+    def holder(self, source: str) -> Optional[str]:
+        return self.scheduler.get_refresh_lease_holder(source)
+
+
+class RefreshLease:
+    """
+    一次刷新持有的租约。
+
+    持有期间后台按 ttl/3 续期；续期失败（租约已被他人接管）后 is_valid() 返回 False。
+    后端支持时，写入应放在 write_fence() 内或使用 set_if_held()，由存储在写入时原子校验 token；
+    其余情况写入前调用 ensure_valid() 做 fencing 校验。
+    """
+
+    def __init__(self, backend, source: str, owner: str, token: int, ttl_seconds: float):
+        self.backend = backend
+        self.source = source
+        self.owner = owner
+        self.token = token
+        self.ttl_seconds = ttl_seconds
+        self._lost = False
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(
+            target=self._renew_loop,
+            name=f"refresh-lease-{source}",
+            daemon=True,
+        )
+        self._heartbeat.start()
+
+    def _renew_loop(self) -> None:
+        interval = max(1.0, self.ttl_seconds / 3)
+        while not self._stop.wait(interval):
+            try:
+                if not self.backend.renew(self.source, self.owner, self.token, self.ttl_seconds):
+                    self._lost = True
+                    print(f"[lease] lost source={self.source} token={self.token}")
+                    return
+            except Exception as exc:
+                # 网络抖动时保留租约，等待下次续期或过期。
+                print(f"[lease] renew failed source={self.source}: {exc}")
+
+    def is_valid(self) -> bool:
+        if self._lost:
+            return False
+        try:
+            return self.backend.is_held(self.source, self.owner, self.token)
+        except Exception as exc:
+            print(f"[lease] check failed source={self.source}: {exc}")
+            return True
+
+    def ensure_valid(self) -> None:
+        if not self.is_valid():
+            raise LeaseLostError(
+                f"refresh lease for {self.source} lost (token={self.token}), skip write"
+            )
+
+    def write_fence(self):
+        """后端支持时，在该上下文内的存储写入事务提交前校验 token。"""
+        fence = getattr(self.backend, "write_fence", None)
+        if fence is None:
+            return contextlib.nullcontext()
+        return fence(self.source, self.owner, self.token)
+
+    @property
+    def supports_conditional_set(self) -> bool:
+        return hasattr(self.backend, "set_if_held")
+
+    def set_if_held(self, key: str, value: str) -> None:
+        """按 token 条件写入 KV；租约已被接管时抛出 LeaseLostError。"""
+        if not self.backend.set_if_held(self.source, self.owner, self.token, key, value):
+            self._lost = True
+            raise LeaseLostError(
+                f"refresh lease for {self.source} lost (token={self.token}), skip write of {key}"
+            )
+
+    def release(self) -> None:
+        self._stop.set()
+        try:
+            self.backend.release(self.source, self.owner, self.token)
+        except Exception as exc:
+            print(f"[lease] release failed source={self.source}: {exc}")
+
+    def describe(self) -> dict:
+        return {"backend": self.backend.name, "owner": self.owner, "token": self.token}
+
+
+class RefreshLeaseManager:
+    def __init__(self, backend, ttl_seconds: float = 300.0, owner: Optional[str] = None):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.owner = owner or default_owner()
+
+    def acquire(self, source: str) -> tuple[Optional[RefreshLease], Optional[str]]:
+        """
+        尝试获取来源的刷新租约。
+
+        Returns:
+            (lease, holder)：获取成功时 holder 为 None；被他人持有时 lease 为 None，
+            holder 为当前持有者。后端异常时返回 (None, None)，由调用方决定是否继续。
+        """
+        try:
+            token = self.backend.acquire(source, self.owner, self.ttl_seconds)
+        except Exception as exc:
+            print(f"[lease] acquire failed source={source} backend={self.backend.name}: {exc}")
+            return None, None
+        if token is None:
+            try:
+                holder = self.backend.holder(source)
+            except Exception:
+                holder = None
+            return None, holder or "unknown"
+        return RefreshLease(self.backend, source, self.owner, token, self.ttl_seconds), None
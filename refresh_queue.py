@@ -0,0 +1,241 @@
+"""
+刷新任务队列：固定数量的常驻 worker + 按来源去重的优先级队列。
+
+cron、ICS 订阅命中、手动触发都只往队列里提交请求。同一来源已在排队时，新的触发合并到
+排队中的任务上，只产生一次上游抓取；正在刷新时，运行中的任务被标记为 dirty，新的触发
+合并进一个暂缓的后续任务，当前刷新结束后再执行一次，保证刷新开始后的变化也会被抓取。
+worker 常驻，不会随请求量创建线程。多个 worker 时不同来源可以并行刷新，同一来源永远不会同时刷新。
+低优先级（后台）触发另受 background_min_interval 节流：该来源最近一次刷新开始不久时直接丢弃，
+手动与 cron 触发不受影响，队列是唯一的节流关口。
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Optional
+
+# 数值越小越先执行。
+PRIORITY_MANUAL = 0
+PRIORITY_CRON = 10
+PRIORITY_BACKGROUND = 20
+
+
+class RefreshTicket:
+    """一次（可能由多个触发合并而来的）来源刷新。"""
+
+    def __init__(self, source: str, trigger: str, priority: int):
+        self.source = source
+        self.triggers = [trigger]
+        self.priority = priority
+        self.state = "pending"
+        # 刷新期间又有新触发，结束后会再执行一次后续任务。
+        self.dirty = False
+        self.enqueued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[dict] = None
+        self._done = threading.Event()
+
+    @property
+    def coalesced(self) -> int:
+        return len(self.triggers) - 1
+
+    @property
+    def wait_ms(self) -> Optional[int]:
+        if self.started_at is None:
+            return None
+        return int((self.started_at - self.enqueued_at) * 1000)
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """等待刷新结束并返回结果，超时返回 None（任务仍会继续执行）。"""
+        if not self._done.wait(timeout):
+            return None
+        return self.result
+
+    def describe(self) -> dict:
+        return {
+            "source": self.source,
+            "state": self.state,
+            "priority": self.priority,
+            "triggers": list(self.triggers),
+            "coalesced": self.coalesced,
+            "dirty": self.dirty,
+            "wait_ms": self.wait_ms,
+        }
+
+
+class RefreshQueue:
+    def __init__(
+        self,
+        handler: Callable[[str, str], dict],
+        *,
+        workers: int = 1,
+        name: str = "refresh-worker",
+        background_min_interval: float = 0.0,
+    ):
+        """
+        Args:
+            handler: 实际执行刷新的函数 handler(source, trigger) -> result dict
+            workers: 常驻 worker 数量，即最多同时刷新的来源数
+            name: worker 线程名前缀
+            background_min_interval: 来源最近一次刷新开始后该时长（秒）内，丢弃后台优先级的新触发
+        """
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.name = name
+        self.background_min_interval = max(0.0, float(background_min_interval))
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._pending = {}
+        self._running = {}
+        self._threads = []
+        self._submitted = 0
+        self._coalesced = 0
+        self._coalesced_by_source = {}
+        self._followups = 0
+        self._throttled = 0
+        self._last_started = {}
+        self._completed = 0
+        self._wait_total_ms = 0
+        self._wait_max_ms = 0
+        self._last_wait_ms = None
+
+    def submit(self, source: str, trigger: str, priority: int = PRIORITY_BACKGROUND) -> RefreshTicket:
+        """
+        提交一次刷新请求。
+
+        该来源已在排队时合并进排队中的任务（并按需提升优先级）；正在刷新时把运行中的任务
+        标记为 dirty，并返回一个在其结束后才入堆的后续任务，调用方等待到的一定是触发之后
+        开始的刷新结果。
+
+        没有排队任务时，后台优先级的触发若落在 background_min_interval 内则被节流，
+        返回的任务状态为 throttled、立即结束，不产生刷新。
+        """
+        with self._cond:
+            self._ensure_workers()
+            self._submitted += 1
+            running = self._running.get(source)
+            ticket = self._pending.get(source)
+            if ticket is None and priority >= PRIORITY_BACKGROUND and self.background_min_interval:
+                elapsed = time.time() - self._last_started.get(source, float("-inf"))
+                if elapsed < self.background_min_interval:
+                    self._throttled += 1
+                    return self._throttled_ticket(
+                        source, trigger, priority, self.background_min_interval - elapsed
+                    )
+            if ticket is not None:
+                ticket.triggers.append(trigger)
+                self._coalesced += 1
+                self._coalesced_by_source[source] = self._coalesced_by_source.get(source, 0) + 1
+                if priority < ticket.priority:
+                    ticket.priority = priority
+                    # 暂缓的后续任务在当前刷新结束时才入堆，此时按新优先级入堆。
+                    if running is None:
+                        heapq.heappush(self._heap, (priority, next(self._seq), ticket))
+                        self._cond.notify()
+                return ticket
+
+            ticket = RefreshTicket(source, trigger, priority)
+            self._pending[source] = ticket
+            if running is not None:
+                running.dirty = True
+                self._followups += 1
+                return ticket
+            heapq.heappush(self._heap, (priority, next(self._seq), ticket))
+            self._cond.notify()
+            return ticket
+
+    @staticmethod
+    def _throttled_ticket(source: str, trigger: str, priority: int, retry_after: float) -> RefreshTicket:
+        ticket = RefreshTicket(source, trigger, priority)
+        ticket.state = "throttled"
+        ticket.finished_at = ticket.enqueued_at
+        ticket.result = {
+            "ok": True,
+            "source": source,
+            "status": "skipped",
+            "message": "background refresh throttled",
+            "trigger": trigger,
+            "retry_after_seconds": int(retry_after) + 1,
+        }
+        ticket._done.set()
+        return ticket
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "depth": len(self._pending),
+                "pending": [ticket.describe() for ticket in self._pending.values()],
+                "running": [ticket.describe() for ticket in self._running.values()],
+                "submitted": self._submitted,
+                "coalesced": self._coalesced,
+                "coalesced_by_source": dict(self._coalesced_by_source),
+                "followups": self._followups,
+                "throttled": self._throttled,
+                "completed": self._completed,
+                "wait_ms_last": self._last_wait_ms,
+                "wait_ms_avg": int(self._wait_total_ms / self._completed) if self._completed else None,
+                "wait_ms_max": self._wait_max_ms,
+                "workers": self.workers,
+                "workers_alive": sum(1 for thread in self._threads if thread.is_alive()),
+            }
+
+    def _ensure_workers(self) -> None:
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._run,
+                name=f"{self.name}-{len(self._threads)}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_ticket(self) -> RefreshTicket:
+        with self._cond:
+            while True:
+                while self._heap:
+                    priority, _seq, ticket = heapq.heappop(self._heap)
+                    # 提升优先级时会重复入堆，跳过过期的堆项。同一来源正在刷新时新触发进入
+                    # 暂缓的后续任务，结束后才入堆，因此多个 worker 不会同时处理同一来源。
+                    if ticket.state != "pending" or priority != ticket.priority:
+                        continue
+                    del self._pending[ticket.source]
+                    ticket.state = "running"
+                    ticket.started_at = time.time()
+                    self._last_started[ticket.source] = ticket.started_at
+                    self._running[ticket.source] = ticket
+                    return ticket
+                self._cond.wait()
+
+    def _run(self) -> None:
+        while True:
+            ticket = self._next_ticket()
+            trigger = ",".join(ticket.triggers)
+            try:
+                result = self.handler(ticket.source, trigger)
+            except Exception as exc:
+                result = {
+                    "ok": False,
+                    "source": ticket.source,
+                    "status": "failed",
+                    "message": str(exc),
+                    "trigger": trigger,
+                }
+            with self._cond:
+                self._running.pop(ticket.source, None)
+                followup = self._pending.get(ticket.source)
+                if followup is not None:
+                    heapq.heappush(self._heap, (followup.priority, next(self._seq), followup))
+                    self._cond.notify()
+                wait_ms = ticket.wait_ms or 0
+                self._completed += 1
+                self._wait_total_ms += wait_ms
+                self._wait_max_ms = max(self._wait_max_ms, wait_ms)
+                self._last_wait_ms = wait_ms
+                ticket.state = "done"
+                ticket.finished_at = time.time()
+                ticket.result = dict(result or {}, queue=ticket.describe())
+            ticket._done.set()
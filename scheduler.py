@@ -8,17 +8,32 @@ Scheduler Module - 统一日程管理 (ICS 格式 + SQLModel ORM)
 """
 
 import json
+import re
 import uuid
+import hashlib
 import os
 import sys
 import logging
+import threading
+import collections
+import contextlib
+import gzip
 from datetime import datetime, timedelta, timezone
 from enum import Enum
-from typing import Optional, List, Dict, Any
+from zoneinfo import ZoneInfo
+from typing import Optional, List, Dict, Any, Iterable, Iterator
 
 from sqlmodel import SQLModel, Field, Session, create_engine, select, col
+from sqlalchemy import bindparam, delete as sa_delete, insert as sa_insert, select as sa_select, update as sa_update
+from sqlalchemy import Index, event as sa_event, text as sa_text
+from sqlalchemy.pool import QueuePool, StaticPool
 from pydantic import field_validator
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # ---------------------------------------------------------------------------
 # 路径设置：兼容直接运行和包导入
 # ---------------------------------------------------------------------------
@@ -37,6 +52,7 @@ try:
     from .holiday_provider import HolidayProvider
 except ImportError:
     from holiday_provider import HolidayProvider
+from refresh_lease import LeaseLostError
 
 logger = logging.getLogger(__name__)
 
@@ -78,6 +94,20 @@ def _parse_iso(s: Optional[str]) -> Optional[datetime]:
         return None
 
 
+def _as_aware_utc(dt: datetime) -> datetime:
+    """SQLite 读回的 datetime 不带时区（存储时即为 UTC），比较前统一补齐。"""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=UTC)
+    return dt.astimezone(UTC)
+
+
+def _local_day(dt: datetime) -> str:
+    """返回事件时间对应的 CST 日期（YYYY-MM-DD）；SQLite 读回的无时区时间视为 UTC。"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return dt.astimezone(CST).strftime("%Y-%m-%d")
+
+
 def _cst_str(iso_utc: Optional[str]) -> str:
     dt = _parse_iso(iso_utc)
     if dt is None:
@@ -85,6 +115,20 @@ def _cst_str(iso_utc: Optional[str]) -> str:
     return dt.astimezone(CST).strftime("%Y-%m-%d %H:%M:%S CST")
 
 
+# Blackboard 主键形如 _12345_1；API 的 id / itemSourceId 与订阅源 UID 都包含它。
+_BB_PK_RE = re.compile(r"_\d+_\d+")
+
+
+def _bb_source_id(raw_id: Any) -> str:
+    """
+    把 BB JSON 的 itemSourceId / id 与 iCal 订阅源的 UID 归一为同一个 x_source_id：
+    取其中最后一个 Blackboard 主键（UID 先去掉 @ 之后的域名），不含主键时原样返回。
+    """
+    value = str(raw_id or "").strip()
+    matches = _BB_PK_RE.findall(value.split("@", 1)[0])
+    return matches[-1] if matches else value
+
+
 def _sanitize_location_prefix(prefix: Optional[str]) -> str:
     if not prefix:
         return ""
@@ -178,6 +222,13 @@ class VEvent(SQLModel, table=True):
     附加 x_source / x_event_type 等扩展字段（ICS 中以 X- 前缀表示扩展属性）。
     """
     __tablename__ = "vevent"
+    # query_events 的热路径：按来源 + 未删除过滤、按 dtstart 范围扫描并排序。
+    # 末尾附带 dtend，使 "dtend >= start OR (dtend IS NULL AND dtstart >= start)"
+    # 在索引内即可判定，无需回表；不带来源的查询走 (is_deleted, dtstart, dtend)。
+    __table_args__ = (
+        Index("ix_vevent_source_deleted_dtstart", "x_source", "is_deleted", "dtstart", "dtend"),
+        Index("ix_vevent_deleted_dtstart", "is_deleted", "dtstart", "dtend"),
+    )
 
     # ── RFC 5545 核心属性 ──
     uid: str = Field(primary_key=True, max_length=255,
@@ -572,34 +623,286 @@ class SyncJob(SQLModel, table=True):
     error_message: Optional[str] = Field(default=None)
 
 
+class TisDayFingerprint(SQLModel, table=True):
+    """TIS 每日原始课表的内容指纹，用于增量同步时跳过未变化的日期。"""
+
+    __tablename__ = "tis_day_fingerprint"
+
+    day: str = Field(primary_key=True, max_length=10, description="CST 日期 YYYY-MM-DD")
+    fingerprint: str = Field(max_length=64, description="原始课表 + 解析上下文的 SHA-256")
+    event_count: Optional[int] = Field(
+        default=None, ge=0, description="写入时该日的 TIS 事件数，用于发现被带外删除的数据"
+    )
+    updated_at: datetime = Field(default_factory=_now_utc)
+
+
+# 解析逻辑变化时递增，使所有日期的指纹失效并重新解析。
+_TIS_FINGERPRINT_VERSION = 1
+
+
+def _tis_day_fingerprint(items: Any, holiday_name: Optional[str]) -> str:
+    payload = {
+        "version": _TIS_FINGERPRINT_VERSION,
+        "items": items,
+        "holiday": holiday_name,
+        "location_prefix": _sanitize_location_prefix(os.getenv("LOCATION_PREFIX")),
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class IcsCache(SQLModel, table=True):
+    """按来源物化的 ICS 文本，订阅请求直接返回，避免每次重新查询并渲染全部事件。"""
+
+    __tablename__ = "ics_cache"
+
+    source: str = Field(primary_key=True, max_length=32)
+    body: str = Field(default="", description="export_ics(source=...) 的完整输出")
+    content_hash: str = Field(max_length=64, description="body 的 SHA-256")
+    built_at: datetime = Field(
+        default_factory=_now_utc, description="当前正文首次构建的时间，正文不变的重建不更新（Last-Modified）"
+    )
+    event_count: int = Field(default=0, ge=0)
+    body_gzip: Optional[bytes] = Field(default=None, description="body 的 gzip 预压缩版本")
+    body_br: Optional[bytes] = Field(default=None, description="body 的 brotli 预压缩版本（需安装 brotli）")
+    data_version: Optional[int] = Field(default=None, description="正文构建时该来源的 ics_version.version")
+
+
+class IcsVersion(SQLModel, table=True):
+    """
+    每个来源的数据版本号：事件写入在同一事务内递增，物化 ICS 的版本落后时在读取时重建。
+    不依赖数据库文件 mtime / size（WAL 模式下写入只落在 -wal 文件）。
+    """
+
+    __tablename__ = "ics_version"
+
+    source: str = Field(primary_key=True, max_length=32)
+    version: int = Field(default=0, ge=0)
+    updated_at: datetime = Field(default_factory=_now_utc)
+
+
+def _compress_ics(body: str) -> Dict[str, Optional[bytes]]:
+    """每次重建时压缩一次，请求时按 Accept-Encoding 直接取用。mtime=0 保证同一正文的 gzip 字节稳定。"""
+    raw = body.encode("utf-8")
+    return {
+        "body_gzip": gzip.compress(raw, compresslevel=9, mtime=0),
+        "body_br": brotli.compress(raw, mode=brotli.MODE_TEXT) if brotli is not None else None,
+    }
+
+
+class SourceLease(SQLModel, table=True):
+    """跨进程刷新租约：同一来源同一时间只允许一个持有者，fencing_token 每次获取递增。"""
+
+    __tablename__ = "refresh_lease"
+
+    source: str = Field(primary_key=True, max_length=32)
+    owner: str = Field(default="", max_length=128, description="持有者标识，空串表示未被持有")
+    fencing_token: int = Field(default=0, ge=0)
+    expires_at: datetime = Field(default_factory=_now_utc)
+    acquired_at: Optional[datetime] = Field(default=None)
+
+
+class WriteFence(SQLModel, table=True):
+    """
+    租约保存在 KV 时的写入栅栏：记录每个来源已提交写入的最大 fencing token，
+    在写入事务内比较，token 更小的旧持有者的写入被拒绝。
+    """
+
+    __tablename__ = "write_fence"
+
+    source: str = Field(primary_key=True, max_length=32)
+    fencing_token: int = Field(default=0, ge=0)
+    updated_at: datetime = Field(default_factory=_now_utc)
+
+
+class SyncMarker(SQLModel, table=True):
+    """分段刷新的进度标记：每个刷新窗口最近一次成功同步的时间与覆盖范围。"""
+
+    __tablename__ = "sync_marker"
+
+    key: str = Field(primary_key=True, max_length=64, description="窗口标识，如 bb:0-14d")
+    source: str = Field(max_length=32)
+    window_start: Optional[datetime] = Field(default=None, description="为空表示不限下界")
+    window_end: Optional[datetime] = Field(default=None, description="为空表示不限上界")
+    synced_at: datetime = Field(default_factory=_now_utc)
+    event_count: int = Field(default=0, ge=0)
+    etag: Optional[str] = Field(default=None, max_length=255, description="订阅源响应的 ETag")
+    http_last_modified: Optional[str] = Field(
+        default=None, max_length=64, description="订阅源响应的 Last-Modified"
+    )
+
+
+def _in_window(dt: datetime, start: Optional[datetime], end: Optional[datetime]) -> bool:
+    """dt 是否落在半开区间 [start, end) 内，端点为 None 表示不限。"""
+    value = _as_aware_utc(dt)
+    if start is not None and value < _as_aware_utc(start):
+        return False
+    return end is None or value < _as_aware_utc(end)
+
+
 # ========================== 数据库引擎 ==========================
 
-def get_engine(db_path: Optional[str] = None):
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# PRAGMA 不支持参数绑定，拼接进语句的取值只能来自允许列表。
+_SQLITE_JOURNAL_MODES = frozenset({"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"})
+_SQLITE_SYNCHRONOUS = frozenset({"OFF", "NORMAL", "FULL", "EXTRA", "0", "1", "2", "3"})
+
+
+def _env_choice(name: str, default: str, allowed: frozenset) -> str:
+    value = os.getenv(name, default).strip().upper()
+    if value not in allowed:
+        print(f"[scheduler] invalid {name}={value!r}, fallback to {default}")
+        return default
+    return value
+
+
+def sqlite_profile(**overrides) -> Dict[str, Any]:
+    """
+    SQLite 性能配置，可通过 SCHEDULER_SQLITE_* 环境变量调整。
+
+    WAL 让只读连接与刷新写入互不阻塞；synchronous=NORMAL 在 WAL 下仍可保证崩溃一致性。
+    """
+    profile = {
+        "journal_mode": _env_choice("SCHEDULER_SQLITE_JOURNAL_MODE", "WAL", _SQLITE_JOURNAL_MODES),
+        "synchronous": _env_choice("SCHEDULER_SQLITE_SYNCHRONOUS", "NORMAL", _SQLITE_SYNCHRONOUS),
+        "mmap_size": _env_int("SCHEDULER_SQLITE_MMAP_SIZE", 64 * 1024 * 1024),
+        # 负数表示 KiB，-16384 即 16 MiB 页缓存。
+        "cache_size": _env_int("SCHEDULER_SQLITE_CACHE_SIZE", -16384),
+        "busy_timeout_ms": _env_int("SCHEDULER_SQLITE_BUSY_TIMEOUT_MS", 5000),
+        "pool_size": max(1, _env_int("SCHEDULER_SQLITE_POOL_SIZE", 5)),
+        "max_overflow": max(0, _env_int("SCHEDULER_SQLITE_MAX_OVERFLOW", 10)),
+    }
+    profile.update(overrides)
+    return profile
+
+
+def _install_sqlite_pragmas(engine, profile: Dict[str, Any], read_only: bool) -> None:
+    journal_mode = str(profile["journal_mode"]).upper()
+    synchronous = str(profile["synchronous"]).upper()
+    if journal_mode not in _SQLITE_JOURNAL_MODES:
+        raise ValueError(f"unsupported SQLite journal_mode: {profile['journal_mode']!r}")
+    if synchronous not in _SQLITE_SYNCHRONOUS:
+        raise ValueError(f"unsupported SQLite synchronous: {profile['synchronous']!r}")
+
+    @sa_event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout={int(profile['busy_timeout_ms'])}")
+            if not read_only:
+                # journal_mode 持久化在数据库文件中，只读连接无需（也不能）设置。
+                cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+            cursor.execute(f"PRAGMA synchronous={synchronous}")
+            cursor.execute(f"PRAGMA mmap_size={int(profile['mmap_size'])}")
+            cursor.execute(f"PRAGMA cache_size={int(profile['cache_size'])}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+        finally:
+            cursor.close()
+
+
+def get_engine(
+    db_path: Optional[str] = None,
+    *,
+    read_only: bool = False,
+    profile: Optional[Dict[str, Any]] = None,
+):
     """
     创建 SQLAlchemy 引擎
 
     Args:
         db_path: SQLite 文件路径，None 则使用默认路径，":memory:" 使用内存数据库
+        read_only: 以只读模式（mode=ro + query_only）打开，用于 ICS 等读路径
+        profile: SQLite 性能配置，默认取 sqlite_profile()
     """
     if db_path is None:
         db_path = os.path.join(_PROJECT_DIR, "data", "scheduler.db")
+    profile = profile or sqlite_profile()
 
     if db_path == ":memory:":
-        url = "sqlite://"
+        # 内存库只存在于单个连接中，所有线程共享同一连接。
+        engine = create_engine(
+            "sqlite://",
+            echo=False,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        _install_sqlite_pragmas(engine, dict(profile, journal_mode="MEMORY"), read_only=False)
+        SQLModel.metadata.create_all(engine)
+        return engine
+
+    if read_only:
+        url = f"sqlite:///file:{os.path.abspath(db_path)}?mode=ro&uri=true"
     else:
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
         url = f"sqlite:///{db_path}"
 
     engine = create_engine(
         url,
         echo=False,
         connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=profile["pool_size"],
+        max_overflow=profile["max_overflow"],
         pool_pre_ping=True,
     )
-    SQLModel.metadata.create_all(engine)
+    _install_sqlite_pragmas(engine, profile, read_only=read_only)
+    if not read_only:
+        SQLModel.metadata.create_all(engine)
+        _migrate_columns(engine)
+        _migrate_indexes(engine)
     return engine
 
 
+def _migrate_columns(engine) -> None:
+    """为已存在的表补加模型中新增的列（均为可空列，直接 ALTER TABLE ADD COLUMN）。"""
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {
+                row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table.name}")')
+            }
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.exec_driver_sql(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                )
+                print(f"[scheduler] added column {table.name}.{column.name}")
+
+
+def _migrate_indexes(engine) -> None:
+    """
+    为已存在的 scheduler.db 补建新增索引。
+
+    create_all 只在建表时创建索引，旧库中的表已存在时需要逐个 checkfirst 补建；
+    有新索引落地时执行一次 ANALYZE，让查询规划器拿到统计信息。
+    """
+    created = []
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            with engine.connect() as conn:
+                exists = conn.execute(
+                    sa_text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"),
+                    {"name": index.name},
+                ).first()
+            if exists:
+                continue
+            index.create(engine, checkfirst=True)
+            created.append(index.name)
+    if created:
+        with engine.begin() as conn:
+            conn.execute(sa_text("ANALYZE"))
+        print(f"[scheduler] created indexes: {', '.join(created)}")
+
+
 # ========================== 数据解析 ==========================
 
 class EventParser:
@@ -616,6 +919,17 @@ class EventParser:
 
     # ---- Blackboard ----
 
+    @staticmethod
+    def _bb_event_type(bb_type: str, title: str) -> str:
+        bb_type = bb_type.lower()
+        if "assignment" in bb_type or "due" in title.lower():
+            return EventType.ASSIGNMENT.value
+        if "exam" in bb_type or "exam" in title.lower() or "考试" in title:
+            return EventType.EXAM.value
+        if "deadline" in bb_type:
+            return EventType.DEADLINE.value
+        return EventType.OTHER.value
+
     @staticmethod
     def parse_bb_event(raw: dict) -> VEvent:
         """
@@ -629,7 +943,7 @@ class EventParser:
             calendarId        → x_course_id / categories
             eventType         → x_event_type
             location          → location
-            itemSourceId      → x_source_id
+            itemSourceId / id → x_source_id（归一为 Blackboard 主键，与订阅源 UID 一致）
         """
         now = _now_utc()
 
@@ -662,17 +976,8 @@ class EventParser:
         dtend = _parse_utc(end_utc_raw) or _parse_local(end_local)
 
         # --- 事件类型 ---
-        bb_type = (raw.get("eventType") or "").lower()
         title = raw.get("title") or raw.get("calendarName") or ""
-
-        if "assignment" in bb_type or "due" in title.lower():
-            evt_type = EventType.ASSIGNMENT.value
-        elif "exam" in bb_type or "exam" in title.lower() or "考试" in title:
-            evt_type = EventType.EXAM.value
-        elif "deadline" in bb_type:
-            evt_type = EventType.DEADLINE.value
-        else:
-            evt_type = EventType.OTHER.value
+        evt_type = EventParser._bb_event_type(raw.get("eventType") or "", title)
 
         # --- 课程信息 ---
         calendar_id = raw.get("calendarId") or ""
@@ -700,7 +1005,7 @@ class EventParser:
             created=now,
             last_modified=now,
             x_source=EventSource.BB.value,
-            x_source_id=str(source_id),
+            x_source_id=_bb_source_id(source_id),
             x_event_type=evt_type,
             x_course_name=course_name or None,
             x_course_id=calendar_id or None,
@@ -717,6 +1022,196 @@ class EventParser:
                 logger.error("scheduler parse bb event failed", extra={"error": str(exc), "item": str(item)})
         return events
 
+    # ---- iCalendar 订阅源（BB_ICAL_FEED_URL 兜底）----
+
+    @staticmethod
+    def _unfold_ics_lines(lines: Iterable[str]) -> Iterator[str]:
+        """
+        按 RFC 5545 折行规则还原逻辑行：以空格或制表符开头的行接到上一行末尾。
+
+        空行（iter_lines 在 CRLF 跨块时会多产出一个）直接跳过，不打断折行。
+        """
+        current = None
+        for line in lines:
+            if line is None:
+                continue
+            if isinstance(line, bytes):
+                line = line.decode("utf-8", errors="replace")
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            if line[:1] in (" ", "\t") and current is not None:
+                current += line[1:]
+                continue
+            if current:
+                yield current
+            current = line
+        if current:
+            yield current
+
+    @staticmethod
+    def _split_ics_line(line: str) -> Optional[tuple[str, Dict[str, str], str]]:
+        """
+        拆分内容行为 (属性名, 参数, 值)。
+
+        参数值可以是带引号的字符串（如 TZID="GMT+08:00"），其中的 ":" 与 ";" 不作分隔符；
+        返回的参数值已去掉引号。没有值分隔符的行返回 None。
+        """
+        parts = []
+        start = 0
+        in_quotes = False
+        for index, ch in enumerate(line):
+            if ch == '"':
+                in_quotes = not in_quotes
+            elif in_quotes:
+                continue
+            elif ch == ";":
+                parts.append(line[start:index])
+                start = index + 1
+            elif ch == ":":
+                parts.append(line[start:index])
+                name, *param_parts = parts
+                params = {}
+                for part in param_parts:
+                    key, _, param_value = part.partition("=")
+                    params[key.upper()] = param_value.strip('"')
+                return name.upper(), params, line[index + 1:]
+        return None
+
+    @staticmethod
+    def _unescape_ics_text(value: str) -> str:
+        result = []
+        chars = iter(value)
+        for ch in chars:
+            if ch != "\\":
+                result.append(ch)
+                continue
+            nxt = next(chars, "")
+            result.append("\n" if nxt in ("n", "N") else nxt)
+        return "".join(result)
+
+    @staticmethod
+    def _parse_ics_datetime(value: str, params: Dict[str, str]) -> tuple[Optional[datetime], bool]:
+        """解析 DTSTART / DTEND，返回 (UTC 时间, 是否全天)；无 TZID 的浮动时间视为 CST。"""
+        value = value.strip()
+        try:
+            if params.get("VALUE") == "DATE" or len(value) == 8:
+                day = datetime.strptime(value[:8], "%Y%m%d")
+                return day.replace(tzinfo=CST).astimezone(UTC), True
+            if value.endswith("Z"):
+                return datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=UTC), False
+            local = datetime.strptime(value, "%Y%m%dT%H%M%S")
+        except ValueError:
+            return None, False
+        tz = CST
+        tzid = params.get("TZID")
+        if tzid:
+            try:
+                tz = ZoneInfo(tzid.strip('"'))
+            except (KeyError, ValueError):
+                tz = CST
+        return local.replace(tzinfo=tz).astimezone(UTC), False
+
+    @classmethod
+    def _build_feed_event(cls, props: Dict[str, List[tuple]], source: str) -> Optional[VEvent]:
+        """props 为 属性名 → [(参数, 值), ...]，重复出现的属性按出现顺序全部保留。"""
+        def _text(name: str) -> Optional[str]:
+            entries = props.get(name)
+            return cls._unescape_ics_text(entries[0][1]) if entries else None
+
+        start_entry = (props.get("DTSTART") or [None])[0]
+        if not start_entry:
+            return None
+        dtstart, all_day = cls._parse_ics_datetime(start_entry[1], start_entry[0])
+        if dtstart is None:
+            return None
+        dtend = None
+        if "DTEND" in props:
+            end_params, end_value = props["DTEND"][0]
+            dtend, _ = cls._parse_ics_datetime(end_value, end_params)
+        # CATEGORIES 可以分多行给出，合并为一个逗号分隔列表。
+        categories = ",".join(
+            cls._unescape_ics_text(value) for _, value in props.get("CATEGORIES", ()) if value
+        )
+
+        now = _now_utc()
+        title = _text("SUMMARY") or ""
+        evt_type = cls._bb_event_type("", title)
+        status = (_text("STATUS") or "").upper()
+        if status not in {item.value for item in ICSStatus}:
+            status = ICSStatus.CONFIRMED.value
+        uid = _text("UID")
+        source_id = _bb_source_id(uid) if uid else hashlib.sha256(
+            f"{title}|{start_entry[1]}".encode("utf-8")
+        ).hexdigest()[:32]
+
+        return VEvent(
+            uid=str(uuid.uuid4()),
+            dtstamp=now,
+            dtstart=dtstart,
+            dtend=dtend,
+            summary=title,
+            description=_text("DESCRIPTION"),
+            location=_text("LOCATION"),
+            url=_text("URL"),
+            status=status,
+            transp=ICSTransp.OPAQUE.value if evt_type != EventType.OTHER.value else ICSTransp.TRANSPARENT.value,
+            categories=categories or evt_type,
+            all_day=all_day,
+            created=now,
+            last_modified=now,
+            x_source=source,
+            x_source_id=source_id,
+            x_event_type=evt_type,
+            x_raw_data=json.dumps(
+                {
+                    name: entries[0][1] if len(entries) == 1 else [value for _, value in entries]
+                    for name, entries in props.items()
+                },
+                ensure_ascii=False,
+            ),
+        )
+
+    @classmethod
+    def iter_ics_events(cls, lines: Iterable[str], source: str = EventSource.BB.value) -> Iterator[VEvent]:
+        """
+        流式解析 iCalendar 文本行（如 response.iter_lines()），逐个产出 VEvent。
+
+        只保留顶层 VEVENT 的属性，嵌套的 VALARM 等组件跳过；解析失败的事件记录日志后忽略。
+        """
+        props: Optional[Dict[str, List[tuple]]] = None
+        nested = 0
+        for line in cls._unfold_ics_lines(lines):
+            parsed = cls._split_ics_line(line)
+            if parsed is None:
+                continue
+            name, params, value = parsed
+            if name == "BEGIN":
+                if value.upper() == "VEVENT" and props is None:
+                    props = {}
+                elif props is not None:
+                    nested += 1
+                continue
+            if name == "END":
+                if props is None:
+                    continue
+                if nested:
+                    nested -= 1
+                    continue
+                if value.upper() == "VEVENT":
+                    try:
+                        event = cls._build_feed_event(props, source)
+                    except Exception as exc:
+                        logger.error("scheduler parse ics event failed", extra={"error": str(exc)})
+                        event = None
+                    if event is not None:
+                        yield event
+                    props = None
+                continue
+            if props is None or nested:
+                continue
+            props.setdefault(name, []).append((params, value))
+
     # ---- TIS 教务系统 ----
 
     @staticmethod
@@ -811,7 +1306,9 @@ class EventParser:
         else:
             evt_type = EventType.OTHER.value
 
-        source_id = _pick("id", "ID", "rcid", "RCID") or f"tis_{date_str}_{kssj}_{title}"
+        # TIS 记录 ID 每天都会变化，周模板推断的日期也没有 ID；按日期 + 开始时间 + 标题生成，
+        # 保证同一节课无论以哪种方式抓取都对应同一个 source_id（进而保留 UID）。
+        source_id = f"tis_{date_str}_{kssj}_{title}"
         course_name = _pick("kcmc", "KCMC") or None
         course_id = _pick("kcid", "KCID", "kcdm", "KCDM") or None
 
@@ -893,14 +1390,79 @@ class Scheduler:
 
     def __init__(self, db_path: Optional[str] = None, holiday_provider: Optional[HolidayProvider] = None):
         self.engine = get_engine(db_path)
+        # 读路径（ICS 导出、查询）走独立的只读连接池，WAL 下不会被刷新写入阻塞。
+        self.read_engine = (
+            self.engine if db_path == ":memory:" else get_engine(db_path, read_only=True)
+        )
         self._bb: Optional[bbService] = None
         self._tis: Optional[TisService] = None
         self.holiday_provider = holiday_provider or HolidayProvider()
         self.last_sync_report: Dict[str, Any] = {}
+        # 物化 ICS 的进程内副本：source -> {body, content_hash, built_at, event_count, data_version}
+        # data_version 与 ics_version 表一致时直接命中，无需查询事件或重新渲染。
+        self._ics_cache: Dict[str, Dict[str, Any]] = {}
+        self._ics_cache_lock = threading.Lock()
+        # 当前线程的刷新租约 (source, owner, token)，同步写入在提交前于同一事务内校验。
+        self._write_fence = threading.local()
+        self._warm_ics_cache()
 
     def _session(self) -> Session:
         return Session(self.engine)
 
+    def _read_session(self) -> Session:
+        return Session(self.read_engine)
+
+    @contextlib.contextmanager
+    def write_fence(self, source: str, owner: Optional[str], token: int):
+        """
+        上下文内当前线程的同步写入只在 fencing 校验通过时提交。
+
+        owner 非空：租约在本库 refresh_lease 表，校验其仍由 owner 以 token 持有；
+        owner 为 None：租约在外部（KV），校验 token 不小于 write_fence 表中已提交的最大 token，
+        并在同一事务内把它推进到 token。
+        """
+        previous = getattr(self._write_fence, "value", None)
+        self._write_fence.value = (source, owner, token)
+        try:
+            yield
+        finally:
+            self._write_fence.value = previous
+
+    def _commit(self, session: Session) -> None:
+        """
+        提交同步写入。设置了写入租约时先在同一事务内校验 fencing token：
+        事务已持有 SQLite 写锁，校验与提交之间其他进程无法接管租约或推进栅栏。
+        """
+        fence = getattr(self._write_fence, "value", None)
+        if fence is not None and fence[1] is None:
+            source, _owner, token = fence
+            table = WriteFence.__table__
+            session.execute(
+                sa_insert(table).prefix_with("OR IGNORE").values(source=source, fencing_token=0)
+            )
+            advanced = session.execute(
+                sa_update(table)
+                .where(table.c.source == source, table.c.fencing_token <= token)
+                .values(fencing_token=token, updated_at=_now_utc())
+            ).rowcount
+            if not advanced:
+                session.rollback()
+                raise LeaseLostError(
+                    f"refresh lease for {source} superseded (token={token}), write rolled back"
+                )
+        elif fence is not None:
+            source, owner, token = fence
+            table = SourceLease.__table__
+            row = session.execute(
+                sa_select(table.c.owner, table.c.fencing_token).where(table.c.source == source)
+            ).first()
+            if row is None or row.owner != owner or row.fencing_token != token:
+                session.rollback()
+                raise LeaseLostError(
+                    f"refresh lease for {source} lost (token={token}), write rolled back"
+                )
+        session.commit()
+
     # ================================================================
     #  服务登录
     # ================================================================
@@ -946,34 +1508,225 @@ class Scheduler:
     #  数据同步
     # ================================================================
 
-    def _delete_by_source(self, session: Session, source: str, hard: bool = True) -> int:
-        """删除指定来源的所有事件"""
-        stmt = select(VEvent).where(VEvent.x_source == source)
-        if not hard:
-            stmt = stmt.where(VEvent.is_deleted == False)  # noqa: E712
-        events = session.exec(stmt).all()
-        count = len(events)
-        for e in events:
+    # SQLite 单条语句的绑定参数上限较低，IN 列表按批拆分。
+    _BULK_IN_CHUNK = 500
+
+    def _delete_by_source(
+        self,
+        session: Session,
+        source: str,
+        hard: bool = True,
+        preserve_dates: Optional[set] = None,
+        only_dates: Optional[set] = None,
+    ) -> int:
+        """
+        删除指定来源的事件（Core 批量语句，不经 ORM 逐行处理）。
+
+        整源硬删为单条 DELETE；软删与按日期过滤时先取 UID，再交给 _bulk_remove，
+        保证软删同样设为 CANCELLED 并递增 SEQUENCE。
+        preserve_dates: 这些 CST 日期的事件保留不动；only_dates: 仅删除这些 CST 日期的事件。
+        """
+        table = VEvent.__table__
+        if hard and not preserve_dates and only_dates is None:
+            result = session.execute(sa_delete(table).where(table.c.x_source == source))
+            return int(result.rowcount or 0)
+
+        rows = session.execute(
+            sa_select(table.c.uid, table.c.dtstart).where(table.c.x_source == source)
+        ).all()
+        uids = [
+            uid for uid, dtstart in rows
+            if (not preserve_dates or _local_day(dtstart) not in preserve_dates)
+            and (only_dates is None or _local_day(dtstart) in only_dates)
+        ]
+        return self._bulk_remove(session, uids, hard=hard)
+
+    def _bulk_remove(self, session: Session, uids: List[str], hard: bool = True) -> int:
+        """按 UID 批量硬删或软删（CANCELLED + SEQUENCE 递增）。"""
+        table = VEvent.__table__
+        now = _now_utc()
+        removed = 0
+        for i in range(0, len(uids), self._BULK_IN_CHUNK):
+            chunk = uids[i:i + self._BULK_IN_CHUNK]
             if hard:
-                session.delete(e)
+                result = session.execute(sa_delete(table).where(table.c.uid.in_(chunk)))
             else:
-                e.is_deleted = True
-                e.last_modified = _now_utc()
-                session.add(e)
-        return count
+                result = session.execute(
+                    sa_update(table)
+                    .where(table.c.uid.in_(chunk), table.c.is_deleted == False)  # noqa: E712
+                    .values(
+                        is_deleted=True,
+                        status=ICSStatus.CANCELLED.value,
+                        sequence=table.c.sequence + 1,
+                        last_modified=now,
+                    )
+                )
+            removed += int(result.rowcount or 0)
+        return removed
 
-    def _replace_source_events(self, source: str, events: List[VEvent], clear_old: bool = True) -> int:
-        """替换指定来源的事件集合（兼容 app.py 的旧调用路径）。"""
+    def _bulk_insert_events(self, session: Session, events: List[VEvent]) -> int:
+        """executemany 插入；事件已由 EventParser 构造，这里直接取列值，不再经 ORM 校验。"""
+        if not events:
+            return 0
+        table = VEvent.__table__
+        columns = [c.name for c in table.columns]
+        session.execute(
+            sa_insert(table),
+            [{name: getattr(event, name) for name in columns} for event in events],
+        )
+        return len(events)
+
+    # upsert 时参与内容比较的字段；变化时 SEQUENCE 递增。
+    _SYNC_CONTENT_FIELDS = (
+        "dtstart", "dtend", "duration", "summary", "description", "location", "url", "geo",
+        "status", "classification", "transp", "categories", "priority", "organizer",
+        "rrule", "exdate", "recurrence_id", "valarm", "all_day",
+        "x_event_type", "x_course_name", "x_course_id",
+    )
+
+    def _upsert_source_events(
+        self,
+        session: Session,
+        source: str,
+        events: List[VEvent],
+        *,
+        hard_delete: bool = True,
+        preserve_dates: Optional[set] = None,
+        only_dates: Optional[set] = None,
+        window: Optional[tuple] = None,
+        remove_missing: bool = True,
+    ) -> Dict[str, int]:
+        """
+        以 (x_source, x_source_id) 为键同步事件集合。
+
+        已存在的事件保留 UID 与 CREATED，仅在内容变化时更新并递增 SEQUENCE；
+        新事件插入；本次未出现的旧事件按 hard_delete 硬删或软删（CANCELLED）。
+        preserve_dates / only_dates 限定参与比对的旧事件范围（CST 日期）；
+        window=(start, end) 时仍按 source_id 与整个来源的旧事件配对（跨窗口移动的事件原地更新，
+        不会在新窗口重复插入），但只删除 dtstart 落在该半开区间内且未配对的旧事件。
+        remove_missing=False 时只插入 / 更新，不删除任何旧事件（上游结果不完整时使用）。
+        读取与写入均为 Core 批量语句，由调用方在同一事务内提交。
+        """
+        table = VEvent.__table__
+        fields = self._SYNC_CONTENT_FIELDS
+        existing = session.execute(
+            sa_select(
+                table.c.uid,
+                table.c.x_source_id,
+                table.c.is_deleted,
+                table.c.sequence,
+                *(table.c[f] for f in fields),
+            )
+            .where(table.c.x_source == source)
+            .order_by(table.c.dtstart.asc())
+        ).mappings().all()
+        if preserve_dates:
+            existing = [r for r in existing if _local_day(r["dtstart"]) not in preserve_dates]
+        if only_dates is not None:
+            existing = [r for r in existing if _local_day(r["dtstart"]) in only_dates]
+        if window is not None:
+            # 窗口内的旧事件优先配对，其次才是窗口外（被移动到本窗口）的同 source_id 事件。
+            existing = sorted(existing, key=lambda r: not _in_window(r["dtstart"], *window))
+
+        # 同一 source_id 可能对应多条（如同一课程一天两节），按时间顺序逐一配对。
+        by_source_id: Dict[str, List[Any]] = {}
+        for row in existing:
+            by_source_id.setdefault(row["x_source_id"], []).append(row)
+
+        def _comparable(value: Any) -> Any:
+            return _as_aware_utc(value) if isinstance(value, datetime) else value
+
+        now = _now_utc()
+        inserts: List[VEvent] = []
+        updates: List[Dict[str, Any]] = []
+        unchanged = 0
+        for event in sorted(events, key=lambda e: _as_aware_utc(e.dtstart)):
+            candidates = by_source_id.get(event.x_source_id)
+            row = candidates.pop(0) if candidates else None
+            if row is None:
+                inserts.append(event)
+                continue
+
+            changed = bool(row["is_deleted"]) or any(
+                _comparable(row[f]) != _comparable(getattr(event, f)) for f in fields
+            )
+            if not changed:
+                unchanged += 1
+                continue
+
+            params = {f: getattr(event, f) for f in fields}
+            params.update(
+                {
+                    "b_uid": row["uid"],
+                    "x_raw_data": event.x_raw_data,
+                    "is_deleted": False,
+                    "sequence": int(row["sequence"] or 0) + 1,
+                    "dtstamp": now,
+                    "last_modified": now,
+                }
+            )
+            updates.append(params)
+
+        removed_uids = [
+            row["uid"]
+            for rows in by_source_id.values()
+            for row in rows
+            if remove_missing and (window is None or _in_window(row["dtstart"], *window))
+        ]
+        removed = self._bulk_remove(session, removed_uids, hard=hard_delete)
+
+        if updates:
+            value_names = [name for name in updates[0] if name != "b_uid"]
+            session.execute(
+                sa_update(table)
+                .where(table.c.uid == bindparam("b_uid"))
+                .values({name: bindparam(name) for name in value_names}),
+                updates,
+            )
+        self._bulk_insert_events(session, inserts)
+
+        return {
+            "inserted": len(inserts),
+            "updated": len(updates),
+            "unchanged": unchanged,
+            "removed": removed,
+        }
+
+    def _replace_source_events(
+        self,
+        source: str,
+        events: List[VEvent],
+        clear_old: bool = True,
+        preserve_dates: Optional[set] = None,
+        hard_delete: bool = True,
+    ) -> int:
+        """
+        替换指定来源的事件集合（兼容 app.py 的旧调用路径）。
+
+        clear_old=True 时按 (x_source, x_source_id) upsert，保留已有事件的 UID，
+        并删除本次未出现的旧事件；clear_old=False 时仅批量追加。全部写入在一个事务内完成。
+        preserve_dates: 抓取失败的 CST 日期，这些日期保留已存储的事件，也不写入新事件。
+        """
+        preserve_dates = set(preserve_dates or ())
+        if preserve_dates:
+            events = [e for e in events if _local_day(e.dtstart) not in preserve_dates]
         with self._session() as session:
             if clear_old:
-                deleted = self._delete_by_source(session, source, hard=True)
+                stats = self._upsert_source_events(
+                    session,
+                    source,
+                    events,
+                    hard_delete=hard_delete,
+                    preserve_dates=preserve_dates,
+                )
                 logger.info(
-                    "scheduler replace source old records removed",
-                    extra={"source": source, "count": deleted},
+                    "scheduler replace source upserted",
+                    extra={"source": source, "preserved_dates": len(preserve_dates), **stats},
                 )
-            for event in events:
-                session.add(event)
-            session.commit()
+            else:
+                self._bulk_insert_events(session, events)
+            self._mark_ics_dirty(session, source)
+            self._commit(session)
         return len(events)
 
     def replace_bb_raw_events(self, raw_events: list, clear_old: bool = True) -> int:
@@ -986,19 +1739,263 @@ class Scheduler:
         }
         return count
 
-    def replace_tis_raw_schedule(self, schedule_data: dict, clear_old: bool = True) -> int:
-        """将 TIS 课表字典解析后写入数据库。"""
-        events, parse_stats = EventParser.parse_tis_schedule(
-            schedule_data or {},
-            holiday_provider=self.holiday_provider,
+    def merge_bb_raw_events(self, raw_events: list) -> int:
+        """
+        将部分分段失败的 Blackboard 查询结果并入数据库：只插入 / 更新，不删除也不刷新同步标记，
+        失败分段内的已存储事件原样保留，等待下次完整刷新。
+        """
+        source = EventSource.BB.value
+        events = EventParser.parse_bb_events(raw_events or [])
+        with self._session() as session:
+            stats = self._upsert_source_events(session, source, events, remove_missing=False)
+            self._mark_ics_dirty(session, source)
+            self._commit(session)
+        logger.info("scheduler bb partial merged", extra={"source": source, **stats})
+        self.last_sync_report = {
+            "source": source,
+            "synced_events": len(events),
+            "partial": True,
+        }
+        return len(events)
+
+    def replace_bb_window_events(
+        self,
+        raw_events: list,
+        *,
+        key: str,
+        window_start: Optional[datetime] = None,
+        window_end: Optional[datetime] = None,
+    ) -> int:
+        """
+        分段刷新：只替换 dtstart 落在 [window_start, window_end) 内的 Blackboard 事件，
+        窗口外的事件保持不动，并记录该窗口的同步标记。
+        """
+        source = EventSource.BB.value
+        window_start = _ensure_utc(window_start) if window_start is not None else None
+        window_end = _ensure_utc(window_end) if window_end is not None else None
+        events = [
+            e for e in EventParser.parse_bb_events(raw_events or [])
+            if _in_window(e.dtstart, window_start, window_end)
+        ]
+        with self._session() as session:
+            stats = self._upsert_source_events(
+                session, source, events, window=(window_start, window_end)
+            )
+            marker = session.get(SyncMarker, key) or SyncMarker(key=key, source=source)
+            marker.window_start = window_start
+            marker.window_end = window_end
+            marker.synced_at = _now_utc()
+            marker.event_count = len(events)
+            session.add(marker)
+            self._mark_ics_dirty(session, source)
+            self._commit(session)
+        logger.info(
+            "scheduler bb window upserted",
+            extra={"source": source, "window": key, **stats},
         )
-        count = self._replace_source_events(EventSource.TIS.value, events, clear_old=clear_old)
         self.last_sync_report = {
+            "source": source,
+            "window": key,
+            "synced_events": len(events),
+        }
+        return len(events)
+
+    def replace_bb_feed_events(
+        self,
+        lines: Iterable[str],
+        *,
+        key: str = "bb:feed",
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> int:
+        """
+        将 BB_ICAL_FEED_URL 订阅源的文本行流式解析后 upsert 为完整的 Blackboard 事件集合，
+        并在同步标记中记录响应的 ETag / Last-Modified，供下次条件请求使用。
+
+        订阅源中没有任何事件时不写入（避免异常响应清空已有数据），返回 0。
+        """
+        source = EventSource.BB.value
+        events = list(EventParser.iter_ics_events(lines, source=source))
+        if not events:
+            return 0
+        with self._session() as session:
+            stats = self._upsert_source_events(session, source, events)
+            marker = session.get(SyncMarker, key) or SyncMarker(key=key, source=source)
+            marker.synced_at = _now_utc()
+            marker.event_count = len(events)
+            marker.etag = etag
+            marker.http_last_modified = last_modified
+            session.add(marker)
+            self._mark_ics_dirty(session, source)
+            self._commit(session)
+        logger.info(
+            "scheduler bb feed upserted",
+            extra={"source": source, "window": key, **stats},
+        )
+        self.last_sync_report = {
+            "source": source,
+            "window": key,
+            "synced_events": len(events),
+        }
+        return len(events)
+
+    def get_sync_markers(self, source: str) -> Dict[str, Dict[str, Any]]:
+        """
+        返回来源下所有同步标记：key -> {window_start, window_end, synced_at, event_count,
+        etag, http_last_modified}。
+        """
+        with self._read_session() as session:
+            rows = session.exec(select(SyncMarker).where(SyncMarker.source == source)).all()
+        return {
+            row.key: {
+                "window_start": _as_aware_utc(row.window_start) if row.window_start else None,
+                "window_end": _as_aware_utc(row.window_end) if row.window_end else None,
+                "synced_at": _as_aware_utc(row.synced_at),
+                "event_count": row.event_count,
+                "etag": row.etag,
+                "http_last_modified": row.http_last_modified,
+            }
+            for row in rows
+        }
+
+    def _tis_fingerprints(self, schedule_data: dict, skip_dates: set) -> Dict[str, str]:
+        fingerprints = {}
+        for day, items in schedule_data.items():
+            if day in skip_dates:
+                continue
+            holiday_name = None
+            if self.holiday_provider is not None:
+                holiday_name = self.holiday_provider.holiday_name(day)
+            fingerprints[day] = _tis_day_fingerprint(items, holiday_name)
+        return fingerprints
+
+    def _tis_day_counts(self, session: Session) -> Dict[str, int]:
+        """数据库中每个 CST 日期现存（未删除）的 TIS 事件数。"""
+        table = VEvent.__table__
+        rows = session.execute(
+            sa_select(table.c.dtstart).where(
+                table.c.x_source == EventSource.TIS.value,
+                table.c.is_deleted == False,  # noqa: E712
+            )
+        ).all()
+        return dict(collections.Counter(_local_day(dtstart) for (dtstart,) in rows))
+
+    def _store_tis_fingerprints(
+        self,
+        session: Session,
+        fingerprints: Dict[str, str],
+        counts: Dict[str, int],
+        drop_days: Optional[set] = None,
+    ) -> None:
+        now = _now_utc()
+        for day, fingerprint in fingerprints.items():
+            row = session.get(TisDayFingerprint, day)
+            if row is None:
+                row = TisDayFingerprint(day=day, fingerprint=fingerprint, updated_at=now)
+            else:
+                row.fingerprint = fingerprint
+                row.updated_at = now
+            row.event_count = counts.get(day, 0)
+            session.add(row)
+        for day in drop_days or ():
+            row = session.get(TisDayFingerprint, day)
+            if row is not None:
+                session.delete(row)
+
+    def replace_tis_raw_schedule(
+        self,
+        schedule_data: dict,
+        clear_old: bool = True,
+        preserve_dates: Optional[List[str]] = None,
+        incremental: bool = True,
+    ) -> int:
+        """
+        将 TIS 课表字典解析后写入数据库。
+
+        preserve_dates: 抓取失败的日期（通常为 last_query_metadata["failed_dates"]），保留其旧事件。
+        incremental: 按每日原始数据指纹增量同步，只重新解析、替换内容变化的日期，
+            以及已移出抓取窗口的日期；首次同步（无指纹）时退化为全量替换。
+            指纹未变但现存事件数与写入时记录的不一致（事件被带外删除）的日期同样重新写入。
+
+        Returns:
+            本次写入的事件数
+        """
+        schedule_data = schedule_data or {}
+        preserve = set(preserve_dates or ())
+        fingerprints = self._tis_fingerprints(schedule_data, preserve)
+
+        with self._session() as session:
+            stored_rows = session.exec(select(TisDayFingerprint)).all()
+            stored = {row.day: row.fingerprint for row in stored_rows}
+            stored_counts = {row.day: row.event_count for row in stored_rows}
+            live_counts = self._tis_day_counts(session) if stored else {}
+
+        full_replace = not (incremental and clear_old and stored)
+        if full_replace:
+            changed_days = set(fingerprints)
+            stale_days: set = set()
+        else:
+            changed_days = {
+                day for day, fingerprint in fingerprints.items()
+                if stored.get(day) != fingerprint
+                or stored_counts.get(day) != live_counts.get(day, 0)
+            }
+            stale_days = set(stored) - set(schedule_data)
+
+        report = {
             "source": EventSource.TIS.value,
-            "synced_events": count,
-            "holiday_cancelled_events": parse_stats.get("holiday_cancelled", 0),
-            "parse_failed": parse_stats.get("parse_failed", 0),
+            "incremental": not full_replace,
+            "changed_dates": len(changed_days),
+            "unchanged_dates": len(fingerprints) - len(changed_days),
+            "stale_dates": len(stale_days),
+            "failed_dates": sorted(preserve),
         }
+
+        if not full_replace and not changed_days and not stale_days:
+            report.update({"synced_events": 0, "holiday_cancelled_events": 0, "parse_failed": 0})
+            self.last_sync_report = report
+            logger.info("scheduler tis sync skipped: no day changed", extra=report)
+            return 0
+
+        events, parse_stats = EventParser.parse_tis_schedule(
+            {day: schedule_data[day] for day in sorted(changed_days)},
+            holiday_provider=self.holiday_provider,
+        )
+        if preserve:
+            events = [e for e in events if _local_day(e.dtstart) not in preserve]
+
+        # 事件与指纹在同一事务内写入，避免中途失败后指纹与数据不一致。
+        with self._session() as session:
+            if full_replace and not clear_old:
+                self._bulk_insert_events(session, events)
+                upsert_stats = {"inserted": len(events)}
+            else:
+                upsert_stats = self._upsert_source_events(
+                    session,
+                    EventSource.TIS.value,
+                    events,
+                    preserve_dates=preserve if full_replace else None,
+                    only_dates=None if full_replace else changed_days | stale_days,
+                )
+            self._store_tis_fingerprints(
+                session,
+                {day: fingerprints[day] for day in changed_days},
+                collections.Counter(_local_day(e.dtstart) for e in events),
+                drop_days=stale_days if not full_replace else set(stored) - set(fingerprints) - preserve,
+            )
+            self._mark_ics_dirty(session, EventSource.TIS.value)
+            self._commit(session)
+        count = len(events)
+        logger.info("scheduler tis sync applied", extra={**upsert_stats, **report})
+
+        report.update(
+            {
+                "synced_events": count,
+                "holiday_cancelled_events": parse_stats.get("holiday_cancelled", 0),
+                "parse_failed": parse_stats.get("parse_failed", 0),
+            }
+        )
+        self.last_sync_report = report
         return count
 
     def sync_bb(
@@ -1024,20 +2021,17 @@ class Scheduler:
             extra={"start": start.strftime('%Y-%m-%d'), "end": end.strftime('%Y-%m-%d')},
         )
 
-        raw_events = self._bb.queryCalendar(start, end)
-        if raw_events is None:
+        result = self._bb.queryCalendar(start, end, report_failures=True)
+        if result is None:
             logger.error("scheduler sync bb failed: bb query returned none")
             return 0
+        raw_events, failed_chunks = result
+        if failed_chunks:
+            logger.warning("scheduler sync bb partial", extra={"failed_chunks": failed_chunks})
+            return self.merge_bb_raw_events(raw_events)
 
         events = EventParser.parse_bb_events(raw_events)
-
-        with self._session() as session:
-            if clear_old:
-                deleted = self._delete_by_source(session, EventSource.BB.value, hard=True)
-                logger.info("scheduler sync bb old records removed", extra={"count": deleted})
-            for e in events:
-                session.add(e)
-            session.commit()
+        self._replace_source_events(EventSource.BB.value, events, clear_old=clear_old)
 
         self.last_sync_report = {
             "source": "bb",
@@ -1076,30 +2070,15 @@ class Scheduler:
             logger.warning("scheduler sync tis got empty schedule")
             return 0
 
-        events, parse_stats = EventParser.parse_tis_schedule(
+        tis_meta = getattr(self._tis, "last_query_metadata", {})
+        count = self.replace_tis_raw_schedule(
             raw_schedule,
-            holiday_provider=self.holiday_provider,
+            clear_old=clear_old,
+            preserve_dates=tis_meta.get("failed_dates", []),
         )
-        tis_meta = getattr(self._tis, "last_query_metadata", {})
-
-        with self._session() as session:
-            if clear_old:
-                deleted = self._delete_by_source(session, EventSource.TIS.value, hard=True)
-                logger.info("scheduler sync tis old records removed", extra={"count": deleted})
-            for e in events:
-                session.add(e)
-            session.commit()
-
-        self.last_sync_report = {
-            "source": "tis",
-            "synced_events": len(events),
-            "holiday_filtered_days": len(tis_meta.get("holiday_skipped_dates", [])),
-            "holiday_cancelled_events": parse_stats.get("holiday_cancelled", 0),
-            "parse_failed": parse_stats.get("parse_failed", 0),
-            "failed_dates": tis_meta.get("failed_dates", []),
-        }
+        self.last_sync_report["holiday_filtered_days"] = len(tis_meta.get("holiday_skipped_dates", []))
         logger.info("scheduler sync tis completed", extra=self.last_sync_report)
-        return len(events)
+        return count
 
     def sync_all(self, **kwargs) -> Dict[str, int]:
         result = {}
@@ -1175,7 +2154,7 @@ class Scheduler:
         source: Optional[str] = None,
         status: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
-        with self._session() as session:
+        with self._read_session() as session:
             stmt = select(SyncJob)
             if source:
                 stmt = stmt.where(SyncJob.source == source)
@@ -1227,6 +2206,7 @@ class Scheduler:
         )
         with self._session() as session:
             session.add(event)
+            self._mark_ics_dirty(session, event.x_source)
             session.commit()
             session.refresh(event)
         return event
@@ -1260,14 +2240,14 @@ class Scheduler:
     # ================================================================
 
     def get_event(self, uid: str) -> Optional[VEvent]:
-        with self._session() as session:
+        with self._read_session() as session:
             stmt = select(VEvent).where(
                 VEvent.uid == uid, VEvent.is_deleted == False  # noqa: E712
             )
             return session.exec(stmt).first()
 
     def get_event_by_source(self, source: str, source_id: str) -> Optional[VEvent]:
-        with self._session() as session:
+        with self._read_session() as session:
             stmt = select(VEvent).where(
                 VEvent.x_source == source,
                 VEvent.x_source_id == source_id,
@@ -1299,39 +2279,77 @@ class Scheduler:
             include_deleted: 是否包含已删除
             limit/offset: 分页
         """
-        with self._session() as session:
-            stmt = select(VEvent)
+        stmt = self._query_events_stmt(
+            start=start,
+            end=end,
+            source=source,
+            event_type=event_type,
+            keyword=keyword,
+            status=status,
+            include_deleted=include_deleted,
+            limit=limit,
+            offset=offset,
+        )
+        with self._read_session() as session:
+            return list(session.exec(stmt).all())
 
-            if not include_deleted:
-                stmt = stmt.where(VEvent.is_deleted == False)  # noqa: E712
+    @staticmethod
+    def _query_events_stmt(
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        source: Optional[str] = None,
+        event_type: Optional[str] = None,
+        keyword: Optional[str] = None,
+        status: Optional[str] = None,
+        include_deleted: bool = False,
+        limit: int = 500,
+        offset: int = 0,
+    ):
+        stmt = select(VEvent)
 
-            if start is not None:
-                s = _ensure_utc(start)
-                stmt = stmt.where(
-                    (col(VEvent.dtend) >= s) | ((col(VEvent.dtend).is_(None)) & (col(VEvent.dtstart) >= s))
-                )
+        if not include_deleted:
+            stmt = stmt.where(VEvent.is_deleted == False)  # noqa: E712
 
-            if end is not None:
-                e = _ensure_utc(end)
-                stmt = stmt.where(col(VEvent.dtstart) <= e)
+        if start is not None:
+            s = _ensure_utc(start)
+            stmt = stmt.where(
+                (col(VEvent.dtend) >= s) | ((col(VEvent.dtend).is_(None)) & (col(VEvent.dtstart) >= s))
+            )
 
-            if source is not None:
-                stmt = stmt.where(VEvent.x_source == source)
+        if end is not None:
+            e = _ensure_utc(end)
+            stmt = stmt.where(col(VEvent.dtstart) <= e)
 
-            if event_type is not None:
-                stmt = stmt.where(VEvent.x_event_type == event_type)
+        if source is not None:
+            stmt = stmt.where(VEvent.x_source == source)
 
-            if status is not None:
-                stmt = stmt.where(VEvent.status == status)
+        if event_type is not None:
+            stmt = stmt.where(VEvent.x_event_type == event_type)
 
-            if keyword:
-                kw = f"%{keyword}%"
-                stmt = stmt.where(
-                    col(VEvent.summary).ilike(kw) | col(VEvent.description).ilike(kw)
-                )
+        if status is not None:
+            stmt = stmt.where(VEvent.status == status)
 
-            stmt = stmt.order_by(col(VEvent.dtstart).asc()).offset(offset).limit(limit)
-            return list(session.exec(stmt).all())
+        if keyword:
+            kw = f"%{keyword}%"
+            stmt = stmt.where(
+                col(VEvent.summary).ilike(kw) | col(VEvent.description).ilike(kw)
+            )
+
+        stmt = stmt.order_by(col(VEvent.dtstart).asc()).offset(offset).limit(limit)
+        return stmt
+
+    def explain_query_events(self, **filters) -> List[str]:
+        """
+        返回 query_events 在当前库上的 EXPLAIN QUERY PLAN 明细，用于确认是否命中复合索引。
+
+        Args:
+            **filters: 与 query_events 相同的过滤参数
+        """
+        stmt = self._query_events_stmt(**filters)
+        compiled = stmt.compile(dialect=self.read_engine.dialect, compile_kwargs={"literal_binds": True})
+        with self.read_engine.connect() as conn:
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").fetchall()
+        return [str(row[-1]) for row in rows]
 
     def get_today_events(self) -> List[VEvent]:
         today = datetime.now(tz=CST).replace(hour=0, minute=0, second=0, microsecond=0)
@@ -1375,6 +2393,7 @@ class Scheduler:
             ).first()
             if event is None:
                 return None
+            old_source = event.x_source
 
             update_fields = data.model_dump(exclude_unset=True)
             for key, value in update_fields.items():
@@ -1386,9 +2405,11 @@ class Scheduler:
             event.last_modified = _now_utc()
             event.sequence += 1
             session.add(event)
+            # 事件移出原来源时，原来源的物化 ICS 同样过期。
+            self._mark_ics_dirty(session, event.x_source, old_source)
             session.commit()
             session.refresh(event)
-            return event
+        return event
 
     def update_event_fields(self, uid: str, **fields) -> Optional[VEvent]:
         """使用 kwargs 快捷更新"""
@@ -1403,6 +2424,7 @@ class Scheduler:
             event = session.exec(select(VEvent).where(VEvent.uid == uid)).first()
             if event is None:
                 return False
+            source = event.x_source
             if hard:
                 session.delete(event)
             else:
@@ -1411,6 +2433,7 @@ class Scheduler:
                 event.last_modified = _now_utc()
                 event.sequence += 1
                 session.add(event)
+            self._mark_ics_dirty(session, source)
             session.commit()
         return True
 
@@ -1444,7 +2467,7 @@ class Scheduler:
 
     def get_summary(self) -> dict:
         """统计摘要"""
-        with self._session() as session:
+        with self._read_session() as session:
             total = session.exec(
                 select(VEvent).where(VEvent.is_deleted == False)  # noqa: E712
             ).all()
@@ -1469,6 +2492,14 @@ class Scheduler:
             RFC 5545 VCALENDAR 字符串
         """
         events = self.query_events(start=start, end=end, source=source)
+        return self._render_ics(events, source=source, prodid=prodid)
+
+    @staticmethod
+    def _render_ics(
+        events: List[VEvent],
+        source: Optional[str] = None,
+        prodid: str = "-//SUSTech Student Agent//Scheduler//CN",
+    ) -> str:
         source_value = (source or "").lower()
         events_all_bb = bool(events) and all(
             e.x_source == EventSource.BB.value for e in events
@@ -1496,6 +2527,224 @@ class Scheduler:
         lines.append("END:VCALENDAR")
         return "\r\n".join(lines)
 
+    # ================================================================
+    #  刷新租约
+    # ================================================================
+
+    def acquire_refresh_lease(self, source: str, owner: str, ttl_seconds: float) -> Optional[int]:
+        """
+        获取来源的刷新租约，成功返回新的 fencing token，已被他人持有且未过期时返回 None。
+
+        条件 UPDATE 在 SQLite 写锁内完成"判断过期 + 接管"，多进程并发获取时只有一个成功。
+        """
+        table = SourceLease.__table__
+        now = _now_utc()
+        with self.engine.begin() as conn:
+            conn.execute(
+                sa_insert(table)
+                .prefix_with("OR IGNORE")
+                .values(source=source, owner="", fencing_token=0, expires_at=now)
+            )
+            acquired = conn.execute(
+                sa_update(table)
+                .where(
+                    table.c.source == source,
+                    (table.c.owner == "") | (table.c.expires_at <= now),
+                )
+                .values(
+                    owner=owner,
+                    fencing_token=table.c.fencing_token + 1,
+                    expires_at=now + timedelta(seconds=ttl_seconds),
+                    acquired_at=now,
+                )
+            ).rowcount
+            if not acquired:
+                return None
+            return conn.execute(
+                sa_select(table.c.fencing_token).where(table.c.source == source)
+            ).scalar_one()
+
+    def renew_refresh_lease(self, source: str, owner: str, token: int, ttl_seconds: float) -> bool:
+        table = SourceLease.__table__
+        with self.engine.begin() as conn:
+            return bool(
+                conn.execute(
+                    sa_update(table)
+                    .where(
+                        table.c.source == source,
+                        table.c.owner == owner,
+                        table.c.fencing_token == token,
+                    )
+                    .values(expires_at=_now_utc() + timedelta(seconds=ttl_seconds))
+                ).rowcount
+            )
+
+    def release_refresh_lease(self, source: str, owner: str, token: int) -> bool:
+        table = SourceLease.__table__
+        with self.engine.begin() as conn:
+            return bool(
+                conn.execute(
+                    sa_update(table)
+                    .where(
+                        table.c.source == source,
+                        table.c.owner == owner,
+                        table.c.fencing_token == token,
+                    )
+                    .values(owner="", expires_at=_now_utc())
+                ).rowcount
+            )
+
+    def check_refresh_lease(self, source: str, owner: str, token: int) -> bool:
+        """fencing 校验：租约仍由 owner 以该 token 持有（他人接管后 token 必然变化）。"""
+        table = SourceLease.__table__
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                sa_select(table.c.owner, table.c.fencing_token).where(table.c.source == source)
+            ).first()
+        return row is not None and row.owner == owner and row.fencing_token == token
+
+    def get_refresh_lease_holder(self, source: str) -> Optional[str]:
+        table = SourceLease.__table__
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                sa_select(table.c.owner, table.c.expires_at).where(table.c.source == source)
+            ).first()
+        if row is None or not row.owner or _as_aware_utc(row.expires_at) <= _now_utc():
+            return None
+        return row.owner
+
+    # ================================================================
+    #  物化 ICS 缓存
+    # ================================================================
+
+    def _mark_ics_dirty(self, session: Session, *sources: Optional[str]) -> None:
+        """
+        在写入事务内递增来源的数据版本号，标记物化 ICS 过期。
+
+        与事件写入同一事务提交或回滚（含 fencing 校验失败），一次同步无论写多少行只递增一次，
+        重建推迟到下一次读取。
+        """
+        table = IcsVersion.__table__
+        for source in sorted({source for source in sources if source}):
+            session.execute(
+                sa_insert(table).prefix_with("OR IGNORE").values(source=source, version=0)
+            )
+            session.execute(
+                sa_update(table)
+                .where(table.c.source == source)
+                .values(version=table.c.version + 1, updated_at=_now_utc())
+            )
+
+    def _ics_version(self, source: str) -> int:
+        """来源当前已提交的数据版本号，按主键读取一行；从未写入过的来源为 0。"""
+        table = IcsVersion.__table__
+        with self.read_engine.connect() as conn:
+            version = conn.execute(
+                sa_select(table.c.version).where(table.c.source == source)
+            ).scalar()
+        return version or 0
+
+    def _warm_ics_cache(self) -> None:
+        """启动时把有事件但缺少 ics_cache 行的来源标记为过期（旧库升级），首次读取时重建。"""
+        table = VEvent.__table__
+        with self._session() as session:
+            sources = set(
+                session.execute(
+                    sa_select(table.c.x_source)
+                    .where(table.c.is_deleted == False)  # noqa: E712
+                    .distinct()
+                ).scalars()
+            )
+            cached = set(session.exec(select(IcsCache.source)).all())
+            missing = sources - cached
+            if missing:
+                self._mark_ics_dirty(session, *missing)
+                session.commit()
+
+    def _rebuild_ics_cache(self, source: str) -> Dict[str, Any]:
+        """重建该来源的 ICS 文本，同时更新进程内副本与 ics_cache 表。"""
+        with self._ics_cache_lock:
+            # 先读版本号再查询事件：期间若有新写入，正文记为旧版本，下次读取会再次重建。
+            version = self._ics_version(source)
+            entry = self._ics_cache.get(source)
+            if entry is not None and entry["data_version"] >= version:
+                # 等锁期间其他线程已重建。
+                return entry
+            events = self.query_events(source=source)
+            body = self._render_ics(events, source=source)
+            content_hash = hashlib.sha256(body.encode("utf-8")).hexdigest()
+            if entry is None or entry["content_hash"] != content_hash:
+                entry = {
+                    "body": body,
+                    "content_hash": content_hash,
+                    "built_at": _now_utc(),
+                    "event_count": len(events),
+                    **_compress_ics(body),
+                }
+            entry = dict(entry, data_version=version)
+            try:
+                with self._session() as session:
+                    row = session.get(IcsCache, source)
+                    if row is not None and (row.data_version or 0) > version:
+                        # 其他进程已按更新的版本重建，不回退表中的正文。
+                        pass
+                    elif row is not None and row.content_hash == content_hash:
+                        # 正文未变：只推进版本号，沿用原 built_at，Last-Modified 不随每次刷新前移。
+                        entry["built_at"] = _as_aware_utc(row.built_at)
+                        row.data_version = version
+                        session.add(row)
+                        session.commit()
+                    else:
+                        session.merge(IcsCache(source=source, **entry))
+                        session.commit()
+            except Exception as exc:
+                # 持久化失败只影响跨进程共享，本进程仍使用内存副本。
+                logger.warning("scheduler ics cache persist failed", extra={"source": source, "error": str(exc)})
+            self._ics_cache[source] = entry
+        return entry
+
+    def get_cached_ics(self, source: str) -> Optional[Dict[str, Any]]:
+        """
+        读取物化的 ICS：{body, content_hash, built_at, event_count, body_gzip, body_br, data_version}
+
+        按主键读取来源的数据版本号：与内存副本一致时直接返回；ics_cache 表中的正文
+        （可能由其他进程重建）已是该版本时加载它；否则在此重建一次。
+        来源从未写入过时返回 None。
+        """
+        version = self._ics_version(source)
+        entry = self._ics_cache.get(source)
+        if entry is not None and entry["data_version"] == version:
+            return entry
+
+        with self._read_session() as session:
+            row = session.get(IcsCache, source)
+        if row is not None and row.data_version is not None and row.data_version >= version:
+            if entry is None or row.content_hash != entry["content_hash"]:
+                entry = {
+                    "body": row.body,
+                    "content_hash": row.content_hash,
+                    "built_at": _as_aware_utc(row.built_at),
+                    "event_count": row.event_count,
+                    "body_gzip": row.body_gzip,
+                    "body_br": row.body_br,
+                }
+                if entry["body_gzip"] is None:
+                    # 压缩列迁移前写入的旧行，补算一次。
+                    entry.update(_compress_ics(row.body))
+            entry = dict(entry, data_version=row.data_version)
+            self._ics_cache[source] = entry
+            return entry
+        if row is None and not version:
+            return None
+        return self._rebuild_ics_cache(source)
+
+    def export_cached_ics(self, source: str) -> Optional[str]:
+        """返回来源的物化 ICS 文本；该来源没有任何事件时返回 None。"""
+        entry = self.get_cached_ics(source)
+        if not entry or not entry["event_count"]:
+            return None
+        return entry["body"]
+
     def export_events(
         self,
         start: Optional[datetime] = None,
@@ -0,0 +1,222 @@
+"""
+CAS 会话代理：一次 CAS 登录，并行换取 TIS / Blackboard 的业务会话，并在刷新之间复用。
+
+每个业务服务使用独立的 requests.Session（独立 cookie jar），只共享同一个 TGC。
+刷新结束后会话归还到池中；下次取用时若刚验证过则直接复用，否则先用一次轻量请求
+（服务的 validate_session）确认未跳回 CAS 登录页，失效时才重新换票 / 登录。
+一次登录周期里为所有空闲来源换好票据，cron 同时刷新 TIS 与 BB 时两边只触发一次 CAS 登录。
+"""
+
+import concurrent.futures
+import threading
+import time
+from typing import Callable, Optional
+
+from casService import CasService
+
+
+class CasSessionBroker:
+    def __init__(
+        self,
+        services: dict,
+        *,
+        token_provider: Callable[[], Optional[str]],
+        token_consumer: Callable[[Optional[str]], None],
+        allow_password_fallback: bool = True,
+        retry_use_qr: bool = False,
+        prepared_ttl: float = 120.0,
+        pool_enabled: bool = True,
+        max_idle: float = 3600.0,
+    ):
+        """
+        Args:
+            services: 来源 -> (服务类, 换票方法名)，如 {"tis": (TisService, "LoginTIS")}
+            token_provider: 返回当前可复用的 TGC
+            token_consumer: 登录成功后回写 TGC
+            allow_password_fallback: 扫码失败时是否允许回退到密码登录
+            retry_use_qr: 复用的 TGC 失效、需要重新登录时是否走扫码
+            prepared_ttl: 会话验证后在该时长（秒）内复用无需再次验证
+            pool_enabled: 刷新结束后是否保留会话供下次复用
+            max_idle: 池中会话闲置超过该时长（秒）直接丢弃重新登录
+        """
+        self.services = services
+        self.token_provider = token_provider
+        self.token_consumer = token_consumer
+        self.allow_password_fallback = allow_password_fallback
+        self.retry_use_qr = retry_use_qr
+        self.prepared_ttl = prepared_ttl
+        self.pool_enabled = pool_enabled
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        # 登录周期发布结果时通知等待中的取用方。
+        self._published = threading.Condition(self._lock)
+        # 来源 -> (服务实例, 最近一次确认有效的时间)
+        self._pool = {}
+        self._checked_out = set()
+        # 正在由某个登录周期换票的空闲来源，结果发布前其他取用方等待而不是重复登录。
+        self._logging_in = set()
+        self._counters = {
+            "checkouts": 0,
+            "pool_hits": 0,
+            "validations": 0,
+            "validation_failures": 0,
+            "reauths": 0,
+            "cas_logins": 0,
+            "exchanges": 0,
+            "exchange_failures": 0,
+        }
+
+    @property
+    def stats(self) -> dict:
+        # 不加锁读取，避免健康检查被进行中的登录阻塞。
+        stats = dict(self._counters)
+        stats["pooled"] = sorted(list(self._pool))
+        checkouts = stats["checkouts"]
+        stats["pool_hit_rate"] = round(stats["pool_hits"] / checkouts, 3) if checkouts else None
+        return stats
+
+    def checkout(self, source: str) -> CasService:
+        """
+        返回已登录目标业务系统的服务实例，调用方独占使用，用完后调用 checkin 归还。
+
+        池中有可用会话时直接复用；否则执行一次登录周期，为该来源及其他空闲来源并行换票。
+        校验与登录周期（CAS 登录 + 并行换票）都在锁外进行，锁只用于占位与发布结果，
+        期间其他来源的取用与归还不受阻塞。
+        """
+        if source not in self.services:
+            raise ValueError(f"unknown source: {source}")
+        with self._lock:
+            self._counters["checkouts"] += 1
+            # 其他线程的登录周期正在为该来源换票时，等待其发布结果后再取池。
+            while source in self._logging_in:
+                self._published.wait()
+            entry = self._pool.pop(source, None)
+            self._checked_out.add(source)
+
+        idle_sources = []
+        try:
+            service = self._validate_pooled(source, entry)
+            if service is not None:
+                with self._lock:
+                    self._counters["pool_hits"] += 1
+                return service
+
+            with self._lock:
+                self._counters["reauths"] += 1
+                idle_sources = [
+                    other
+                    for other in self.services
+                    if other != source
+                    and other not in self._pool
+                    and other not in self._checked_out
+                    and other not in self._logging_in
+                ]
+                self._logging_in.update(idle_sources)
+
+            ready = {}
+            try:
+                ready = self._login_cycle([source] + idle_sources)
+            finally:
+                with self._lock:
+                    now = time.time()
+                    for other in idle_sources:
+                        if other in ready:
+                            self._pool[other] = (ready[other], now)
+                    self._logging_in.difference_update(idle_sources)
+                    self._published.notify_all()
+            if source not in ready:
+                raise ConnectionError(f"{source} service login failed")
+            return ready[source]
+        except BaseException:
+            with self._lock:
+                self._checked_out.discard(source)
+            raise
+
+    def checkin(self, source: str, service: CasService) -> None:
+        """刷新结束后归还会话；刷新失败时传入 None 丢弃会话。"""
+        with self._lock:
+            self._checked_out.discard(source)
+            if service is not None and self.pool_enabled:
+                self._pool[source] = (service, time.time())
+
+    def _validate_pooled(self, source: str, entry: Optional[tuple]) -> Optional[CasService]:
+        """池中会话仍可用时返回它；调用时不持有锁。"""
+        if entry is None:
+            return None
+        service, validated_at = entry
+        idle = time.time() - validated_at
+        if idle <= self.prepared_ttl:
+            return service
+        if idle > self.max_idle:
+            return None
+        validate = getattr(service, "validate_session", None)
+        if validate is None:
+            return None
+        with self._lock:
+            self._counters["validations"] += 1
+        if validate():
+            return service
+        with self._lock:
+            self._counters["validation_failures"] += 1
+        print(f"[broker] pooled {source} session expired, re-authenticating")
+        return None
+
+    def _exchange(self, source: str, tgc: str) -> Optional[CasService]:
+        service_cls, login_method = self.services[source]
+        service = service_cls(tgc_token=tgc)
+        try:
+            ok = getattr(service, login_method)()
+        except Exception as exc:
+            print(f"[broker] {source} ticket exchange error: {exc}")
+            ok = False
+        return service if ok else None
+
+    def _exchange_all(self, tgc: str, sources: list) -> tuple[dict, list]:
+        ready = {}
+        failed = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(sources)) as executor:
+            futures = {executor.submit(self._exchange, source, tgc): source for source in sources}
+            for future in concurrent.futures.as_completed(futures):
+                source = futures[future]
+                service = future.result()
+                with self._lock:
+                    self._counters["exchanges"] += 1
+                    if service is None:
+                        self._counters["exchange_failures"] += 1
+                if service is None:
+                    failed.append(source)
+                else:
+                    ready[source] = service
+        return ready, failed
+
+    def _login_cycle(self, sources: list) -> dict:
+        """CAS 登录一次并为 sources 并行换票，返回换票成功的 来源 -> 服务实例；调用时不持有锁。"""
+        cached_token = self.token_provider()
+        cas = CasService(tgc_token=cached_token)
+        if not cas.Login(use_qr=False, allow_password_fallback=self.allow_password_fallback):
+            raise ConnectionError("CAS Login Failed.")
+        if cas.TGC != cached_token:
+            with self._lock:
+                self._counters["cas_logins"] += 1
+
+        ready, failed = self._exchange_all(cas.TGC, sources)
+        if failed and cas.TGC == cached_token:
+            # 复用的 TGC 可能已过期，完整登录一次后只重试失败的来源。
+            print(f"[broker] cached TGC rejected by {failed}, re-login CAS")
+            cas.TGC = None
+            cas.session.cookies.clear()
+            if not cas.Login(
+                use_qr=self.retry_use_qr,
+                allow_password_fallback=self.allow_password_fallback,
+            ):
+                raise ConnectionError("CAS Login Failed (retry).")
+            with self._lock:
+                self._counters["cas_logins"] += 1
+            retried, failed = self._exchange_all(cas.TGC, failed)
+            ready.update(retried)
+
+        if ready:
+            self.token_consumer(cas.TGC)
+        if failed:
+            print(f"[broker] ticket exchange failed for {failed}")
+        return ready
@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# 测试中不启动扫码登录线程，也不连接真实的租约 / KV 后端。
+os.environ.setdefault("CAS_QR_BOOTSTRAP_ENABLED", "false")
+os.environ.setdefault("REFRESH_LEASE_BACKEND", "none")
+# 导入 app 时创建的全局 scheduler 不写入仓库下的 data/。
+os.environ.setdefault("SCHEDULE_DB_PATH", os.path.join(tempfile.mkdtemp(), "scheduler.db"))
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    from scheduler import Scheduler
+
+    return Scheduler(db_path=str(tmp_path / "scheduler.db"))
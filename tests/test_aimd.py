@@ -0,0 +1,65 @@
+import requests
+
+from tisService import AimdConcurrencyController, TisService, _classify_failure
+
+
+def test_healthy_window_increases_limit_by_one():
+    controller = AimdConcurrencyController(initial_limit=2, max_limit=4)
+
+    controller.on_success(0.1, controller.epoch)
+    assert controller.limit == 2
+    controller.on_success(0.1, controller.epoch)
+    assert controller.limit == 3
+
+
+def test_failures_from_same_epoch_halve_once():
+    controller = AimdConcurrencyController(initial_limit=8, max_limit=8)
+    epoch = controller.epoch
+
+    controller.on_failure("5xx", epoch)
+    controller.on_failure("5xx", epoch)
+    assert controller.limit == 4
+
+    controller.on_failure("timeout", controller.epoch)
+    assert controller.limit == 2
+
+
+def test_slow_response_counts_as_failure():
+    controller = AimdConcurrencyController(initial_limit=4, slow_response_seconds=1.0)
+
+    controller.on_success(2.5, controller.epoch)
+
+    assert controller.limit == 2
+    assert controller.snapshot()["decisions"][-1]["reason"] == "slow"
+
+
+def test_only_congestion_errors_are_classified():
+    response = requests.Response()
+    response.status_code = 503
+    assert _classify_failure(requests.HTTPError(response=response)) == "5xx"
+    response.status_code = 404
+    assert _classify_failure(requests.HTTPError(response=response)) is None
+    assert _classify_failure(requests.ConnectTimeout()) == "timeout"
+    assert _classify_failure(ValueError("bad json")) is None
+
+
+def test_adaptive_fetch_backs_off_on_server_errors(monkeypatch):
+    service = TisService(username="u", password="p", tgc_token="tgc")
+    service.concurrency_controller = AimdConcurrencyController(initial_limit=4, max_limit=4)
+
+    def fake_query(date_str):
+        if date_str.endswith("02"):
+            response = requests.Response()
+            response.status_code = 502
+            raise requests.HTTPError(response=response)
+        return [{"rq": date_str}]
+
+    monkeypatch.setattr(service, "querySchedule", fake_query)
+
+    result, failed = service._fetch_dates(["2026-03-01", "2026-03-02", "2026-03-03"], 4)
+
+    assert failed == ["2026-03-02"]
+    assert result["2026-03-01"] == [{"rq": "2026-03-01"}]
+    assert result["2026-03-02"] == []
+    decisions = service.concurrency_controller.snapshot()["decisions"]
+    assert [(d["action"], d["reason"]) for d in decisions][0] == ("decrease", "5xx")
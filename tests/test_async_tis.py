@@ -0,0 +1,120 @@
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from asyncService import AsyncTisService
+from tisService import AimdConcurrencyController, TisService
+
+
+def _async_service(handler, controller=None):
+    service = TisService(username="u", password="p", tgc_token="tgc")
+    service.concurrency_controller = controller
+    client = AsyncTisService(service, max_concurrency=4)
+    client._client = lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def _date_of(request):
+    return request.content.decode().split("=", 1)[1]
+
+
+def test_non_200_day_is_failed_not_empty():
+    def handler(request):
+        if _date_of(request) == "2026-03-03":
+            return httpx.Response(500)
+        return httpx.Response(200, json=[{"rq": _date_of(request)}])
+
+    controller = AimdConcurrencyController(initial_limit=4, max_limit=4)
+    client = _async_service(handler, controller)
+
+    result, failed = client.fetch_dates_blocking(["2026-03-02", "2026-03-03", "2026-03-04"])
+
+    assert failed == ["2026-03-03"]
+    assert result["2026-03-02"] == [{"rq": "2026-03-02"}]
+    assert result["2026-03-04"] == [{"rq": "2026-03-04"}]
+    decisions = controller.snapshot()["decisions"]
+    assert {"action": "decrease", "reason": "5xx", "from": 4, "to": 2} in [
+        {k: d[k] for k in ("action", "reason", "from", "to")} for d in decisions
+    ]
+
+
+def test_in_flight_requests_follow_controller_limit():
+    import asyncio
+
+    state = {"current": 0, "peak": 0}
+
+    async def handler(request):
+        state["current"] += 1
+        state["peak"] = max(state["peak"], state["current"])
+        await asyncio.sleep(0.01)
+        state["current"] -= 1
+        return httpx.Response(200, json=[])
+
+    controller = AimdConcurrencyController(initial_limit=2, max_limit=2)
+    client = _async_service(handler, controller)
+
+    dates = [f"2026-03-{day:02d}" for day in range(1, 11)]
+    result, failed = client.fetch_dates_blocking(dates)
+
+    assert failed == []
+    assert sorted(result) == dates
+    assert state["peak"] == 2
+
+
+def _async_bb(monkeypatch, handler):
+    import bbService as bb_module
+    from asyncService import AsyncBbService
+    from circuit_breaker import CircuitBreaker
+
+    monkeypatch.setattr(bb_module, "BB_CIRCUIT", CircuitBreaker("bb-test", min_calls=2))
+    monkeypatch.setattr(bb_module, "BB_MIN_WINDOW_DAYS", 7)
+    service = bb_module.bbService(username="u", password="p", tgc_token="tgc")
+    monkeypatch.setattr(service, "_warmup_calendar_context", lambda headers: None)
+    client = AsyncBbService(service, max_concurrency=4)
+    client._client = lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client.attach()
+    return service
+
+
+def test_bb_windows_split_on_the_shared_loop(monkeypatch):
+    import asyncio
+    import datetime
+
+    from asyncService import shared_loop
+
+    loops = set()
+
+    async def handler(request):
+        loops.add(asyncio.get_running_loop())
+        days = (int(request.url.params["end"]) - int(request.url.params["start"])) / 86400000
+        if days > 7:
+            return httpx.Response(500)
+        return httpx.Response(200, json=[{"id": request.url.params["start"]}])
+
+    service = _async_bb(monkeypatch, handler)
+    start = datetime.datetime(2026, 3, 2, tzinfo=datetime.timezone(datetime.timedelta(hours=8)))
+
+    payloads, failed, best_days = service._fetch_windows_adaptive(
+        {}, [(start, start + datetime.timedelta(days=28))]
+    )
+
+    assert failed == []
+    assert len(payloads) == 4
+    assert best_days == 7
+    assert loops == {shared_loop()}
+
+
+def test_tis_days_run_on_the_same_shared_loop():
+    import asyncio
+
+    from asyncService import shared_loop
+
+    loops = set()
+
+    async def handler(request):
+        loops.add(asyncio.get_running_loop())
+        return httpx.Response(200, json=[])
+
+    _async_service(handler).fetch_dates_blocking(["2026-03-02"])
+
+    assert loops == {shared_loop()}
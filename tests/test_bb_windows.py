@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+
+from scheduler import EventSource
+
+WEEK1 = (datetime(2026, 3, 2, tzinfo=timezone.utc), datetime(2026, 3, 9, tzinfo=timezone.utc))
+WEEK2 = (datetime(2026, 3, 9, tzinfo=timezone.utc), datetime(2026, 3, 16, tzinfo=timezone.utc))
+
+
+def _bb(item_id, title, day):
+    return {
+        "itemSourceId": item_id,
+        "title": title,
+        "startDate": f"2026-03-{day:02d}T01:00:00.000Z",
+        "endDate": f"2026-03-{day:02d}T02:00:00.000Z",
+        "eventType": "Assignment",
+    }
+
+
+def _window(scheduler, key, window, raw):
+    return scheduler.replace_bb_window_events(raw, key=key, window_start=window[0], window_end=window[1])
+
+
+def _rows(scheduler):
+    return scheduler.query_events(source=EventSource.BB.value)
+
+
+def test_event_moved_into_another_window_keeps_uid(scheduler):
+    _window(scheduler, "w1", WEEK1, [_bb("a", "作业 1", 3), _bb("b", "作业 2", 4)])
+    before = {e.x_source_id: e for e in _rows(scheduler)}
+
+    # 截止时间从第一周推迟到第二周，只刷新了第二周的窗口。
+    _window(scheduler, "w2", WEEK2, [_bb("a", "作业 1", 10)])
+    after = _rows(scheduler)
+
+    assert sorted(e.x_source_id for e in after) == ["a", "b"]
+    moved = next(e for e in after if e.x_source_id == "a")
+    assert moved.uid == before["a"].uid
+    assert moved.sequence == before["a"].sequence + 1
+
+
+def test_window_refresh_removes_only_unmatched_rows_inside_window(scheduler):
+    _window(scheduler, "w1", WEEK1, [_bb("a", "作业 1", 3)])
+    _window(scheduler, "w2", WEEK2, [_bb("b", "作业 2", 10), _bb("c", "作业 3", 11)])
+
+    _window(scheduler, "w2", WEEK2, [_bb("b", "作业 2", 10)])
+
+    assert sorted(e.x_source_id for e in _rows(scheduler)) == ["a", "b"]
+
+
+def test_no_due_window_falls_back_to_building_ics(scheduler, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "SCHEDULER", scheduler)
+    monkeypatch.setattr(app_module, "STORAGE_MODE", "db")
+    monkeypatch.setattr(app_module, "_bb_tiers_active", lambda: True)
+    monkeypatch.setattr(app_module, "_due_bb_windows", lambda now: [])
+    assert scheduler.export_cached_ics(EventSource.BB.value) is None
+
+    body = app_module.fetch_and_cache_bb_schedule()
+
+    assert body.startswith("BEGIN:VCALENDAR")
+
+
+class _PartialService:
+    """第二周的分段查询失败，只返回第一周的事件。"""
+
+    def queryCalendar(self, start, end, *, report_failures=False):
+        return [_bb("a", "作业 1", 3)], ["2026-03-09 -> 2026-03-16"]
+
+
+def test_failed_chunk_keeps_stored_events_and_window_stays_due(scheduler, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "SCHEDULER", scheduler)
+    _window(scheduler, "bb:0-14d", (WEEK1[0], WEEK2[1]), [_bb("a", "作业 1", 3), _bb("b", "作业 2", 10)])
+    synced_at = scheduler.get_sync_markers(EventSource.BB.value)["bb:0-14d"]["synced_at"]
+    window = {
+        "key": "bb:0-14d",
+        "query_start": WEEK1[0],
+        "query_end": WEEK2[1],
+        "db_start": WEEK1[0],
+        "db_end": WEEK2[1],
+    }
+
+    events, failed = app_module._fetch_bb_tiers(_PartialService(), [window])
+
+    assert failed == ["bb:0-14d"]
+    assert len(events) == 1
+    assert sorted(e.x_source_id for e in _rows(scheduler)) == ["a", "b"]
+    assert scheduler.get_sync_markers(EventSource.BB.value)["bb:0-14d"]["synced_at"] == synced_at
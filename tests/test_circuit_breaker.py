@@ -0,0 +1,111 @@
+import datetime
+import json
+
+import pytest
+import requests
+
+import bbService as bb_module
+from bbService import bbService
+from circuit_breaker import STATE_CLOSED, STATE_OPEN, CircuitBreaker
+
+CST = datetime.timezone(datetime.timedelta(hours=8))
+START = datetime.datetime(2026, 3, 2, tzinfo=CST)
+
+
+def _response(status, payload=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(payload).encode() if payload is not None else b"error"
+    response.headers["Content-Type"] = "application/json"
+    return response
+
+
+@pytest.fixture
+def service(monkeypatch, tmp_path):
+    # 500 时会把响应正文写入工作目录下的 bb_calendar_error.html。
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bb_module, "BB_MIN_WINDOW_DAYS", 7)
+    monkeypatch.setattr(bb_module, "BB_CHUNK_PARALLELISM", 1)
+    monkeypatch.setattr(bb_module, "_REJECTED_BACKOFF_SECONDS", 0)
+    svc = bbService(username="u", password="p", tgc_token="tgc")
+    monkeypatch.setattr(svc, "_warmup_calendar_context", lambda headers: None)
+    return svc
+
+
+def _serve(monkeypatch, service, handler):
+    def fake_get(url, headers=None, params=None, timeout=None):
+        days = (params["end"] - params["start"]) / 86400000
+        return handler(params["start"], days)
+
+    monkeypatch.setattr(service.session, "get", fake_get)
+
+
+def _use_breaker(monkeypatch, **kwargs):
+    breaker = CircuitBreaker("bb-test", **kwargs)
+    monkeypatch.setattr(bb_module, "BB_CIRCUIT", breaker)
+    return breaker
+
+
+def test_split_triggering_500s_do_not_open_the_breaker(monkeypatch, service):
+    breaker = _use_breaker(monkeypatch, min_calls=2, failure_rate=0.5)
+    _serve(monkeypatch, service, lambda start, days: _response(500) if days > 7 else _response(200, [{"id": start}]))
+
+    payloads, failed, best_days = service._fetch_windows_adaptive(
+        {}, [(START, START + datetime.timedelta(days=28))]
+    )
+
+    assert failed == []
+    assert len(payloads) == 4
+    assert best_days == 7
+    assert breaker.stats["state"] == STATE_CLOSED
+    assert breaker.stats["window_calls"] == 4
+
+
+def test_open_breaker_keeps_windows_already_fetched(monkeypatch, service):
+    breaker = _use_breaker(monkeypatch, min_calls=1, failure_rate=0.5)
+    first = int(START.timestamp() * 1000)
+    _serve(
+        monkeypatch,
+        service,
+        lambda start, days: _response(200, [{"id": start}]) if start == first else _response(500),
+    )
+    windows = [
+        (START + datetime.timedelta(days=7 * i), START + datetime.timedelta(days=7 * (i + 1)))
+        for i in range(3)
+    ]
+
+    payloads, failed, _best = service._fetch_windows_adaptive({}, windows)
+
+    assert payloads == [[{"id": first}]]
+    assert len(failed) == 2
+    assert breaker.stats["state"] == STATE_OPEN
+
+
+def test_uncounted_failure_releases_half_open_probe():
+    breaker = CircuitBreaker("probe", min_calls=1, open_seconds=0)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_failure(count=False)
+
+    assert breaker.allow_request()
+
+
+def test_query_calendar_reports_failed_chunks(monkeypatch, service):
+    _use_breaker(monkeypatch, min_calls=100)
+    first = int(START.timestamp() * 1000)
+    _serve(
+        monkeypatch,
+        service,
+        lambda start, days: _response(200, [{"id": "_1_1"}])
+        if start == first and days <= 7
+        else _response(500),
+    )
+
+    events, failed = service.queryCalendar(
+        START, START + datetime.timedelta(days=14), report_failures=True
+    )
+
+    assert events == [{"id": "_1_1"}]
+    assert len(failed) == 1
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+
+class _PendingTicket:
+    def wait(self, timeout=None):
+        return None
+
+    def describe(self):
+        return {"state": "running"}
+
+
+class _StuckQueue:
+    def submit(self, source, trigger, priority):
+        return _PendingTicket()
+
+
+def test_source_past_its_deadline_is_reported_as_exceeded(monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "CRON_SECRET", "s")
+    monkeypatch.setattr(app_module, "REFRESH_QUEUE", _StuckQueue())
+    monkeypatch.setattr(app_module, "CRON_SOURCE_DEADLINES", {"tis": 1.0, "bb": 1.0})
+
+    response = app_module.app.test_client().get(
+        "/api/cron/fetch?source=all", headers={"Authorization": "Bearer s"}
+    )
+
+    body = response.get_json()
+    assert body["ok"] is False
+    assert {step["status"] for step in body["steps"].values()} == {"deadline_exceeded"}
+
+
+def test_single_worker_setting_is_raised_to_one_worker_per_source(tmp_path):
+    from conftest import ROOT
+
+    env = dict(os.environ, REFRESH_QUEUE_WORKERS="1", SCHEDULE_DB_PATH=str(tmp_path / "scheduler.db"))
+    result = subprocess.run(
+        [sys.executable, "-c", "import app; print(app.REFRESH_QUEUE.workers)"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip().splitlines()[-1] == "2"
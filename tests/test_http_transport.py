@@ -0,0 +1,27 @@
+from bbService import BB_CHUNK_PARALLELISM, bbService
+from http_transport import DEFAULT_POOL_MAXSIZE, create_session, session_pool_maxsize
+from tisService import TIS_POOL_MAXSIZE, TisService
+
+
+def test_service_sessions_are_sized_at_creation():
+    tis = TisService(username="u", password="p", tgc_token="tgc")
+    bb = bbService(username="u", password="p", tgc_token="tgc")
+
+    assert session_pool_maxsize(tis.session) == TIS_POOL_MAXSIZE
+    assert session_pool_maxsize(bb.session) >= max(BB_CHUNK_PARALLELISM, 3)
+
+
+def test_fetch_does_not_replace_the_live_pool_manager():
+    service = TisService(username="u", password="p", tgc_token="tgc")
+    adapter = service.session.get_adapter("https://")
+    pool_manager = adapter.poolmanager
+    service.day_fetcher = lambda dates: ({day: [] for day in dates}, [])
+
+    service.queryScheduleInterval("2026-03-02", "2026-03-03", max_workers=TIS_POOL_MAXSIZE * 2)
+
+    assert service.session.get_adapter("https://") is adapter
+    assert adapter.poolmanager is pool_manager
+
+
+def test_default_session_uses_configured_pool_size():
+    assert session_pool_maxsize(create_session()) == DEFAULT_POOL_MAXSIZE
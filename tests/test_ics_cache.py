@@ -0,0 +1,86 @@
+from scheduler import EventSource, Scheduler
+
+
+def _bb(item_id, title):
+    return {
+        "itemSourceId": item_id,
+        "title": title,
+        "startDate": "2026-03-02T01:00:00.000Z",
+        "endDate": "2026-03-02T02:00:00.000Z",
+        "eventType": "Assignment",
+    }
+
+
+def test_cache_hit_only_reads_the_version(scheduler, monkeypatch):
+    scheduler.replace_bb_raw_events([_bb("a", "作业 1"), _bb("b", "作业 2")])
+    entry = scheduler.get_cached_ics(EventSource.BB.value)
+    assert entry["event_count"] == 2
+
+    def _no_db(*_args, **_kwargs):
+        raise AssertionError("cache hit must not load events or the cached body")
+
+    monkeypatch.setattr(scheduler, "_read_session", _no_db)
+    monkeypatch.setattr(scheduler, "_session", _no_db)
+    monkeypatch.setattr(scheduler, "query_events", _no_db)
+    assert scheduler.get_cached_ics(EventSource.BB.value) is entry
+
+
+def test_writes_only_mark_dirty_and_read_rebuilds_once(scheduler, monkeypatch):
+    renders = []
+    render = scheduler._render_ics
+    monkeypatch.setattr(
+        scheduler, "_render_ics", lambda events, **kwargs: renders.append(1) or render(events, **kwargs)
+    )
+    for index in range(5):
+        scheduler.merge_bb_raw_events([_bb(f"item-{index}", f"作业 {index}")])
+    assert renders == []
+
+    entry = scheduler.get_cached_ics(EventSource.BB.value)
+    assert entry["event_count"] == 5
+    assert scheduler.get_cached_ics(EventSource.BB.value) is entry
+    assert len(renders) == 1
+
+
+def test_same_size_write_is_not_served_stale(tmp_path):
+    # 标题长度相同的写入：数据库文件大小可能不变，版本号仍保证读到新正文。
+    db_path = str(tmp_path / "scheduler.db")
+    reader = Scheduler(db_path=db_path)
+    writer = Scheduler(db_path=db_path)
+    writer.replace_bb_raw_events([_bb("a", "作业 1")])
+    assert "作业 1" in reader.get_cached_ics(EventSource.BB.value)["body"]
+
+    writer.replace_bb_raw_events([_bb("a", "作业 2")])
+    assert "作业 2" in reader.get_cached_ics(EventSource.BB.value)["body"]
+
+
+def test_rebuild_by_another_process_is_reloaded(tmp_path):
+    db_path = str(tmp_path / "scheduler.db")
+    reader = Scheduler(db_path=db_path)
+    writer = Scheduler(db_path=db_path)
+    writer.replace_bb_raw_events([_bb("a", "作业 1")])
+    first = reader.get_cached_ics(EventSource.BB.value)
+
+    writer.replace_bb_raw_events([_bb("a", "作业 1"), _bb("b", "作业 2")])
+    second = reader.get_cached_ics(EventSource.BB.value)
+
+    assert first["event_count"] == 1
+    assert second["event_count"] == 2
+    assert second["content_hash"] != first["content_hash"]
+
+
+def test_never_written_source_is_not_rebuilt_on_read(scheduler, monkeypatch):
+    monkeypatch.setattr(
+        scheduler, "_rebuild_ics_cache", lambda source: (_ for _ in ()).throw(AssertionError(source))
+    )
+    assert scheduler.get_cached_ics(EventSource.TIS.value) is None
+
+
+def test_existing_events_are_materialized_at_startup(tmp_path):
+    db_path = str(tmp_path / "scheduler.db")
+    first = Scheduler(db_path=db_path)
+    first.replace_bb_raw_events([_bb("a", "作业 1")])
+    with first.engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM ics_cache")
+
+    restarted = Scheduler(db_path=db_path)
+    assert restarted.get_cached_ics(EventSource.BB.value)["event_count"] == 1
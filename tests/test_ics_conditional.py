@@ -0,0 +1,52 @@
+import pytest
+
+
+def _bb(item_id, title):
+    return {
+        "itemSourceId": item_id,
+        "title": title,
+        "startDate": "2026-03-02T01:00:00.000Z",
+        "endDate": "2026-03-02T02:00:00.000Z",
+        "eventType": "Assignment",
+    }
+
+
+@pytest.fixture
+def client(scheduler, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "SCHEDULER", scheduler)
+    monkeypatch.setattr(app_module, "STORAGE_MODE", "db")
+    monkeypatch.setattr(app_module, "ICAL_TOKEN", "secret")
+    monkeypatch.setattr(app_module, "_trigger_async_refresh", lambda *_args, **_kwargs: None)
+    return app_module.app.test_client()
+
+
+def test_revalidation_returns_304_without_body(scheduler, client):
+    scheduler.replace_bb_raw_events([_bb("a", "作业 1")])
+    first = client.get("/bb/schedule.ics?token=secret")
+    assert first.status_code == 200
+
+    second = client.get(
+        "/bb/schedule.ics?token=secret",
+        headers={"If-None-Match": first.headers["ETag"]},
+    )
+    assert second.status_code == 304
+    assert second.data == b""
+
+
+def test_last_modified_moves_only_when_body_changes(scheduler, client):
+    scheduler.replace_bb_raw_events([_bb("a", "作业 1")])
+    first = client.get("/bb/schedule.ics?token=secret")
+    built_at = scheduler.get_cached_ics("bb")["built_at"]
+
+    scheduler.replace_bb_raw_events([_bb("a", "作业 1")])
+    unchanged = client.get("/bb/schedule.ics?token=secret")
+    assert unchanged.headers["Last-Modified"] == first.headers["Last-Modified"]
+    assert unchanged.headers["ETag"] == first.headers["ETag"]
+    assert scheduler.get_cached_ics("bb")["built_at"] == built_at
+
+    scheduler.replace_bb_raw_events([_bb("a", "作业 1"), _bb("b", "作业 2")])
+    changed = client.get("/bb/schedule.ics?token=secret")
+    assert changed.headers["ETag"] != first.headers["ETag"]
+    assert scheduler.get_cached_ics("bb")["built_at"] > built_at
@@ -0,0 +1,71 @@
+import json
+from datetime import datetime, timezone
+
+from scheduler import EventParser, EventSource
+
+FEED = [
+    "BEGIN:VCALENDAR",
+    "BEGIN:VEVENT",
+    "UID:_blackboard.platform.gradebook2.GradableItem-_98765_1@bb.sustech.edu.cn",
+    'DTSTART;TZID="GMT+08:00":20260302T090000',
+    "DTEND;VALUE=DATE-TIME:20260302T020000Z",
+    "SUMMARY:作业 1",
+    "CATEGORIES:Assignment",
+    "CATEGORIES:CS101",
+    "DESCRIPTION:第一段",
+    "",
+    " 接续",
+    "BEGIN:VALARM",
+    "TRIGGER:-PT15M",
+    "END:VALARM",
+    "END:VEVENT",
+    "END:VCALENDAR",
+]
+
+
+def _parse(lines):
+    return list(EventParser.iter_ics_events(lines, source=EventSource.BB.value))
+
+
+def test_quoted_param_with_colon_keeps_value():
+    name, params, value = EventParser._split_ics_line('DTSTART;TZID="GMT+08:00":20260302T090000')
+
+    assert name == "DTSTART"
+    assert params == {"TZID": "GMT+08:00"}
+    assert value == "20260302T090000"
+
+
+def test_feed_event_is_parsed_with_duplicates_and_folding():
+    (event,) = _parse(FEED)
+
+    assert event.dtstart == datetime(2026, 3, 2, 1, 0, tzinfo=timezone.utc)
+    assert event.description == "第一段接续"
+    assert event.categories == "Assignment,CS101"
+    assert json.loads(event.x_raw_data)["CATEGORIES"] == ["Assignment", "CS101"]
+
+
+def test_empty_line_does_not_swallow_continuation():
+    lines = list(EventParser._unfold_ics_lines(["SUMMARY:作业", "", " 一"]))
+
+    assert lines == ["SUMMARY:作业一"]
+
+
+def test_feed_and_api_rows_share_source_id(scheduler):
+    scheduler.replace_bb_raw_events(
+        [
+            {
+                "id": "_blackboard.platform.gradebook2.GradableItem-_98765_1",
+                "title": "作业 1",
+                "startDate": "2026-03-02T01:00:00.000Z",
+                "endDate": "2026-03-02T02:00:00.000Z",
+                "eventType": "Assignment",
+            }
+        ]
+    )
+    (before,) = scheduler.query_events(source=EventSource.BB.value)
+
+    scheduler.replace_bb_feed_events(FEED)
+    after = scheduler.query_events(source=EventSource.BB.value)
+
+    assert [e.uid for e in after] == [before.uid]
+    assert after[0].x_source_id == "_98765_1"
@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+import pytest
+
+from refresh_lease import LeaseLostError, RefreshLeaseManager, SchedulerLeaseBackend
+from scheduler import EventSource, SourceLease, _now_utc
+
+
+def _bb(item_id):
+    return {
+        "itemSourceId": item_id,
+        "title": f"作业 {item_id}",
+        "startDate": "2026-03-02T01:00:00.000Z",
+        "endDate": "2026-03-02T02:00:00.000Z",
+    }
+
+
+def _expire(scheduler, source):
+    with scheduler._session() as session:
+        row = session.get(SourceLease, source)
+        row.expires_at = _now_utc() - timedelta(seconds=1)
+        session.add(row)
+        session.commit()
+
+
+def test_failed_acquire_does_not_consume_a_token(scheduler):
+    assert scheduler.acquire_refresh_lease("bb", "a", 60) == 1
+    assert scheduler.acquire_refresh_lease("bb", "b", 60) is None
+    assert scheduler.release_refresh_lease("bb", "a", 1)
+    assert scheduler.acquire_refresh_lease("bb", "b", 60) == 2
+
+
+def test_write_with_current_token_commits(scheduler):
+    token = scheduler.acquire_refresh_lease("bb", "a", 60)
+    with scheduler.write_fence("bb", "a", token):
+        scheduler.replace_bb_raw_events([_bb("1")])
+    assert len(scheduler.query_events(source=EventSource.BB.value)) == 1
+
+
+def test_stale_holder_write_is_rolled_back(scheduler):
+    stale = scheduler.acquire_refresh_lease("bb", "a", 60)
+    _expire(scheduler, "bb")
+    assert scheduler.acquire_refresh_lease("bb", "b", 60) == stale + 1
+
+    with scheduler.write_fence("bb", "a", stale):
+        with pytest.raises(LeaseLostError):
+            scheduler.replace_bb_raw_events([_bb("1")])
+    assert scheduler.query_events(source=EventSource.BB.value) == []
+    # 版本号与事件在同一事务内回滚，物化 ICS 不会被标记为过期。
+    assert scheduler._ics_version(EventSource.BB.value) == 0
+
+
+def test_lease_write_fence_uses_scheduler_backend(scheduler):
+    manager = RefreshLeaseManager(SchedulerLeaseBackend(scheduler), ttl_seconds=60, owner="a")
+    lease, holder = manager.acquire("tis")
+    assert holder is None
+    try:
+        with lease.write_fence():
+            assert scheduler._write_fence.value == ("tis", "a", lease.token)
+        assert scheduler._write_fence.value is None
+    finally:
+        lease.release()
+
+
+class _FakeKv:
+    """只实现 KvLeaseBackend 写入栅栏用不到网络的部分。"""
+
+
+def test_kv_lease_fences_scheduler_writes_by_token(scheduler):
+    from refresh_lease import KvLeaseBackend
+
+    backend = KvLeaseBackend(_FakeKv(), scheduler=scheduler)
+
+    with backend.write_fence("bb", "new", 5):
+        scheduler.replace_bb_raw_events([_bb("1")])
+
+    # token 更小的旧持有者在检查租约之后才写入，被事务内的栅栏拒绝。
+    with backend.write_fence("bb", "old", 4):
+        with pytest.raises(LeaseLostError):
+            scheduler.replace_bb_raw_events([_bb("2")])
+
+    assert [e.x_source_id for e in scheduler.query_events(source=EventSource.BB.value)] == ["1"]
+
+    with backend.write_fence("bb", "new", 5):
+        scheduler.replace_bb_raw_events([_bb("3")])
+    assert [e.x_source_id for e in scheduler.query_events(source=EventSource.BB.value)] == ["3"]
+
+
+def test_kv_lease_without_scheduler_has_no_fence():
+    from refresh_lease import KvLeaseBackend
+
+    with KvLeaseBackend(_FakeKv()).write_fence("bb", "a", 1):
+        pass
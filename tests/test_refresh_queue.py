@@ -0,0 +1,83 @@
+import threading
+
+from refresh_queue import PRIORITY_BACKGROUND, PRIORITY_CRON, PRIORITY_MANUAL, RefreshQueue
+
+
+class _BlockingHandler:
+    """第一次调用阻塞到 release()，记录每次调用的 (source, trigger)。"""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def __call__(self, source, trigger):
+        self.calls.append((source, trigger))
+        self.started.set()
+        self.gate.wait(5)
+        return {"ok": True, "source": source, "status": "success"}
+
+
+def test_pending_triggers_are_coalesced():
+    handler = _BlockingHandler()
+    queue = RefreshQueue(handler, workers=1)
+    blocker = queue.submit("bb", "cron:1", PRIORITY_CRON)
+    assert handler.started.wait(5)
+
+    first = queue.submit("tis", "ics:a", PRIORITY_BACKGROUND)
+    second = queue.submit("tis", "ics:b", PRIORITY_BACKGROUND)
+    assert first is second
+    assert second.coalesced == 1
+
+    handler.gate.set()
+    assert blocker.wait(5)["ok"]
+    assert second.wait(5)["queue"]["triggers"] == ["ics:a", "ics:b"]
+
+
+def test_trigger_during_refresh_runs_a_followup():
+    handler = _BlockingHandler()
+    queue = RefreshQueue(handler, workers=2)
+    running = queue.submit("tis", "cron:1", PRIORITY_CRON)
+    assert handler.started.wait(5)
+
+    followup = queue.submit("tis", "ics:late", PRIORITY_BACKGROUND)
+    assert followup is not running
+    assert running.dirty
+    assert followup.state == "pending"
+
+    handler.gate.set()
+    assert running.wait(5)["ok"]
+    assert followup.wait(5)["ok"]
+    assert handler.calls == [("tis", "cron:1"), ("tis", "ics:late")]
+    assert queue.stats()["followups"] == 1
+
+
+def test_manual_trigger_jumps_ahead_of_queued_work():
+    handler = _BlockingHandler()
+    queue = RefreshQueue(handler, workers=1)
+    queue.submit("warmup", "cron:0", PRIORITY_CRON)
+    assert handler.started.wait(5)
+
+    background = queue.submit("bb", "ics:hit", PRIORITY_BACKGROUND)
+    manual = queue.submit("tis", "manual:1", PRIORITY_MANUAL)
+
+    handler.gate.set()
+    assert background.wait(5) and manual.wait(5)
+    assert [source for source, _ in handler.calls] == ["warmup", "tis", "bb"]
+
+
+def test_background_cooldown_never_drops_manual_triggers():
+    handler = _BlockingHandler()
+    handler.gate.set()
+    queue = RefreshQueue(handler, workers=1, background_min_interval=60)
+
+    assert queue.submit("tis", "ics:a", PRIORITY_BACKGROUND).wait(5)["status"] == "success"
+
+    throttled = queue.submit("tis", "ics:b", PRIORITY_BACKGROUND)
+    assert throttled.state == "throttled"
+    assert throttled.wait(0)["status"] == "skipped"
+
+    manual = queue.submit("tis", "manual:c", PRIORITY_MANUAL)
+    assert manual.wait(5)["status"] == "success"
+    assert [trigger for _source, trigger in handler.calls] == ["ics:a", "manual:c"]
+    assert queue.stats()["throttled"] == 1
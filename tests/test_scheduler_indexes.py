@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from scheduler import EventSource
+
+RANGE = {"start": datetime(2026, 3, 1), "end": datetime(2026, 4, 1)}
+
+
+def test_source_filtered_query_uses_source_index(scheduler):
+    plan = " ".join(scheduler.explain_query_events(source=EventSource.TIS.value, **RANGE))
+    assert "ix_vevent_source_deleted_dtstart" in plan
+
+
+def test_unfiltered_query_uses_deleted_dtstart_index(scheduler):
+    plan = " ".join(scheduler.explain_query_events(**RANGE))
+    assert "ix_vevent_deleted_dtstart" in plan
+    assert "ix_vevent_source_deleted_dtstart" not in plan
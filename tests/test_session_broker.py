@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+from session_broker import CasSessionBroker
+
+
+class _FakeService:
+    broker = None
+    valid = True
+
+    def __init__(self, tgc_token=None):
+        self.TGC = tgc_token
+
+    def LoginFake(self):
+        return True
+
+    def validate_session(self):
+        # 校验发生在锁外，其他来源的取用 / 归还不会被这次网络请求阻塞。
+        assert not self.broker._lock.locked()
+        return self.valid
+
+
+def _broker(**kwargs):
+    broker = CasSessionBroker(
+        {"tis": (_FakeService, "LoginFake")},
+        token_provider=lambda: "TGC",
+        token_consumer=lambda token: None,
+        **kwargs,
+    )
+    _FakeService.broker = broker
+    return broker
+
+
+def test_stale_pooled_session_is_validated_outside_the_lock():
+    broker = _broker(prepared_ttl=0)
+    service = _FakeService("TGC")
+    broker._pool["tis"] = (service, time.time() - 10)
+
+    assert broker.checkout("tis") is service
+    assert broker.stats["validations"] == 1
+    assert broker.stats["pool_hits"] == 1
+
+
+def test_failed_login_releases_the_checkout(monkeypatch):
+    broker = _broker()
+
+    def _fail(sources):
+        raise ConnectionError("CAS Login Failed.")
+
+    monkeypatch.setattr(broker, "_login_cycle", _fail)
+    with pytest.raises(ConnectionError):
+        broker.checkout("tis")
+    assert broker._checked_out == set()
+
+
+def test_login_cycle_runs_outside_the_lock_and_publishes_idle_sources():
+    broker = CasSessionBroker(
+        {"tis": (_FakeService, "LoginFake"), "bb": (_FakeService, "LoginFake")},
+        token_provider=lambda: "TGC",
+        token_consumer=lambda token: None,
+    )
+    seen = {}
+
+    def _login_cycle(sources):
+        seen["locked"] = broker._lock.locked()
+        seen["reserved"] = set(broker._logging_in)
+        # 登录进行中，其他来源仍可归还会话。
+        broker.checkin("other", None)
+        return {name: _FakeService("TGC") for name in sources}
+
+    broker._login_cycle = _login_cycle
+
+    service = broker.checkout("tis")
+
+    assert seen == {"locked": False, "reserved": {"bb"}}
+    assert broker._logging_in == set()
+    assert broker.checkout("bb") is not service
+    assert broker.stats["pool_hits"] == 1
+
+
+def test_checkout_waits_for_in_flight_login_of_its_source():
+    import threading
+
+    broker = CasSessionBroker(
+        {"tis": (_FakeService, "LoginFake"), "bb": (_FakeService, "LoginFake")},
+        token_provider=lambda: "TGC",
+        token_consumer=lambda token: None,
+    )
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def _login_cycle(sources):
+        calls.append(list(sources))
+        started.set()
+        release.wait(5)
+        return {name: _FakeService("TGC") for name in sources}
+
+    broker._login_cycle = _login_cycle
+    worker = threading.Thread(target=broker.checkout, args=("tis",))
+    worker.start()
+    started.wait(5)
+
+    result = {}
+    waiter = threading.Thread(target=lambda: result.setdefault("bb", broker.checkout("bb")))
+    waiter.start()
+    time.sleep(0.05)
+    assert "bb" not in result
+    release.set()
+    worker.join(5)
+    waiter.join(5)
+
+    assert calls == [["tis", "bb"]]
+    assert isinstance(result["bb"], _FakeService)
@@ -0,0 +1,18 @@
+import pytest
+
+from scheduler import get_engine, sqlite_profile
+
+
+def test_invalid_env_values_fall_back_to_defaults(monkeypatch):
+    monkeypatch.setenv("SCHEDULER_SQLITE_JOURNAL_MODE", "wal; DROP TABLE vevent")
+    monkeypatch.setenv("SCHEDULER_SQLITE_SYNCHRONOUS", "full")
+
+    profile = sqlite_profile()
+
+    assert profile["journal_mode"] == "WAL"
+    assert profile["synchronous"] == "FULL"
+
+
+def test_engine_rejects_pragma_values_outside_allow_list(tmp_path):
+    with pytest.raises(ValueError):
+        get_engine(str(tmp_path / "x.db"), profile=sqlite_profile(synchronous="NORMAL; VACUUM"))
@@ -0,0 +1,30 @@
+from scheduler import EventSource
+
+
+def _schedule():
+    return {
+        "2026-03-02": [{"kssj": "08:00", "jssj": "09:50", "kcmc": "数据结构", "cdmc": "一教101"}],
+        "2026-03-03": [{"kssj": "10:20", "jssj": "12:10", "kcmc": "线性代数", "cdmc": "一教102"}],
+    }
+
+
+def _tis_events(scheduler):
+    return scheduler.query_events(source=EventSource.TIS.value)
+
+
+def test_unchanged_days_are_skipped(scheduler):
+    assert scheduler.replace_tis_raw_schedule(_schedule()) == 2
+
+    assert scheduler.replace_tis_raw_schedule(_schedule()) == 0
+    assert scheduler.last_sync_report["unchanged_dates"] == 2
+    assert len(_tis_events(scheduler)) == 2
+
+
+def test_day_deleted_out_of_band_is_rewritten(scheduler):
+    scheduler.replace_tis_raw_schedule(_schedule())
+    deleted = next(e for e in _tis_events(scheduler) if e.summary.startswith("线性代数"))
+    assert scheduler.delete_event(deleted.uid, hard=True)
+
+    assert scheduler.replace_tis_raw_schedule(_schedule()) == 1
+    assert scheduler.last_sync_report["changed_dates"] == 1
+    assert len(_tis_events(scheduler)) == 2
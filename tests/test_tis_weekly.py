@@ -0,0 +1,87 @@
+from scheduler import EventParser
+from tisService import _day_signature, _project_day
+
+
+def _item(day: str, week: int, record_id: str) -> dict:
+    return {
+        "id": record_id,
+        "rcrq": day,
+        "kssj": "08:00",
+        "jssj": "09:50",
+        "kcmc": "数据结构",
+        "zc": week,
+        "bt": f"{day.replace('-', '')} 数据结构",
+        "note": f"{int(day[5:7])}月{int(day[8:])}日上课",
+    }
+
+
+def test_signature_ignores_dates_week_numbers_and_ids():
+    week_a = [_item("2026-03-02", 2, "r1")]
+    week_b = [_item("2026-03-09", 3, "r2")]
+    assert _day_signature(week_a, "2026-03-02") == _day_signature(week_b, "2026-03-09")
+
+
+def test_week_text_in_free_text_keeps_weeks_apart():
+    # 自由文本里的周次无法安全平移，签名保持不同，使该周回退逐日抓取。
+    week_a = [dict(_item("2026-03-02", 2, "r1"), bt="第2周")]
+    week_b = [dict(_item("2026-03-09", 3, "r2"), bt="第3周")]
+    assert _day_signature(week_a, "2026-03-02") != _day_signature(week_b, "2026-03-09")
+
+
+def test_project_day_rewrites_every_date_form_and_shifts_week():
+    projected = _project_day([_item("2026-03-02", 2, "r1")], "2026-03-02", "2026-03-16")
+    assert projected == [
+        {
+            "rcrq": "2026-03-16",
+            "kssj": "08:00",
+            "jssj": "09:50",
+            "kcmc": "数据结构",
+            "zc": 4,
+            "bt": "20260316 数据结构",
+            "note": "3月16日上课",
+        }
+    ]
+
+
+def test_project_day_does_not_match_inside_longer_dates():
+    items = [{"note": "12月2日 与 2月2日"}]
+    assert _project_day(items, "2026-02-02", "2026-02-09") == [{"note": "12月2日 与 2月9日"}]
+
+
+def test_fetched_and_projected_days_share_source_id():
+    fetched = EventParser.parse_tis_event(_item("2026-03-16", 4, "r9"), "2026-03-16")
+    projected_raw = _project_day([_item("2026-03-02", 2, "r1")], "2026-03-02", "2026-03-16")[0]
+    projected = EventParser.parse_tis_event(projected_raw, "2026-03-16")
+    assert fetched.x_source_id == projected.x_source_id
+
+
+def test_weekly_mode_always_fetches_current_and_next_week():
+    import datetime
+
+    from tisService import TisService
+
+    fetched = []
+
+    def fetch(dates):
+        fetched.extend(dates)
+        return {
+            d: [_item(d, 1, "r-" + d)] if datetime.date.fromisoformat(d).weekday() < 5 else []
+            for d in dates
+        }, []
+
+    service = TisService.__new__(TisService)
+    service.day_fetcher = fetch
+    start = datetime.date(2026, 3, 2)
+    dates = [(start + datetime.timedelta(days=i)).isoformat() for i in range(7 * 12)]
+    result, failed, stats = service._fetch_weekly(
+        dates, set(), 4, 2, verify_weeks=2, verify_from=datetime.date(2026, 4, 15)
+    )
+
+    assert failed == []
+    assert stats["pattern_consistent"] is True
+    assert stats["verified_weeks"] == ["2026-04-13", "2026-04-20"]
+    current_and_next = [(datetime.date(2026, 4, 13) + datetime.timedelta(days=i)).isoformat() for i in range(14)]
+    assert all(d in fetched for d in current_and_next)
+    assert not set(current_and_next) & set(stats["templated_dates"])
+    assert stats["templated_dates"]
+    assert set(result) == set(dates)
@@ -0,0 +1,99 @@
+import os
+import threading
+
+import pytest
+
+import token_store
+from token_store import CasTokenStore, _FileBackend
+
+
+def _fernet():
+    return pytest.importorskip("cryptography.fernet").Fernet
+
+
+def test_store_disabled_without_key_or_cryptography(tmp_path, monkeypatch):
+    path = str(tmp_path / "cas_token.enc")
+    assert CasTokenStore.create(backend="file", key=None, path=path) is None
+    assert CasTokenStore.create(backend="none", key="unused", path=path) is None
+
+    monkeypatch.setattr(token_store, "Fernet", None)
+    assert not token_store.encryption_available()
+    assert CasTokenStore.create(backend="file", key="unused", path=path) is None
+    # 未加密时从不落盘明文 TGC。
+    assert os.listdir(tmp_path) == []
+
+
+def test_file_backend_writes_private_file_atomically(tmp_path):
+    path = str(tmp_path / "nested" / "cas_token.enc")
+    backend = _FileBackend(path)
+    assert backend.read() is None
+
+    backend.write("payload")
+    backend.write("payload-2")
+
+    assert backend.read() == "payload-2"
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert os.listdir(os.path.dirname(path)) == ["cas_token.enc"]
+    backend.delete()
+    assert backend.read() is None
+
+
+def test_round_trip_and_private_file(tmp_path):
+    Fernet = _fernet()
+    path = str(tmp_path / "cas_token.enc")
+    store = CasTokenStore.create(backend="file", key=Fernet.generate_key().decode(), path=path)
+
+    assert store.save("TGC-123", validated_at=42.0)
+
+    record = store.load()
+    assert record["token"] == "TGC-123"
+    assert record["validated_at"] == 42.0
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_concurrent_writes_leave_no_temp_files(tmp_path):
+    Fernet = _fernet()
+    path = str(tmp_path / "cas_token.enc")
+    key = Fernet.generate_key().decode()
+    stores = [CasTokenStore.create(backend="file", key=key, path=path) for _ in range(4)]
+
+    def _write(store, index):
+        for n in range(20):
+            store.save(f"TGC-{index}-{n}")
+
+    threads = [threading.Thread(target=_write, args=(store, i)) for i, store in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stores[0].load()["token"].startswith("TGC-")
+    assert os.listdir(tmp_path) == ["cas_token.enc"]
+
+
+class _RecordingStore:
+    def __init__(self):
+        self.saved = []
+
+    def save(self, token, validated_at=None):
+        self.saved.append(token)
+        return True
+
+
+def test_revalidating_same_tgc_does_not_rewrite_store(monkeypatch):
+    import app as app_module
+
+    store = _RecordingStore()
+    monkeypatch.setattr(app_module, "CAS_TOKEN_STORE", store)
+    monkeypatch.setattr(app_module, "CAS_TOKEN_REVALIDATE_SECONDS", 0)
+    monkeypatch.setattr(app_module, "_RUNTIME_CAS_TOKEN", "TGC-1")
+    monkeypatch.setattr(app_module, "_RUNTIME_CAS_TOKEN_VALIDATED_AT", 0.0)
+    monkeypatch.setattr(app_module.CasService, "probe_tgc", lambda self: True)
+
+    assert app_module._warm_cas_token() == "TGC-1"
+    assert app_module._warm_cas_token() == "TGC-1"
+    assert store.saved == []
+    assert app_module._RUNTIME_CAS_TOKEN_VALIDATED_AT > 0
+
+    app_module._set_runtime_cas_token("TGC-2")
+    assert store.saved == ["TGC-2"]
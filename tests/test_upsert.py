@@ -0,0 +1,71 @@
+from scheduler import EventSource
+
+
+def _bb(item_id, title, start="2026-03-02T01:00:00.000Z", end="2026-03-02T02:00:00.000Z"):
+    return {
+        "itemSourceId": item_id,
+        "title": title,
+        "startDate": start,
+        "endDate": end,
+        "calendarId": "CS101-2026",
+        "calendarName": "数据结构",
+        "eventType": "Assignment",
+    }
+
+
+def _by_source_id(scheduler):
+    return {e.x_source_id: e for e in scheduler.query_events(source=EventSource.BB.value)}
+
+
+def test_resync_keeps_uid_and_bumps_sequence_only_on_change(scheduler):
+    scheduler.replace_bb_raw_events([_bb("a", "作业 1"), _bb("b", "作业 2")])
+    before = _by_source_id(scheduler)
+
+    scheduler.replace_bb_raw_events([_bb("a", "作业 1"), _bb("b", "作业 2（更新）")])
+    after = _by_source_id(scheduler)
+
+    assert after["a"].uid == before["a"].uid
+    assert after["a"].sequence == before["a"].sequence
+    assert after["b"].uid == before["b"].uid
+    assert after["b"].sequence == before["b"].sequence + 1
+    assert after["b"].summary == "作业 2（更新）"
+
+
+def test_missing_events_are_removed_and_new_ones_inserted(scheduler):
+    scheduler.replace_bb_raw_events([_bb("a", "作业 1"), _bb("b", "作业 2")])
+    before = _by_source_id(scheduler)
+
+    scheduler.replace_bb_raw_events([_bb("a", "作业 1"), _bb("c", "作业 3")])
+    after = _by_source_id(scheduler)
+
+    assert set(after) == {"a", "c"}
+    assert after["a"].uid == before["a"].uid
+
+
+def test_repeated_source_id_pairs_in_time_order(scheduler):
+    first = _bb("lab", "实验", "2026-03-02T01:00:00.000Z", "2026-03-02T02:00:00.000Z")
+    second = _bb("lab", "实验", "2026-03-02T06:00:00.000Z", "2026-03-02T07:00:00.000Z")
+    scheduler.replace_bb_raw_events([second, first])
+    before = sorted(scheduler.query_events(source=EventSource.BB.value), key=lambda e: e.dtstart)
+
+    scheduler.replace_bb_raw_events([first, second])
+    after = sorted(scheduler.query_events(source=EventSource.BB.value), key=lambda e: e.dtstart)
+
+    assert [e.uid for e in after] == [e.uid for e in before]
+    assert [e.sequence for e in after] == [e.sequence for e in before]
+
+
+def test_soft_delete_by_source_cancels_and_bumps_sequence(scheduler):
+    scheduler.replace_bb_raw_events([_bb("a", "作业 1"), _bb("b", "作业 2")])
+    before = _by_source_id(scheduler)
+
+    with scheduler._session() as session:
+        assert scheduler._delete_by_source(session, EventSource.BB.value, hard=False) == 2
+        session.commit()
+
+    after = {
+        e.x_source_id: e
+        for e in scheduler.query_events(source=EventSource.BB.value, include_deleted=True)
+    }
+    assert all(e.is_deleted and e.status == "CANCELLED" for e in after.values())
+    assert all(after[k].sequence == before[k].sequence + 1 for k in before)
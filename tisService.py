@@ -1,9 +1,242 @@
 from casService import CasService
 import json
-from typing import Optional, Any
+import time
+import random
+import datetime
+import os
+import threading
+import collections
+import concurrent.futures
+import re
+from typing import Callable, Optional, Any
+
+import requests
+
+from http_transport import DEFAULT_POOL_MAXSIZE, DEFAULT_TIMEOUT, session_pool_maxsize
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# 连接池在创建会话时一次性确定，至少容纳 AIMD 并发上限（TIS_CONCURRENCY_MAX）与默认线程数。
+TIS_POOL_MAXSIZE = max(DEFAULT_POOL_MAXSIZE, 10, _env_int("TIS_CONCURRENCY_MAX", 16))
+
+# 只比较课表内容，忽略每天都会变化的记录 ID。
+_TIS_VOLATILE_KEYS = ("id", "ID", "rcid", "RCID")
+# 教学周序号，平移到其他周时按周差调整。
+_TIS_WEEK_KEYS = ("zc", "ZC", "skzc", "SKZC")
+_DATE_PLACEHOLDER = "{date}"
+_WEEK_PLACEHOLDER = "{week}"
+
+
+def _date_texts(day: datetime.date) -> list:
+    """课表字段中可能出现的日期写法，顺序固定以便与目标日期一一对应。"""
+    return [
+        day.isoformat(),
+        day.strftime("%Y/%m/%d"),
+        day.strftime("%Y%m%d"),
+        f"{day.month}月{day.day}日",
+    ]
+
+
+def _day_replacer(src_day: str, dst_day: str) -> Callable[[str], str]:
+    """返回把文本中 src_day 的各种写法替换为 dst_day 同一写法的函数（dst_day 可为占位符）。"""
+    src_texts = _date_texts(datetime.date.fromisoformat(src_day))
+    if dst_day == _DATE_PLACEHOLDER:
+        dst_texts = [_DATE_PLACEHOLDER] * len(src_texts)
+    else:
+        dst_texts = _date_texts(datetime.date.fromisoformat(dst_day))
+    mapping = dict(zip(src_texts, dst_texts))
+    # 前后不能紧跟数字，避免 "2月2日" 误匹配 "12月2日"。
+    pattern = re.compile(
+        "|".join(f"(?<!\\d){re.escape(text)}(?!\\d)" for text in src_texts)
+    )
+    return lambda text: pattern.sub(lambda match: mapping[match.group(0)], text)
+
+
+def _replace_day(value: Any, replace: Callable[[str], str]) -> Any:
+    if isinstance(value, str):
+        return replace(value)
+    if isinstance(value, list):
+        return [_replace_day(item, replace) for item in value]
+    if isinstance(value, dict):
+        return {key: _replace_day(item, replace) for key, item in value.items()}
+    return value
+
+
+def _shift_week(value: Any, offset: Optional[int]) -> Any:
+    """纯数字的周次按 offset 平移（offset 为 None 时替换为占位符）；其他写法原样返回。"""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return value
+    if isinstance(value, str) and not value.strip().isdigit():
+        return value
+    if offset is None:
+        return _WEEK_PLACEHOLDER
+    shifted = int(value) + offset
+    return shifted if isinstance(value, int) else str(shifted)
+
+
+def _day_signature(items: Optional[list], day: str) -> str:
+    """生成与具体日期无关的单日课表签名，用于判断两周是否一致。"""
+    replace = _day_replacer(day, _DATE_PLACEHOLDER)
+    normalized = []
+    for item in items or []:
+        if not isinstance(item, dict):
+            normalized.append(item)
+            continue
+        stripped = {
+            k: _shift_week(v, None) if k in _TIS_WEEK_KEYS else v
+            for k, v in item.items()
+            if k not in _TIS_VOLATILE_KEYS
+        }
+        normalized.append(_replace_day(stripped, replace))
+    return json.dumps(
+        sorted(json.dumps(entry, sort_keys=True, ensure_ascii=False) for entry in normalized),
+        ensure_ascii=False,
+    )
+
+
+def _project_day(items: Optional[list], src_day: str, dst_day: str) -> list:
+    """
+    把样本周某天的课表平移到目标日期：去掉易变 ID，替换各种写法的日期，周次按周差调整。
+
+    事件的 x_source_id 不依赖记录 ID（见 EventParser.parse_tis_event），
+    因此同一节课无论逐日抓取还是由模板推断都得到相同的 source_id。
+    """
+    replace = _day_replacer(src_day, dst_day)
+    week_offset = (
+        datetime.date.fromisoformat(dst_day) - datetime.date.fromisoformat(src_day)
+    ).days // 7
+    projected = []
+    for item in items or []:
+        if isinstance(item, dict):
+            item = {
+                k: _shift_week(v, week_offset) if k in _TIS_WEEK_KEYS else v
+                for k, v in item.items()
+                if k not in _TIS_VOLATILE_KEYS
+            }
+        projected.append(_replace_day(item, replace))
+    return projected
+
+
+class AimdConcurrencyController:
+    """
+    AIMD（加性增、乘性减）并发控制器。
+
+    每完成一个“窗口”（当前并发数个）健康请求，并发上限 +increase_step；
+    遇到 5xx、超时或慢响应时乘以 decrease_factor。同一轮派发的请求只触发一次减半，
+    避免一批并发失败把上限直接压到最低。
+    """
+
+    def __init__(
+        self,
+        *,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 16,
+        increase_step: int = 1,
+        decrease_factor: float = 0.5,
+        slow_response_seconds: float = 3.0,
+        history_size: int = 50,
+    ):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.increase_step = max(1, int(increase_step))
+        self.decrease_factor = min(0.9, max(0.1, float(decrease_factor)))
+        self.slow_response_seconds = float(slow_response_seconds)
+        self._limit = float(min(self.max_limit, max(self.min_limit, int(initial_limit))))
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._window_successes = 0
+        self._decision_seq = 0
+        self._decisions = collections.deque(maxlen=max(1, int(history_size)))
+
+    @property
+    def limit(self) -> int:
+        with self._lock:
+            return int(self._limit)
+
+    @property
+    def epoch(self) -> int:
+        with self._lock:
+            return self._epoch
+
+    @property
+    def decision_seq(self) -> int:
+        with self._lock:
+            return self._decision_seq
+
+    def _record_locked(self, action: str, reason: str, old_limit: float) -> None:
+        self._decision_seq += 1
+        self._decisions.append(
+            {
+                "seq": self._decision_seq,
+                "action": action,
+                "reason": reason,
+                "from": int(old_limit),
+                "to": int(self._limit),
+            }
+        )
+
+    def on_success(self, latency_seconds: float, epoch: int) -> None:
+        if latency_seconds > self.slow_response_seconds:
+            self.on_failure("slow", epoch)
+            return
+        with self._lock:
+            self._window_successes += 1
+            if self._window_successes < int(self._limit):
+                return
+            self._window_successes = 0
+            if self._limit >= self.max_limit:
+                return
+            old_limit = self._limit
+            self._limit = min(float(self.max_limit), self._limit + self.increase_step)
+            self._record_locked("increase", "healthy-window", old_limit)
+
+    def on_failure(self, reason: str, epoch: int) -> None:
+        with self._lock:
+            # 减半之前派发的请求失败属于同一次拥塞，不重复惩罚。
+            if epoch != self._epoch:
+                return
+            self._epoch += 1
+            self._window_successes = 0
+            old_limit = self._limit
+            self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+            self._record_locked("decrease", reason, old_limit)
+
+    def snapshot(self, since_seq: int = 0) -> dict:
+        with self._lock:
+            return {
+                "limit": int(self._limit),
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "decisions": [d for d in self._decisions if d["seq"] > since_seq],
+            }
+
+
+def _classify_failure(exc: Exception) -> Optional[str]:
+    """返回应触发降并发的失败类型；与拥塞无关的异常返回 None。"""
+    if isinstance(exc, requests.Timeout):
+        return "timeout"
+    if isinstance(exc, requests.HTTPError):
+        status = getattr(exc.response, "status_code", None)
+        if status is not None and status >= 500:
+            return "5xx"
+    if isinstance(exc, requests.ConnectionError):
+        return "connection"
+    return None
 
 
 class TisService(CasService):
+    POOL_MAXSIZE = TIS_POOL_MAXSIZE
+    # 可替换的逐日抓取实现，签名同 _fetch_dates（见 asyncService.AsyncTisService.attach）。
+    day_fetcher = None
+    # 设置后逐日抓取使用 AIMD 自适应并发，max_workers 仅作为线程池上限。
+    concurrency_controller: Optional[AimdConcurrencyController] = None
+
     def LoginTIS(self):
         if self.TGC is None:
             print("Login TIS failed: missing CAS TGC token")
@@ -14,6 +247,7 @@ class TisService(CasService):
             cookies={"TGC": self.TGC},
             allow_redirects=False,
             params={"service": "https://tis.sustech.edu.cn/cas"},
+            timeout=DEFAULT_TIMEOUT,
         )
         if response.status_code != 302:
             print(f"Login TIS failed: CAS redirect status={response.status_code}")
@@ -25,7 +259,7 @@ class TisService(CasService):
             return False
 
         confirm_response = self.session.get(
-            url_tis, headers=self.headers, allow_redirects=True
+            url_tis, headers=self.headers, allow_redirects=True, timeout=DEFAULT_TIMEOUT
         )
         if confirm_response.status_code == 200:
             print("Login TIS successfully!")
@@ -34,6 +268,20 @@ class TisService(CasService):
         print("Login TIS failed!")
         return False
 
+    def validate_session(self) -> bool:
+        """用一次主页请求确认已登录的 TIS 会话仍然有效（会话池复用前调用）。"""
+        try:
+            response = self.session.get(
+                "https://tis.sustech.edu.cn/authentication/main",
+                headers=self.headers,
+                timeout=10,
+                allow_redirects=True,
+            )
+        except requests.RequestException as exc:
+            print(f"TIS session check failed: {exc}")
+            return False
+        return response.status_code == 200 and not self._is_probable_cas_login_page(response)
+
     def queryGPA(self):
         data = {
             "xn": None,
@@ -78,10 +326,262 @@ class TisService(CasService):
             "https://tis.sustech.edu.cn/component/queryrcxxlist",
             headers=headers,
             data=data,
+            timeout=DEFAULT_TIMEOUT,
         )
 
-        if response.status_code == 200:
-            return response.json()
+        if response.status_code != 200:
+            raise requests.HTTPError(
+                f"querySchedule {date} failed with status {response.status_code}",
+                response=response,
+            )
+        return response.json()
+
+    def _timed_query(self, date_str: str) -> tuple[Any, float]:
+        started = time.monotonic()
+        data = self.querySchedule(date_str)
+        return data, time.monotonic() - started
+
+    def _fetch_dates_adaptive(self, dates: list) -> tuple[dict, list]:
+        controller = self.concurrency_controller
+        result = {}
+        failed_dates = []
+        pending = collections.deque(dates)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=controller.max_limit) as executor:
+            in_flight = {}
+            while pending or in_flight:
+                while pending and len(in_flight) < controller.limit:
+                    date_str = pending.popleft()
+                    future = executor.submit(self._timed_query, date_str)
+                    in_flight[future] = (date_str, controller.epoch)
+
+                done, _ = concurrent.futures.wait(
+                    in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    date_str, epoch = in_flight.pop(future)
+                    try:
+                        data, latency = future.result()
+                    except Exception as exc:
+                        print(f"Fetching for {date_str} generated an exception: {exc}")
+                        failed_dates.append(date_str)
+                        result[date_str] = []
+                        reason = _classify_failure(exc)
+                        if reason is not None:
+                            controller.on_failure(reason, epoch)
+                        continue
+                    controller.on_success(latency, epoch)
+                    result[date_str] = data or []
+        return result, failed_dates
+
+    def _fetch_dates(self, dates: list, max_workers: int) -> tuple[dict, list]:
+        """并行抓取给定日期（YYYY-MM-DD 字符串），返回 (结果, 失败日期)。"""
+        if self.day_fetcher is not None:
+            return self.day_fetcher(dates)
+
+        result = {}
+        failed_dates = []
+        if not dates:
+            return result, failed_dates
+        if self.concurrency_controller is not None:
+            return self._fetch_dates_adaptive(dates)
+
+        # 使用线程池并行抓取，max_workers可以根据网络情况调整
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # 创建一个将 future 映射到日期的字典
+            future_to_date = {
+                executor.submit(self.querySchedule, date_str): date_str
+                for date_str in dates
+            }
+
+            for future in concurrent.futures.as_completed(future_to_date):
+                date_str = future_to_date[future]
+                try:
+                    # 获取任务结果并存入字典
+                    data = future.result()
+                    result[date_str] = data or []
+                except Exception as exc:
+                    print(f"Fetching for {date_str} generated an exception: {exc}")
+                    failed_dates.append(date_str)
+                    result[date_str] = []  # 如果出错，返回一个空列表
+        return result, failed_dates
+
+    def _fetch_weekly(
+        self,
+        dates: list,
+        holiday_dates: set,
+        max_workers: int,
+        sample_weeks: int,
+        verify_weeks: int = 2,
+        verify_from: Optional[datetime.date] = None,
+    ) -> tuple[dict, list, dict]:
+        """
+        按周模板抓取：先抓若干完整样本周推断每周课表，其余周只抓一个探针日验证。
+
+        必抓：区间首尾周、含节假日的周及其相邻周（调休）、从 verify_from（默认北京时间今天）
+        所在周起的 verify_weeks 周；探针不一致的周（如考试周、学期边界）整周回退逐日抓取；
+        样本周彼此不一致时全部回退逐日抓取。
+        局限：模板周只验证一个探针日，其余日期的单次调课 / 停课无法发现，
+        因此近期的周总是逐日抓取。
+        """
+        weeks: dict[datetime.date, list] = {}
+        for date_str in dates:
+            day = datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
+            monday = day - datetime.timedelta(days=day.weekday())
+            weeks.setdefault(monday, []).append(date_str)
+        ordered_weeks = sorted(weeks)
+
+        forced_weeks = set()
+        if ordered_weeks:
+            forced_weeks.update({ordered_weeks[0], ordered_weeks[-1]})
+        for holiday in holiday_dates:
+            day = datetime.datetime.strptime(holiday, "%Y-%m-%d").date()
+            monday = day - datetime.timedelta(days=day.weekday())
+            for offset in (-7, 0, 7):
+                forced_weeks.add(monday + datetime.timedelta(days=offset))
+        if verify_from is None:
+            verify_from = (
+                datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=8)
+            ).date()
+        verify_monday = verify_from - datetime.timedelta(days=verify_from.weekday())
+        verified_weeks = [
+            verify_monday + datetime.timedelta(days=7 * i)
+            for i in range(max(0, int(verify_weeks)))
+        ]
+        verified_weeks = [monday for monday in verified_weeks if monday in weeks]
+        forced_weeks.update(verified_weeks)
+
+        candidates = [
+            monday
+            for monday in ordered_weeks
+            if monday not in forced_weeks and len(weeks[monday]) == 7
+        ]
+        stats = {
+            "sampled_weeks": [],
+            "templated_dates": [],
+            "probe_mismatch_weeks": [],
+            "pattern_consistent": False,
+            "fallback_reason": None,
+            "verified_weeks": [monday.isoformat() for monday in verified_weeks],
+        }
+
+        sample_weeks = max(2, int(sample_weeks))
+        if len(candidates) < sample_weeks:
+            stats["fallback_reason"] = "insufficient-weeks"
+            result, failed = self._fetch_dates(dates, max_workers)
+            return result, failed, stats
+
+        # 取区间中部的连续周作为样本，尽量落在教学周内。
+        first = max(0, len(candidates) // 2 - sample_weeks // 2)
+        samples = candidates[first:first + sample_weeks]
+        stats["sampled_weeks"] = [monday.isoformat() for monday in samples]
+
+        batch = [d for monday in ordered_weeks if monday in forced_weeks for d in weeks[monday]]
+        batch += [d for monday in samples for d in weeks[monday]]
+        result, failed = self._fetch_dates(batch, max_workers)
+
+        remaining = [
+            monday for monday in ordered_weeks
+            if monday not in forced_weeks and monday not in samples
+        ]
+
+        def _fallback(reason: str) -> tuple[dict, list, dict]:
+            stats["fallback_reason"] = reason
+            rest = [d for monday in remaining for d in weeks[monday]]
+            extra, extra_failed = self._fetch_dates(rest, max_workers)
+            result.update(extra)
+            return result, failed + extra_failed, stats
+
+        sample_days = {d for monday in samples for d in weeks[monday]}
+        if any(d in sample_days for d in failed):
+            return _fallback("sample-fetch-failed")
+
+        # template[weekday] = (样本日期, 签名)
+        template: dict[int, tuple[str, str]] = {}
+        for monday in samples:
+            for date_str in weeks[monday]:
+                weekday = datetime.datetime.strptime(date_str, "%Y-%m-%d").weekday()
+                signature = _day_signature(result.get(date_str), date_str)
+                if weekday not in template:
+                    template[weekday] = (date_str, signature)
+                elif template[weekday][1] != signature:
+                    return _fallback("sample-weeks-disagree")
+
+        if all(not result.get(src) for src, _ in template.values()):
+            return _fallback("empty-pattern")
+        stats["pattern_consistent"] = True
+
+        # 探针选课程最多的工作日，最能暴露考试周 / 停课周的差异。
+        probe_weekday = max(template, key=lambda wd: len(result.get(template[wd][0]) or []))
+        probes = {}
+        for monday in remaining:
+            probe_day = (monday + datetime.timedelta(days=probe_weekday)).isoformat()
+            if probe_day in weeks[monday] and probe_day not in holiday_dates:
+                probes[monday] = probe_day
+        probe_result, probe_failed = self._fetch_dates(list(probes.values()), max_workers)
+        result.update(probe_result)
+
+        full_fetch_weeks = []
+        for monday in remaining:
+            probe_day = probes.get(monday)
+            if probe_day is None or probe_day in probe_failed:
+                full_fetch_weeks.append(monday)
+                continue
+            signature = template[probe_weekday][1]
+            if _day_signature(probe_result.get(probe_day), probe_day) != signature:
+                stats["probe_mismatch_weeks"].append(monday.isoformat())
+                full_fetch_weeks.append(monday)
+                continue
+            for date_str in weeks[monday]:
+                if date_str == probe_day:
+                    continue
+                weekday = datetime.datetime.strptime(date_str, "%Y-%m-%d").weekday()
+                src_day = template[weekday][0]
+                result[date_str] = _project_day(result.get(src_day), src_day, date_str)
+                stats["templated_dates"].append(date_str)
+
+        rest = [
+            d for monday in full_fetch_weeks for d in weeks[monday]
+            if d not in probe_result or d in probe_failed
+        ]
+        extra, extra_failed = self._fetch_dates(rest, max_workers)
+        result.update(extra)
+        # 探针失败的日期已随整周重抓重试，这里只累计最终仍失败的日期。
+        return result, failed + extra_failed, stats
+
+    def _retry_failed_dates(
+        self,
+        result: dict,
+        failed_dates: list,
+        max_workers: int,
+        retry_rounds: int,
+        retry_base_delay: float,
+    ) -> tuple[list, list]:
+        """
+        第二轮重试队列：对失败日期按指数退避 + 抖动重抓，返回 (最终失败日期, 每轮记录)。
+        """
+        remaining = list(failed_dates)
+        rounds = []
+        for round_no in range(1, max(0, int(retry_rounds)) + 1):
+            if not remaining:
+                break
+            # 全抖动（full jitter），避免多个实例在同一时刻一起重试。
+            delay = random.uniform(0, retry_base_delay * (2 ** (round_no - 1)))
+            time.sleep(delay)
+            retried, still_failed = self._fetch_dates(remaining, max_workers)
+            for date_str in remaining:
+                if date_str not in still_failed:
+                    result[date_str] = retried.get(date_str) or []
+            rounds.append(
+                {
+                    "round": round_no,
+                    "delay_seconds": round(delay, 3),
+                    "retried": len(remaining),
+                    "recovered": len(remaining) - len(still_failed),
+                }
+            )
+            remaining = still_failed
+        return remaining, rounds
 
     def queryScheduleInterval(
         self,
@@ -90,11 +590,22 @@ class TisService(CasService):
         holiday_provider: Optional[Any] = None,
         skip_holidays: bool = False,
         max_workers: int = 10,
+        fetch_mode: str = "daily",
+        sample_weeks: int = 3,
+        verify_weeks: int = 2,
+        retry_rounds: int = 2,
+        retry_base_delay: float = 1.0,
     ):
-        # date: YYYY-MM-DD
-        import datetime
-        import concurrent.futures
+        """
+        查询区间内每天的 TIS 日程。
 
+        fetch_mode="daily" 逐日抓取；fetch_mode="weekly" 由样本周推断教学周模板，
+        只抓取可能与模板不同的日期，样本周不一致时自动回退逐日抓取；
+        当前周起的 verify_weeks 周始终逐日抓取。
+        失败日期进入重试队列；重试后仍失败的日期记录在
+        last_query_metadata["failed_dates"]，其结果为空列表，调用方应保留这些日期的旧数据。
+        """
+        # date: YYYY-MM-DD
         start_date = datetime.datetime.strptime(startDate, "%Y-%m-%d")
         end_date = datetime.datetime.strptime(endDate, "%Y-%m-%d")
         delta = datetime.timedelta(days=1)
@@ -106,7 +617,6 @@ class TisService(CasService):
 
         result = {}
         holiday_skipped_dates = []
-        failed_dates = []
 
         dates_for_request = []
         for d in dates_to_fetch:
@@ -121,35 +631,58 @@ class TisService(CasService):
                 continue
             dates_for_request.append(d)
 
-        # 使用线程池并行抓取，max_workers可以根据网络情况调整
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 创建一个将 future 映射到日期的字典
-            future_to_date = {
-                executor.submit(self.querySchedule, d.strftime("%Y-%m-%d")): d.strftime(
-                    "%Y-%m-%d"
+        request_days = [d.strftime("%Y-%m-%d") for d in dates_for_request]
+        controller = self.concurrency_controller
+        # 连接池在创建会话时已按并发上限确定，这里只提示配置不匹配，不重建正在使用的连接池。
+        concurrency = controller.max_limit if controller is not None else max_workers
+        pool_maxsize = session_pool_maxsize(self.session)
+        if pool_maxsize is not None and pool_maxsize < concurrency:
+            print(
+                f"[tis] pool_maxsize={pool_maxsize} < concurrency={concurrency}, "
+                "extra connections will not be kept alive"
+            )
+        decision_mark = controller.decision_seq if controller is not None else 0
+        weekly_stats = None
+        if fetch_mode == "weekly":
+            holiday_dates = set(holiday_skipped_dates)
+            if holiday_provider is not None:
+                holiday_dates.update(
+                    d.strftime("%Y-%m-%d")
+                    for d in dates_to_fetch
+                    if holiday_provider.is_holiday(d.strftime("%Y-%m-%d"))
                 )
-                for d in dates_for_request
-            }
-
-            for future in concurrent.futures.as_completed(future_to_date):
-                date_str = future_to_date[future]
-                try:
-                    # 获取任务结果并存入字典
-                    data = future.result()
-                    result[date_str] = data or []
-                except Exception as exc:
-                    print(f"Fetching for {date_str} generated an exception: {exc}")
-                    failed_dates.append(date_str)
-                    result[date_str] = []  # 如果出错，返回一个空列表
+            fetched, failed_dates, weekly_stats = self._fetch_weekly(
+                request_days, holiday_dates, max_workers, sample_weeks, verify_weeks
+            )
+            requested_count = len(request_days) - len(weekly_stats["templated_dates"])
+        else:
+            fetched, failed_dates = self._fetch_dates(request_days, max_workers)
+            requested_count = len(request_days)
+        result.update(fetched)
+        initial_failed_count = len(failed_dates)
+        failed_dates, retry_log = self._retry_failed_dates(
+            result, failed_dates, max_workers, retry_rounds, retry_base_delay
+        )
+        if initial_failed_count:
+            print(
+                "[tis] retry queue finished "
+                f"initial_failed={initial_failed_count} still_failed={len(failed_dates)}"
+            )
 
         self.last_query_metadata = {
             "start_date": startDate,
             "end_date": endDate,
-            "requested_dates": len(dates_for_request),
+            "requested_dates": requested_count,
             "holiday_skipped_dates": holiday_skipped_dates,
-            "failed_dates": failed_dates,
+            "failed_dates": sorted(failed_dates),
+            "retry_rounds": retry_log,
             "skip_holidays": bool(skip_holidays),
+            "fetch_mode": "weekly" if weekly_stats is not None else "daily",
         }
+        if weekly_stats is not None:
+            self.last_query_metadata.update(weekly_stats)
+        if controller is not None:
+            self.last_query_metadata["concurrency"] = controller.snapshot(since_seq=decision_mark)
 
         # 按日期排序，确保结果有序
         sorted_result = {
@@ -0,0 +1,172 @@
+"""
+CAS TGC 持久化存储：进程重启 / 冷启动后直接复用仍然有效的 TGC，跳过完整的 CAS 登录。
+
+TGC 等同于登录态，落盘或写入 KV 前用 Fernet（cryptography）加密，密钥取自 CAS_TOKEN_STORE_KEY；
+未配置密钥或未安装 cryptography 时不持久化。记录中带有 validated_at，调用方据此决定是否需要探测有效性。
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+    InvalidToken = Exception
+
+DEFAULT_KV_KEY = "cas_tgc_store"
+
+
+class _FileBackend:
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def read(self) -> Optional[str]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as fp:
+                return fp.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def write(self, value: str) -> None:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # 每次写入使用独立的临时文件（mkstemp 默认 0600）再原子替换，
+        # 多个 worker 同时写入时互不覆盖临时文件，读方也不会读到半截内容。
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".cas_token.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fp:
+                fp.write(value)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def delete(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _KvBackend:
+    name = "kv"
+
+    def __init__(self, client, key: str = DEFAULT_KV_KEY):
+        self.client = client
+        self.key = key
+
+    def read(self) -> Optional[str]:
+        value = self.client.get(self.key)
+        return str(value) if value else None
+
+    def write(self, value: str) -> None:
+        self.client.set(self.key, value)
+
+    def delete(self) -> None:
+        self.client.delete(self.key)
+
+
+def encryption_available() -> bool:
+    return Fernet is not None
+
+
+class CasTokenStore:
+    """加密保存单个 CAS TGC 及其最近一次验证时间。"""
+
+    def __init__(self, backend, key: str):
+        if Fernet is None:
+            raise RuntimeError("cryptography is required for CasTokenStore")
+        self.backend = backend
+        self._fernet = Fernet(key.encode("utf-8") if isinstance(key, str) else key)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(
+        cls,
+        *,
+        backend: str,
+        key: Optional[str],
+        path: str,
+        kv_client=None,
+    ) -> Optional["CasTokenStore"]:
+        """
+        按配置构建存储，条件不满足时返回 None（调用方退回纯内存 token）。
+
+        Args:
+            backend: "file" / "kv" / "none"
+            key: Fernet 密钥（Fernet.generate_key() 生成）
+            path: file 后端的文件路径
+            kv_client: kv 后端使用的客户端
+        """
+        if backend == "none":
+            return None
+        if not key:
+            print("[token-store] CAS_TOKEN_STORE_KEY not set, TGC will not be persisted")
+            return None
+        if Fernet is None:
+            print("[token-store] cryptography not installed, TGC will not be persisted")
+            return None
+        if backend == "kv":
+            if kv_client is None:
+                print("[token-store] kv backend requested but kv client unavailable")
+                return None
+            storage = _KvBackend(kv_client)
+        else:
+            storage = _FileBackend(path)
+        try:
+            return cls(storage, key)
+        except ValueError as exc:
+            print(f"[token-store] invalid CAS_TOKEN_STORE_KEY: {exc}")
+            return None
+
+    def load(self) -> Optional[dict]:
+        """返回 {token, stored_at, validated_at}；无记录、解密失败或格式错误时返回 None。"""
+        with self._lock:
+            try:
+                raw = self.backend.read()
+            except Exception as exc:
+                print(f"[token-store] read failed ({self.backend.name}): {exc}")
+                return None
+        if not raw:
+            return None
+        try:
+            record = json.loads(self._fernet.decrypt(raw.encode("utf-8")).decode("utf-8"))
+        except (InvalidToken, ValueError) as exc:
+            print(f"[token-store] stored TGC unreadable, ignore: {type(exc).__name__}")
+            return None
+        if not isinstance(record, dict) or not record.get("token"):
+            return None
+        return record
+
+    def save(self, token: str, validated_at: Optional[float] = None) -> bool:
+        now = time.time()
+        record = {
+            "token": token,
+            "stored_at": now,
+            "validated_at": validated_at if validated_at is not None else now,
+        }
+        encrypted = self._fernet.encrypt(json.dumps(record).encode("utf-8")).decode("utf-8")
+        with self._lock:
+            try:
+                self.backend.write(encrypted)
+                return True
+            except Exception as exc:
+                print(f"[token-store] write failed ({self.backend.name}): {exc}")
+                return False
+
+    def clear(self) -> None:
+        with self._lock:
+            try:
+                self.backend.delete()
+            except Exception as exc:
+                print(f"[token-store] delete failed ({self.backend.name}): {exc}")